@@ -1,9 +1,11 @@
-from fastapi import FastAPI, Depends, HTTPException
+from fastapi import FastAPI, Depends, HTTPException, Request
 from fastapi.middleware.cors import CORSMiddleware
+from fastapi.responses import StreamingResponse, Response
 from contextlib import asynccontextmanager
 from pydantic import BaseModel
 from typing import List, Optional
-from datetime import datetime
+from datetime import datetime, timedelta
+import asyncio
 import json
 import pika
 import threading
@@ -12,19 +14,47 @@ from dotenv import load_dotenv
 
 load_dotenv()
 
-from src.tools.QQMailTools import QQMailTools
+from src.utils.log import setup_logging, get_logger
+setup_logging()
+
+from src.tools.QQMailTools import EmailStatus, QQMailTools
+from src.tools.schema_mail import Email
 from src.utils.rabbitmq import MQClient
 from src.utils.database import MySQLManager
+from src.utils.async_database import AsyncMySQLManager
+from src.utils.broadcaster import TaskBroadcaster
+from src.utils.redis_utils import redis_conn
+from src.utils.stats import StatsRecorder
+from src.utils.metrics import render_latest
+
+logger = get_logger("api")
+
+# 接口整体超时时间（秒）
+REQUEST_TIMEOUT = float(os.getenv("API_REQUEST_TIMEOUT", 15))
+# SSE 心跳间隔（秒），防止代理断开空闲连接
+STREAM_HEARTBEAT = float(os.getenv("API_STREAM_HEARTBEAT", 15))
+# 人工任务标记为 sending 后超过该时长（秒）仍未写回，视为卡住（进程崩溃、写回失败），由后台任务回收
+SENDING_TIMEOUT = float(os.getenv("MANUAL_SENDING_TIMEOUT", 300))
+# 回收卡住任务的间隔（秒）
+SENDING_REAP_INTERVAL = float(os.getenv("MANUAL_SENDING_REAP_INTERVAL", 60))
 
 @asynccontextmanager
 async def lifespan(app: FastAPI):
+    await async_db.init_pool()
+    broadcaster.start(asyncio.get_running_loop())
     threading.Thread(target=mq_client.consume_tasks, args=(consume_and_save_task,), daemon=True).start()
+    reaper = asyncio.create_task(_reap_sending_loop())
     yield
     # 关闭时
+    reaper.cancel()
+    broadcaster.stop()
+    await async_db.close_pool()
     if db:
         db.close_pool()
     if mq_client:
         mq_client.close()
+    if mail_tool:
+        mail_tool.close_smtp()
 
 
 app = FastAPI(
@@ -44,21 +74,34 @@ app.add_middleware(
 
 
 try:
+    # 同步连接池只服务于 MQ 消费线程，接口请求走异步连接池
     db = MySQLManager(
         host=os.getenv("MYSQL_HOST"),
         port=int(os.getenv("MYSQL_PORT")),
         user=os.getenv("MYSQL_USER"),
         password=os.getenv("MYSQL_PASSWORD", ""),
         db_name=os.getenv("MYSQL_DB_NAME"),
-        pool_size=10,
+        pool_size=int(os.getenv("MYSQL_POOL_SIZE", 2)),
+        max_pool_size=int(os.getenv("MYSQL_POOL_MAX", 5)),
+    )
+    async_db = AsyncMySQLManager(
+        host=os.getenv("MYSQL_HOST"),
+        port=int(os.getenv("MYSQL_PORT")),
+        user=os.getenv("MYSQL_USER"),
+        password=os.getenv("MYSQL_PASSWORD", ""),
+        db_name=os.getenv("MYSQL_DB_NAME"),
+        pool_minsize=int(os.getenv("ASYNC_MYSQL_POOL_MIN", 1)),
+        pool_maxsize=int(os.getenv("ASYNC_MYSQL_POOL_MAX", 20)),
+        query_timeout=float(os.getenv("MYSQL_QUERY_TIMEOUT", 10)),
     )
     mq_client = MQClient(
         host=os.getenv("RABBITMQ_HOST"),
         queue_name=os.getenv("RABBITMQ_QUEUE_NAME"),
     )
     mail_tool = QQMailTools()
+    broadcaster = TaskBroadcaster(redis_conn=redis_conn)
 except Exception as e:
-    print(f"初始化失败: {str(e)}")
+    logger.critical("初始化失败: %s", e)
     raise
 
 def consume_and_save_task(ch, method, properties, body):
@@ -69,46 +112,147 @@ def consume_and_save_task(ch, method, properties, body):
             if field not in task_data:
                 raise ValueError(f"缺少必要字段: {field}")
             
-        db.execute_query("""
-            INSERT INTO manual_email_tasks 
-            (email_id, thread_id, sender, subject, body, category, created_at)
-            VALUES (%s, %s, %s, %s, %s, %s, %s)
-            ON DUPLICATE KEY UPDATE status = 'pending'
-        """, (
-            task_data["email_id"],
-            task_data.get("thread_id", ""),
-            task_data["sender"],
-            task_data["subject"],
-            task_data["body"],
-            task_data.get("category", ""),
-            task_data["created_at"]
-        ), commit=True)
+        # 插入与回读在同一连接、同一事务内完成
+        # MQ 重投或重复发布时保持已有任务不变（不能把 replied/sending 的任务改回 pending），也不再推送
+        with db.transaction(dictionary=True) as tx:
+            tx.execute("""
+                INSERT INTO manual_email_tasks 
+                (email_id, thread_id, message_id, sender, subject, body, category, created_at)
+                VALUES (%s, %s, %s, %s, %s, %s, %s, %s)
+                ON DUPLICATE KEY UPDATE id = id
+            """, (
+                task_data["email_id"],
+                task_data.get("thread_id", ""),
+                task_data.get("message_id", ""),
+                task_data["sender"],
+                task_data["subject"],
+                task_data["body"],
+                task_data.get("category", ""),
+                task_data["created_at"]
+            ), prepared=True)
+            created = tx.rowcount == 1
+            saved = None
+            if created:
+                # 回读入库后的完整记录（含自增id、status）
+                rows = tx.execute(
+                    "SELECT * FROM manual_email_tasks WHERE email_id = %s",
+                    (task_data["email_id"],),
+                    prepared=True,
+                )
+                saved = rows[0] if rows else None
+
+        # 只推送新建的任务给订阅了 /tasks/stream 的看板
+        if saved:
+            broadcaster.publish(saved)
 
         ch.basic_ack(delivery_tag=method.delivery_tag)
-        print(f"成功处理邮件任务: {task_data['email_id']}")
+        if created:
+            logger.info("成功处理邮件任务: %s", task_data["email_id"])
+        else:
+            logger.info("邮件任务 %s 已存在，忽略重复消息", task_data["email_id"])
     except Exception as e:
-        print(f"处理任务失败: {str(e)}")
+        logger.exception("处理任务失败: %s", e)
         ch.basic_nack(delivery_tag=method.delivery_tag, requeue=True)       # 失败时重新入队
 
 
+async def with_timeout(coro):
+    """为接口处理逻辑加上整体超时，超时返回 504"""
+    try:
+        return await asyncio.wait_for(coro, timeout=REQUEST_TIMEOUT)
+    except asyncio.TimeoutError:
+        raise HTTPException(status_code=504, detail="请求超时")
+
+
 @app.get("/tasks", summary="get manual email tasks")
-def get_tasks(status: str = "pending", page: int = 1, page_size: int = 20):
+async def get_tasks(status: str = "pending", page: int = 1, page_size: int = 20):
+    if page < 1 or page_size < 1:
+        raise HTTPException(status_code=400, detail="页码和页大小必须为正数")
+    return await with_timeout(_query_tasks(status, page, page_size))
+
+
+@app.get("/metrics", summary="Prometheus metrics of the API process")
+async def metrics():
+    body, content_type = render_latest()
+    return Response(content=body, media_type=content_type)
+
+
+@app.get("/stats/pool", summary="database connection pool statistics")
+async def get_pool_stats():
+    async_pool = async_db.pool
+    return {
+        "mysql": db.pool_stats(),
+        "async_mysql": {
+            "size": async_pool.size if async_pool else 0,
+            "free": async_pool.freesize if async_pool else 0,
+            "max_size": async_db.pool_maxsize,
+        },
+    }
+
+
+@app.get("/stats/pipeline", summary="mail pipeline statistics (classifier hit rate, etc.)")
+async def get_pipeline_stats():
+    stats = await asyncio.to_thread(StatsRecorder.get_all, redis_conn)
+    classifier = stats.get("classifier", {})
+    if classifier.get("requests"):
+        classifier["hit_rate"] = classifier.get("centroid_hits", 0) / classifier["requests"]
+    if classifier.get("centroid_hits") and classifier.get("llm_calls"):
+        # 质心命中节省的时间：每次命中按 LLM 分类的平均耗时与质心分类的平均耗时之差估算
+        avg_llm_ms = classifier.get("llm_ms", 0) / classifier["llm_calls"]
+        avg_centroid_ms = classifier.get("centroid_ms", 0) / classifier["centroid_hits"]
+        classifier["saved_ms"] = max(avg_llm_ms - avg_centroid_ms, 0.0) * classifier["centroid_hits"]
+    if classifier.get("compared"):
+        classifier["agreement"] = classifier.get("agreed", 0) / classifier["compared"]
+    if classifier.get("shadow_compared"):
+        classifier["confident_agreement"] = classifier.get("shadow_agreed", 0) / classifier["shadow_compared"]
+    writer = stats.get("writer", {})
+    proofread = writer.get("proofreader_calls", 0) + writer.get("proofreader_skipped", 0)
+    if proofread:
+        writer["proofreader_skip_rate"] = writer.get("proofreader_skipped", 0) / proofread
+    # 各 chain 的提示词前缀缓存命中率
+    for name, usage in stats.items():
+        if name.startswith("llm:") and usage.get("prompt_tokens"):
+            usage["cached_ratio"] = usage.get("cached_tokens", 0) / usage["prompt_tokens"]
+    return stats
+
+
+@app.get("/tasks/stream", summary="stream newly created manual email tasks (SSE)")
+async def stream_tasks(request: Request):
+    """以 Server-Sent Events 推送新入库的人工任务，看板无需轮询 /tasks"""
+    async def event_stream():
+        async with broadcaster.subscribe() as queue:
+            yield f"retry: {int(STREAM_HEARTBEAT * 1000)}\n\n"
+            while not await request.is_disconnected():
+                try:
+                    data = await asyncio.wait_for(queue.get(), timeout=STREAM_HEARTBEAT)
+                except asyncio.TimeoutError:
+                    yield ": ping\n\n"
+                    continue
+                yield f"event: task\ndata: {data}\n\n"
+
+    return StreamingResponse(
+        event_stream(),
+        media_type="text/event-stream",
+        headers={"Cache-Control": "no-cache", "X-Accel-Buffering": "no"},
+    )
+
+
+async def _query_tasks(status: str, page: int, page_size: int):
     try:
-        if page < 1 or page_size < 1:
-            raise HTTPException(status_code=400, detail="页码和页大小必须为正数")
         offset = (page - 1) * page_size
-        tasks = db.execute_query("""
-            SELECT * FROM manual_email_tasks 
-            WHERE status = %s 
-            ORDER BY created_at DESC 
-            LIMIT %s OFFSET %s
-        """, (status, page_size, offset), dictionary=True)
-        
-        # 查询总数（处理空结果情况）
-        total_result = db.execute_query(
-            "SELECT COUNT(*) as cnt FROM manual_email_tasks WHERE status = %s", 
-            (status,), 
-            dictionary=True
+        # 分页查询与总数查询互不依赖，并发执行
+        tasks, total_result = await asyncio.gather(
+            async_db.execute_query("""
+                SELECT * FROM manual_email_tasks 
+                WHERE status = %s 
+                ORDER BY created_at DESC 
+                LIMIT %s OFFSET %s
+            """, (status, page_size, offset), dictionary=True),
+            # 查询总数（处理空结果情况）
+            async_db.execute_query(
+                "SELECT COUNT(*) as cnt FROM manual_email_tasks WHERE status = %s", 
+                (status,), 
+                dictionary=True
+            ),
         )
         total = total_result[0]["cnt"] if total_result else 0
         return {
@@ -117,10 +261,227 @@ def get_tasks(status: str = "pending", page: int = 1, page_size: int = 20):
             "page_size": page_size,
             "tasks": tasks or []
         }
+    except asyncio.TimeoutError:
+        raise
     except Exception as e:
         raise HTTPException(status_code=500, detail=f"查询任务失败: {str(e)}")
 
 
+class ReplyRequest(BaseModel):
+    reply_content: str
+    operator: str
+    remark: Optional[str] = None
+
+
+class BulkReplyItem(BaseModel):
+    task_id: int
+    reply_content: str
+    remark: Optional[str] = None
+
+
+class BulkReplyRequest(BaseModel):
+    operator: str
+    replies: List[BulkReplyItem]
+
+
+@app.post("/tasks/{task_id}/reply", summary="reply a manual email task")
+async def reply_task(task_id: int, request: ReplyRequest):
+    results = await _reply_tasks(
+        [BulkReplyItem(task_id=task_id, reply_content=request.reply_content, remark=request.remark)],
+        request.operator,
+    )
+    result = results[0]
+    if result["status"] == "not_found":
+        raise HTTPException(status_code=404, detail=f"任务{task_id}不存在或已处理")
+    if result["status"] == "failed":
+        raise HTTPException(status_code=502, detail=f"任务{task_id}邮件发送失败")
+    return result
+
+
+@app.post("/tasks/bulk-reply", summary="reply manual email tasks in bulk")
+async def bulk_reply_tasks(request: BulkReplyRequest):
+    if not request.replies:
+        raise HTTPException(status_code=400, detail="回复列表不能为空")
+    if len({item.task_id for item in request.replies}) != len(request.replies):
+        raise HTTPException(status_code=400, detail="回复列表中存在重复的任务ID")
+    results = await _reply_tasks(request.replies, request.operator)
+    return {
+        "total": len(results),
+        "sent": sum(1 for r in results if r["status"] == "replied"),
+        "results": results,
+    }
+
+
+async def _reply_tasks(replies: List[BulkReplyItem], operator: str) -> List[dict]:
+    """
+    人工回复流程：
+    1. 事务内锁定 pending 任务并标记为 sending，防止并发重复回复
+    2. 复用同一个 SMTP 会话批量发送
+    3. 一个事务内写回 status/reply_content/processed_at（发送失败的恢复为 pending）
+    4. 一个 Redis pipeline 内更新邮件状态为 MANUAL_REPLIED
+    邮件发出后 3、4 步失败不再返回 500：记录已发送的邮件，留在 sending 的任务由 _reap_stale_sending 回收
+    """
+    task_ids = [item.task_id for item in replies]
+    placeholders = ", ".join(["%s"] * len(task_ids))
+
+    # 1. 认领任务
+    try:
+        async with async_db.transaction(dictionary=True) as cursor:
+            await cursor.execute(f"""
+                SELECT id, email_id, thread_id, message_id, sender, subject, body
+                FROM manual_email_tasks
+                WHERE id IN ({placeholders}) AND status = 'pending'
+                FOR UPDATE
+            """, tuple(task_ids))
+            tasks = {row["id"]: row for row in await cursor.fetchall()}
+            if tasks:
+                claimed = ", ".join(["%s"] * len(tasks))
+                await cursor.execute(
+                    f"UPDATE manual_email_tasks SET status = 'sending', sending_at = %s WHERE id IN ({claimed})",
+                    (datetime.now(), *tasks),
+                )
+    except Exception as e:
+        raise HTTPException(status_code=500, detail=f"认领任务失败: {str(e)}")
+
+    # 2. 发送（SMTP 为阻塞调用，放到线程中执行）
+    to_send = [item for item in replies if item.task_id in tasks]
+    send_results = await asyncio.to_thread(
+        mail_tool.send_replies,
+        [(_task_to_email(tasks[item.task_id]), item.reply_content) for item in to_send],
+        "人工客服",
+    )
+
+    # 3. 写回处理结果
+    processed_at = datetime.now()
+    sent_items = [(item, sent) for item, sent in zip(to_send, send_results) if sent]
+    try:
+        async with async_db.transaction() as cursor:
+            for item, sent in zip(to_send, send_results):
+                if sent:
+                    await cursor.execute("""
+                        UPDATE manual_email_tasks
+                        SET status = 'replied', reply_content = %s, reply_id = %s,
+                            processed_at = %s, operator = %s, remark = %s
+                        WHERE id = %s
+                    """, (item.reply_content, sent["reply_message_id"], processed_at, operator, item.remark, item.task_id))
+                else:
+                    await cursor.execute(
+                        "UPDATE manual_email_tasks SET status = 'pending', sending_at = NULL WHERE id = %s",
+                        (item.task_id,),
+                    )
+    except Exception as e:
+        # 邮件已经发出，不能让任务回到 pending 被再次回复：留在 sending，由回收任务按 Redis 状态处理
+        logger.error(
+            "人工回复写回失败，任务保持 sending 等待回收: %s | 已发送: %s", e,
+            [(item.task_id, sent["reply_message_id"]) for item, sent in sent_items],
+        )
+
+    # 4. 更新 Redis 状态（回收任务据此判断 sending 任务是否已发送）
+    if sent_items:
+        try:
+            await asyncio.to_thread(
+                _mark_manual_replied,
+                [(tasks[item.task_id]["email_id"], item.remark or "", sent["reply_message_id"]) for item, sent in sent_items],
+                operator,
+            )
+        except Exception as e:
+            logger.error(
+                "人工回复 Redis 状态更新失败: %s | 已发送: %s", e,
+                [(item.task_id, sent["reply_message_id"]) for item, sent in sent_items],
+            )
+
+    sent_map = {item.task_id: sent for item, sent in sent_items}
+    results = []
+    for item in replies:
+        if item.task_id not in tasks:
+            results.append({"task_id": item.task_id, "status": "not_found"})
+        elif item.task_id in sent_map:
+            results.append({
+                "task_id": item.task_id,
+                "status": "replied",
+                "reply_message_id": sent_map[item.task_id]["reply_message_id"],
+                "processed_at": processed_at.isoformat(),
+            })
+        else:
+            results.append({"task_id": item.task_id, "status": "failed"})
+    return results
+
+
+def _mark_manual_replied(items: List[tuple], operator: str):
+    """在一个 Redis pipeline 中把邮件状态批量更新为 MANUAL_REPLIED，items 为 (email_id, 备注, 回复 Message-ID)"""
+    if not mail_tool.redis_conn:
+        return
+    pipe = mail_tool.redis_conn.pipeline()
+    for email_id, remark, reply_message_id in items:
+        mail_tool.update_manual_status(email_id, True, operator, remark, pipeline=pipe, reply_message_id=reply_message_id)
+    pipe.execute()
+
+
+async def _reap_stale_sending() -> int:
+    """
+    回收卡在 sending 的人工任务（发送后写回失败、进程在发送途中退出）：
+    Redis 中已是 MANUAL_REPLIED 的说明邮件已发出，补写为 replied；否则恢复为 pending 等待重新处理
+    :return: 回收的任务数
+    """
+    cutoff = datetime.now() - timedelta(seconds=SENDING_TIMEOUT)
+    rows = await async_db.execute_query("""
+        SELECT id, email_id FROM manual_email_tasks
+        WHERE status = 'sending' AND (sending_at IS NULL OR sending_at < %s)
+    """, (cutoff,), dictionary=True)
+    if not rows:
+        return 0
+
+    statuses = await asyncio.to_thread(mail_tool.get_email_statuses, [row["email_id"] for row in rows])
+    replied = pending = 0
+    async with async_db.transaction() as cursor:
+        for row in rows:
+            status = statuses.get(row["email_id"], {})
+            if status.get("status") == EmailStatus.MANUAL_REPLIED.status_value:
+                await cursor.execute("""
+                    UPDATE manual_email_tasks
+                    SET status = 'replied', reply_id = %s, processed_at = %s, operator = %s
+                    WHERE id = %s AND status = 'sending'
+                """, (
+                    status.get("reply_message_id"),
+                    datetime.fromisoformat(status["manual_time"]) if status.get("manual_time") else datetime.now(),
+                    status.get("manual_operator"),
+                    row["id"],
+                ))
+                replied += 1
+            else:
+                await cursor.execute(
+                    "UPDATE manual_email_tasks SET status = 'pending', sending_at = NULL WHERE id = %s AND status = 'sending'",
+                    (row["id"],),
+                )
+                pending += 1
+    logger.warning("回收卡住的 sending 任务 | 补写 replied: %d | 恢复 pending: %d", replied, pending)
+    return replied + pending
+
+
+async def _reap_sending_loop():
+    """启动时立即回收一次，之后按 SENDING_REAP_INTERVAL 定期回收"""
+    while True:
+        try:
+            await _reap_stale_sending()
+        except asyncio.CancelledError:
+            raise
+        except Exception as e:
+            logger.error("回收 sending 任务失败: %s", e)
+        await asyncio.sleep(SENDING_REAP_INTERVAL)
+
+
+def _task_to_email(task: dict) -> Email:
+    """manual_email_tasks 记录转换为 Email（Message-ID 用于回复的 In-Reply-To，旧记录没有时不设置）"""
+    return Email(
+        id=task["email_id"],
+        threadId=task["thread_id"] or "",
+        messageId=task["message_id"] or "",
+        references="",
+        sender=task["sender"],
+        subject=task["subject"],
+        body=task["body"],
+    )
+
 
 if __name__ == "__main__":
     import uvicorn
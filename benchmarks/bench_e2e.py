@@ -0,0 +1,277 @@
+"""
+端到端离线基准：用本地替身服务驱动 GraphWorkFlow，统计吞吐、单封延迟与每封邮件的外部调用次数，不访问网络
+
+替身服务（见 benchmarks/fake_services.py）：IMAP 收件箱预置 N 封合成邮件、aiosmtpd 收信端、
+OpenAI 兼容的模型/embedding 服务（可配置延迟）、fakeredis、临时目录中的 Chroma、内存 SQLite 代替 MySQL
+各 chain 使用不同的模型名（bench-<chain>），按模型名统计每个 chain 的调用次数
+
+用法（除项目依赖外需要 aiosmtpd、fakeredis、langchain-openai）：
+    python benchmarks/bench_e2e.py --emails 200 --concurrency 4 --llm-latency 0.3 --embedding-latency 0.02
+    # 输出 JSON 报告，便于 CI 中比较前后两次结果
+    python benchmarks/bench_e2e.py --emails 50 --report ./e2e_report.json
+"""
+import argparse
+import json
+import os
+import random
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from concurrent.futures import ThreadPoolExecutor
+from email.message import EmailMessage
+from email.utils import format_datetime, make_msgid
+from datetime import datetime
+from typing import Dict, List
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from benchmarks.fake_services import FakeIMAPServer, ListMQ, SMTPSink, SQLiteMySQL, StubLLMServer
+
+CHAINS = ("categorize", "rag_queries", "writer", "proofreader", "hyde_generation")
+
+EMAIL_TEMPLATES = {
+    "product_enquiry": [
+        "你好，请问软件支持哪些手机系统版本？我的手机比较旧，担心装不上。",
+        "请问个性化训练计划是怎么生成的，会根据我的运动数据自动调整吗？",
+        "想了解一下订阅服务有哪些套餐，可以用哪些方式支付？",
+        "我的手表能和软件同步运动数据吗？需要额外设置什么吗？",
+        "忘记密码了，请问怎么找回账号？手机号也换了。",
+    ],
+    "customer_complaint": [
+        "我要投诉，上个月被重复扣费了，到现在也没有人处理退款。",
+        "更新之后软件一直闪退，完全无法使用，非常失望。",
+    ],
+    "customer_feedback": [
+        "很喜欢新的训练计划功能，建议增加更多瑜伽课程。",
+        "体验不错，希望增加夜间模式，晚上跑步时看屏幕太刺眼。",
+    ],
+    "unrelated": [
+        "您好，我正在休假，期间不方便查看邮件，回来后尽快回复您。",
+    ],
+}
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """计算百分位（最近秩法）"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[rank]
+
+
+def generate_emails(count: int, mix: Dict[str, float], rng: random.Random) -> List[bytes]:
+    """按类别比例生成合成邮件；unrelated 为自动回复（带 Auto-Submitted 头，由预过滤拦截）"""
+    categories = list(mix)
+    weights = [mix[category] for category in categories]
+    emails = []
+    for n in range(count):
+        category = rng.choices(categories, weights)[0]
+        msg = EmailMessage()
+        msg["From"] = f"customer{n}@example.com"
+        msg["To"] = "support@example.com"
+        msg["Subject"] = f"咨询 #{n}"
+        msg["Date"] = format_datetime(datetime.now().astimezone())
+        msg["Message-ID"] = make_msgid(domain="bench.example.com")
+        if category == "unrelated":
+            msg["Auto-Submitted"] = "auto-replied"
+        msg.set_content(rng.choice(EMAIL_TEMPLATES[category]) + "\n\n谢谢！")
+        emails.append(msg.as_bytes())
+    return emails
+
+
+def configure_env(llm: StubLLMServer, imap: FakeIMAPServer, smtp: SMTPSink, workdir: str) -> None:
+    """所有外部地址指向本地替身；各 chain 单独命名模型以便分别计数，清除 .env 中可能存在的单独配置"""
+    for key in list(os.environ):
+        if key.startswith(("LLM_", "RESILIENCE_")):
+            del os.environ[key]
+    os.environ.update({
+        "MODEL_NAME": "bench-default",
+        "BASE_URL": llm.base_url,
+        "OPENAI_API_KEY": "bench",
+        "EMBEDDING_MODEL_NAME": "bench-embedding",
+        "IMAP_HOST": "127.0.0.1",
+        "IMAP_PORT": str(imap.port),
+        "SMTP_HOST": smtp.host,
+        "SMTP_PORT": str(smtp.port),
+        "MAIL_USE_SSL": "false",
+        "EMAIL_ACCOUNT": "support@example.com",
+        "EMAIL_FROM": "support@example.com",
+        "EMAIL_PASSWORD": "bench",
+        "EMAIL_DELAY_HOURS": "8",
+        # 实际使用 fakeredis；导入 redis_utils 时的连接尝试只指向本机
+        "REDIS_HOST": "127.0.0.1",
+        "PREFILTER_MODEL_PATH": os.path.join(workdir, "no-prefilter-model.json"),
+        "CHECKPOINT_BACKEND": "memory",
+        "METRICS_PORT": "0",
+        # 模型调用失败时快速暴露，不在基准中重试
+        "RESILIENCE_LLM_RETRIES": "0",
+        "RESILIENCE_EMBEDDING_RETRIES": "0",
+    })
+    for chain in CHAINS:
+        os.environ[f"LLM_{chain.upper()}_MODEL"] = f"bench-{chain}"
+
+
+def main():
+    parser = argparse.ArgumentParser(description="GraphWorkFlow 端到端离线基准")
+    parser.add_argument("--emails", type=int, default=100)
+    parser.add_argument("--concurrency", type=int, default=4, help="并行处理邮件的线程数（对应 WORKER_CONCURRENCY）")
+    parser.add_argument("--llm-latency", type=float, default=0.2, help="每次模型调用的模拟延迟（秒）")
+    parser.add_argument("--embedding-latency", type=float, default=0.02, help="每次 embedding 调用的模拟延迟（秒）")
+    parser.add_argument("--reject-rate", type=float, default=0.1, help="LLM 校对判定不可发送的比例")
+    parser.add_argument("--mix", default="product_enquiry=0.6,customer_complaint=0.15,customer_feedback=0.15,unrelated=0.1",
+                        help="各类邮件比例")
+    parser.add_argument("--dimensions", type=int, default=256)
+    parser.add_argument("--data-dir", default=os.path.join(os.path.dirname(os.path.dirname(os.path.abspath(__file__))), "data"))
+    parser.add_argument("--seed", type=int, default=42)
+    parser.add_argument("--log-level", default="WARNING")
+    parser.add_argument("--report", help="JSON 报告输出路径")
+    args = parser.parse_args()
+
+    mix = {key: float(value) for key, value in (item.split("=") for item in args.mix.split(","))}
+    rng = random.Random(args.seed)
+    workdir = tempfile.mkdtemp(prefix="bench_e2e_")
+
+    llm = StubLLMServer(dimensions=args.dimensions, reject_rate=args.reject_rate, seed=args.seed).start()
+    imap = FakeIMAPServer(generate_emails(args.emails, mix, rng)).start()
+    smtp = SMTPSink().start()
+    configure_env(llm, imap, smtp, workdir)
+
+    # 其他模块导入时即绑定 redis_conn，需先替换为 fakeredis
+    import fakeredis
+    import src.utils.redis_utils as redis_utils
+    redis_utils.get_redis_conn.conn = redis_utils.redis_conn = fakeredis.FakeRedis(decode_responses=True)
+    configure_env(llm, imap, smtp, workdir)  # 导入时 load_dotenv 可能补入了 .env 中的配置
+
+    from langchain_openai import OpenAIEmbeddings
+    from src.checkpoint import get_checkpointer
+    from src.graph import GraphWorkFlow
+    from src.llm import get_chain_llm
+    from src.rag import RAGEngine
+    from src.tools.schema_mail import Email
+    from src.utils.log import setup_logging
+
+    setup_logging(level=args.log_level)
+    try:
+        db = SQLiteMySQL()
+        rag_engine = RAGEngine(
+            db_manager=db,
+            embedding_model_name="bench-embedding",
+            api_key="bench",
+            base_url=llm.base_url,
+            chunk_vector_db_path=os.path.join(workdir, "chunks"),
+            question_vector_db_path=os.path.join(workdir, "questions"),
+            dimensions=args.dimensions,
+            embedding_function=OpenAIEmbeddings(
+                model="bench-embedding", base_url=llm.base_url, api_key="bench",
+                dimensions=args.dimensions, check_embedding_ctx_length=False,
+            ),
+        )
+
+        # 1. 灌库（不计入结果）：data/ 下的文档分块、生成 HyDE 问题
+        start = time.perf_counter()
+        hyde_llm = get_chain_llm("hyde_generation")
+        chunks = questions = 0
+        for name in sorted(os.listdir(args.data_dir)):
+            if name.endswith(".txt"):
+                with open(os.path.join(args.data_dir, name), encoding="utf-8") as f:
+                    chunk_count, question_count = rag_engine.process_document(f.read(), source=name, llm=hyde_llm)
+                chunks += chunk_count
+                questions += question_count
+        print(f"知识库: {chunks} 个文档块 | {questions} 个 HyDE 问题 | 灌库 {time.perf_counter() - start:.1f}s")
+
+        mq = ListMQ()
+        graph = GraphWorkFlow(
+            model_name="bench-default",
+            base_url=llm.base_url,
+            api_key="bench",
+            rag_engine=rag_engine,
+            mq_client=mq,
+            checkpointer=get_checkpointer("memory"),
+        )
+        llm.reset_counters()
+        imap.reset_counters()
+        llm.chat_latency = args.llm_latency
+        llm.embedding_latency = args.embedding_latency
+
+        # 2. 拉取：与 MailRobotService 的 fetcher 相同，认领 + 读取 + 解析
+        start = time.perf_counter()
+        emails = []
+        while len(emails) < args.emails:
+            batch = graph.mail_tools.fetch_unanswered_emails(max_results=args.emails - len(emails))
+            if not batch:
+                break
+            emails.extend(batch)
+        fetch_seconds = time.perf_counter() - start
+
+        # 3. 处理：concurrency 个线程并行执行流程图，与 worker 相同
+        latencies: List[float] = []
+        failures: List[str] = []
+
+        def process(email_info: dict) -> None:
+            begin = time.perf_counter()
+            try:
+                graph.process_email(Email.from_dict(email_info))
+            except Exception as e:
+                failures.append(f"{email_info.get('id')}: {e}")
+            latencies.append(time.perf_counter() - begin)
+
+        start = time.perf_counter()
+        with ThreadPoolExecutor(max_workers=args.concurrency) as pool:
+            list(pool.map(process, emails))
+        process_seconds = time.perf_counter() - start
+        graph.mail_tools.close_smtp()
+    finally:
+        llm.stop()
+        imap.stop()
+        smtp.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+
+    processed = len(emails)
+
+    def per_mail(value: float) -> float:
+        return round(value / processed, 3) if processed else 0.0
+
+    report = {
+        "config": {key: getattr(args, key) for key in
+                   ("emails", "concurrency", "llm_latency", "embedding_latency", "reject_rate", "dimensions", "seed")},
+        "mix": mix,
+        "fetched": processed,
+        "failed": len(failures),
+        "fetch_seconds": round(fetch_seconds, 3),
+        "process_seconds": round(process_seconds, 3),
+        "mails_per_minute": round(processed / (fetch_seconds + process_seconds) * 60, 1) if processed else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 1),
+            "p95": round(percentile(latencies, 95) * 1000, 1),
+            "mean": round(statistics.mean(latencies) * 1000, 1) if latencies else 0.0,
+        },
+        "outcomes": {"sent": len(smtp.messages), "manual": len(mq.tasks),
+                     "other": processed - len(smtp.messages) - len(mq.tasks)},
+        "calls_per_mail": {
+            **{chain: per_mail(llm.counters[f"chat:bench-{chain}"]) for chain in CHAINS if chain != "hyde_generation"},
+            "embedding_calls": per_mail(llm.counters["embedding_calls"]),
+            "embedding_inputs": per_mail(llm.counters["embedding_inputs"]),
+            "imap_commands": per_mail(sum(imap.counters.values())),
+            "mysql_queries": per_mail(db.queries),
+        },
+    }
+
+    print(f"邮件: {processed} 封 | 失败 {len(failures)} | 并发 {args.concurrency} "
+          f"| 模型延迟 {args.llm_latency * 1000:.0f}ms | embedding 延迟 {args.embedding_latency * 1000:.0f}ms")
+    print(f"拉取 {fetch_seconds:7.2f}s | 处理 {process_seconds:7.2f}s | 吞吐 {report['mails_per_minute']:8.1f} 封/分钟")
+    print(f"单封延迟 p50 {report['latency_ms']['p50']:8.1f}ms | p95 {report['latency_ms']['p95']:8.1f}ms")
+    print("结果: " + " | ".join(f"{key} {value}" for key, value in report["outcomes"].items()))
+    print("每封调用: " + " | ".join(f"{key} {value}" for key, value in report["calls_per_mail"].items()))
+    for failure in failures[:5]:
+        print(f"失败: {failure}")
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"报告已写入 {args.report}")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,97 @@
+"""
+邮件解析吞吐基准：拉取线程内逐封解析 vs MailParser 进程池并行解析，并统计正文规范化前后的 token 数
+
+用法：
+    # 使用已有的 .eml 语料（如从邮箱导出的积压邮件）
+    python benchmarks/bench_mail_parse.py --corpus ./eml_samples
+    # 没有语料时生成 HTML 较重的合成邮件
+    python benchmarks/bench_mail_parse.py --generate 2000 --workers 2 4 8
+"""
+import argparse
+import os
+import sys
+import tempfile
+import time
+from email.mime.multipart import MIMEMultipart
+from email.mime.text import MIMEText
+from email.header import Header
+from typing import List, Tuple
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from src.tools.mail_parser import MailParser
+
+
+def generate_corpus(directory: str, count: int) -> None:
+    """生成类似营销邮件/长回复链的合成语料：仅含 HTML 正文，大量内联样式与表格"""
+    row = '<tr><td style="padding:8px;font-family:Arial;color:#333">产品编号 {i} 的详细说明与价格</td>' \
+          '<td><img src="https://track.example.com/p/{i}.gif" width="1" height="1"></td></tr>'
+    for n in range(count):
+        msg = MIMEMultipart("alternative")
+        msg["From"] = f"newsletter{n}@example.com"
+        msg["To"] = "support@example.com"
+        msg["Subject"] = Header(f"第 {n} 期产品周报：新品上架与售后政策说明", "utf-8").encode()
+        msg["Message-ID"] = f"<bench-{n}@example.com>"
+        html = "<html><body><table>" + "".join(row.format(i=i) for i in range(300)) + "</table></body></html>"
+        msg.attach(MIMEText(html, "html", "utf-8"))
+        with open(os.path.join(directory, f"{n:05d}.eml"), "wb") as f:
+            f.write(msg.as_bytes())
+
+
+def load_corpus(directory: str) -> List[Tuple[str, bytes]]:
+    corpus = []
+    for name in sorted(os.listdir(directory)):
+        if name.endswith(".eml"):
+            with open(os.path.join(directory, name), "rb") as f:
+                corpus.append((name, f.read()))
+    return corpus
+
+
+def bench(name: str, parser: MailParser, corpus: List[Tuple[str, bytes]]) -> float:
+    start = time.perf_counter()
+    first = None
+    parsed = failed = raw_tokens = body_tokens = 0
+    for _, email_info, error in parser.parse_many(iter(corpus)):
+        if first is None:
+            first = time.perf_counter() - start
+        if error is None:
+            parsed += 1
+            raw_tokens += email_info["body_tokens_raw"]
+            body_tokens += email_info["body_tokens"]
+        else:
+            failed += 1
+    elapsed = time.perf_counter() - start
+    print(f"{name:<16} {parsed:>6} 封 | 失败 {failed:>3} | {elapsed:7.3f}s | {parsed / elapsed:9.1f} 封/s "
+          f"| 首封产出 {first * 1000 if first else 0:7.1f}ms | 正文 token {raw_tokens} → {body_tokens}")
+    return elapsed
+
+
+def main():
+    parser = argparse.ArgumentParser(description="邮件解析吞吐基准")
+    parser.add_argument("--corpus", help=".eml 语料目录")
+    parser.add_argument("--generate", type=int, default=1000, help="未指定语料时生成的合成邮件数")
+    parser.add_argument("--workers", type=int, nargs="+", default=[2, 4, os.cpu_count() or 4])
+    parser.add_argument("--token-budget", type=int, default=1500, help="正文 token 上限，0 表示不截断")
+    args = parser.parse_args()
+
+    if args.corpus:
+        corpus = load_corpus(args.corpus)
+    else:
+        with tempfile.TemporaryDirectory() as tmp:
+            generate_corpus(tmp, args.generate)
+            corpus = load_corpus(tmp)
+    total_mb = sum(len(raw) for _, raw in corpus) / 1024 / 1024
+    print(f"语料: {len(corpus)} 封 | {total_mb:.1f} MB | CPU: {os.cpu_count()}")
+
+    baseline = bench("inline", MailParser(max_workers=0, token_budget=args.token_budget), corpus)
+    for workers in sorted(set(args.workers)):
+        mail_parser = MailParser(max_workers=workers, token_budget=args.token_budget)
+        # 预热进程池，避免把进程启动时间计入
+        list(mail_parser.parse_many(corpus[:workers]))
+        elapsed = bench(f"pool x{workers}", mail_parser, corpus)
+        mail_parser.close()
+        print(f"{'':<16} 加速比 {baseline / elapsed:.2f}x")
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,103 @@
+"""
+MySQLManager 写入/读取吞吐微基准：逐行 execute_query vs execute_many vs transaction（含预编译语句），以及 iter_query 流式读取
+
+用法（先启动 docker-compose 中的 MySQL，并配置 .env）：
+    python benchmarks/bench_mysql_bulk.py --rows 5000
+"""
+import argparse
+import os
+import sys
+import time
+import uuid
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from src.utils.database import MySQLManager
+
+TABLE = "bench_chunk_metadata"
+INSERT_SQL = f"""
+    INSERT INTO {TABLE} (chunk_id, source, document_id, chunk_index)
+    VALUES (%s, %s, %s, %s)
+    ON DUPLICATE KEY UPDATE source = VALUES(source)
+"""
+
+
+def make_rows(n: int):
+    document_id = str(uuid.uuid4())
+    return [(str(uuid.uuid4()), "bench.txt", document_id, i) for i in range(n)]
+
+
+def reset_table(db: MySQLManager):
+    db.execute_query(f"DROP TABLE IF EXISTS {TABLE}", commit=True)
+    db.execute_query(f"""
+        CREATE TABLE {TABLE} (
+            chunk_id VARCHAR(36) PRIMARY KEY,
+            source VARCHAR(255) NOT NULL,
+            document_id VARCHAR(36) NOT NULL,
+            chunk_index INT NOT NULL
+        )
+    """, commit=True)
+
+
+def bench(name: str, n: int, fn):
+    start = time.perf_counter()
+    fn()
+    elapsed = time.perf_counter() - start
+    print(f"{name:<28} {n:>8} 行 | {elapsed:8.3f}s | {n / elapsed:10.1f} rows/s")
+
+
+def main():
+    parser = argparse.ArgumentParser(description="MySQLManager 批量接口微基准")
+    parser.add_argument("--rows", type=int, default=5000)
+    args = parser.parse_args()
+
+    db = MySQLManager(
+        host=os.getenv("MYSQL_HOST"),
+        port=int(os.getenv("MYSQL_PORT")),
+        user=os.getenv("MYSQL_USER"),
+        password=os.getenv("MYSQL_PASSWORD", ""),
+        db_name=os.getenv("MYSQL_DB_NAME"),
+    )
+
+    try:
+        reset_table(db)
+        rows = make_rows(args.rows)
+        bench("逐行 execute_query", args.rows,
+              lambda: [db.execute_query(INSERT_SQL, row, commit=True) for row in rows])
+
+        reset_table(db)
+        rows = make_rows(args.rows)
+
+        def run_transaction():
+            with db.transaction() as tx:
+                for row in rows:
+                    tx.execute(INSERT_SQL, row)
+        bench("transaction 单连接单提交", args.rows, run_transaction)
+
+        reset_table(db)
+        rows = make_rows(args.rows)
+        bench("execute_many 多值插入", args.rows, lambda: db.execute_many(INSERT_SQL, rows))
+
+        reset_table(db)
+        rows = make_rows(args.rows)
+
+        def run_prepared_transaction():
+            with db.transaction() as tx:
+                for row in rows:
+                    tx.execute(INSERT_SQL, row, prepared=True)
+        bench("transaction + 预编译语句", args.rows, run_prepared_transaction)
+
+        bench("execute_query 全量读取", args.rows,
+              lambda: db.execute_query(f"SELECT * FROM {TABLE}", dictionary=True))
+        bench("iter_query 流式读取", args.rows,
+              lambda: sum(1 for _ in db.iter_query(f"SELECT * FROM {TABLE}", dictionary=True)))
+        print(f"连接池统计: {db.pool_stats()}")
+    finally:
+        db.execute_query(f"DROP TABLE IF EXISTS {TABLE}", commit=True)
+
+
+if __name__ == "__main__":
+    main()
@@ -0,0 +1,287 @@
+"""
+RAG 检索评测：在 data/ 语料上比较 direct / HyDE / merged 三种检索方式的召回质量、检索延迟与参考信息 token 数
+
+- 评测集 benchmarks/rag_eval_set.json：客户式提问 → (source, answer)，source 文件中包含 answer 原文的文档块为相关块，
+  不依赖分块参数，调整 chunk_size / chunk_overlap 后仍可直接评测
+- 指标：recall@k（前 k 个结果中命中相关块的问题比例）、MRR、每种方式的检索延迟 p50/p95（不含 query embedding）、
+  assemble_context 后参考信息的 token 数（即写作提示词中 RAG 部分的大小）
+- embedding：默认使用确定性的字符 n-gram 哈希向量（不访问网络，结果可复现，适合比较同一语料上的参数改动）；
+  --record-fixture 调用真实 embedding 接口（BASE_URL / EMBEDDING_MODEL_NAME / DASHSCOPE_API_KEY）并缓存向量，
+  之后用 --embedding-fixture 离线回放
+- HyDE 问题由本地模型替身从文档块中抽取句子生成（见 fake_services.StubLLMServer），每次相同
+
+用法（除项目依赖外需要 langchain-openai）：
+    python benchmarks/bench_rag.py --chunk-size 500 --top-k 3 --report ./rag_report.json
+    python benchmarks/bench_rag.py --record-fixture --embedding-fixture ./rag_embeddings.json
+    python benchmarks/bench_rag.py --embedding-fixture ./rag_embeddings.json --chunk-size 300
+"""
+import argparse
+import hashlib
+import json
+import os
+import shutil
+import statistics
+import sys
+import tempfile
+import time
+from typing import Dict, List, Optional
+
+sys.path.insert(0, os.path.dirname(os.path.dirname(os.path.abspath(__file__))))
+
+from dotenv import load_dotenv
+load_dotenv()
+
+from benchmarks.fake_services import SQLiteMySQL, StubLLMServer, hashed_embedding
+
+ROOT = os.path.dirname(os.path.dirname(os.path.abspath(__file__)))
+MODES = ("direct", "hyde", "merged")
+
+
+def percentile(values: List[float], pct: float) -> float:
+    """计算百分位（最近秩法）"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[rank]
+
+
+class EmbeddingFixture:
+    """
+    embedding 缓存（文本 sha1 → 向量）：record 时未命中的文本调用真实接口并写入缓存，回放时未命中的文本退化为哈希向量
+    """
+    BATCH_SIZE = 10
+
+    def __init__(self, path: str, record: bool):
+        self.path = path
+        self.record = record
+        self.vectors: Dict[str, List[float]] = {}
+        self.misses = 0
+        self.client = None
+        if os.path.exists(path):
+            with open(path, encoding="utf-8") as f:
+                self.vectors = json.load(f)["vectors"]
+        if record:
+            from openai import OpenAI
+            self.client = OpenAI(api_key=os.getenv("DASHSCOPE_API_KEY"), base_url=os.getenv("BASE_URL"))
+            self.model = os.getenv("EMBEDDING_MODEL_NAME")
+
+    @staticmethod
+    def key(text: str, dimensions: int) -> str:
+        return hashlib.sha1(f"{dimensions}:{text}".encode("utf-8")).hexdigest()
+
+    def __call__(self, texts: List[str], dimensions: int) -> List[List[float]]:
+        keys = [self.key(text, dimensions) for text in texts]
+        missing = [text for text, key in zip(texts, keys) if key not in self.vectors]
+        if missing and self.record:
+            for i in range(0, len(missing), self.BATCH_SIZE):
+                batch = missing[i:i + self.BATCH_SIZE]
+                response = self.client.embeddings.create(
+                    model=self.model, input=batch, dimensions=dimensions, encoding_format="float",
+                )
+                for text, item in zip(batch, response.data):
+                    self.vectors[self.key(text, dimensions)] = item.embedding
+        elif missing:
+            self.misses += len(missing)
+        return [self.vectors.get(key) or hashed_embedding(text, dimensions) for text, key in zip(texts, keys)]
+
+    def save(self) -> None:
+        with open(self.path, "w", encoding="utf-8") as f:
+            json.dump({"model": getattr(self, "model", None), "vectors": self.vectors}, f)
+
+
+def first_relevant_rank(results: List[Dict], item: Dict) -> Optional[int]:
+    """结果列表中第一个相关文档块的排名（从 1 开始），没有时返回 None"""
+    for rank, result in enumerate(results, start=1):
+        if result.get("source") == item["source"] and item["answer"] in result.get("content", ""):
+            return rank
+    return None
+
+
+def summarize(ranks: List[Optional[int]], latencies: List[float], context_tokens: List[int],
+              raw_tokens: List[int], ks: List[int]) -> Dict:
+    count = len(ranks)
+    return {
+        **{f"recall@{k}": round(sum(1 for r in ranks if r and r <= k) / count, 3) if count else 0.0 for k in ks},
+        "mrr": round(sum(1 / r for r in ranks if r) / count, 3) if count else 0.0,
+        "latency_ms": {
+            "p50": round(percentile(latencies, 50) * 1000, 2),
+            "p95": round(percentile(latencies, 95) * 1000, 2),
+        },
+        "context_tokens": round(statistics.mean(context_tokens), 1) if context_tokens else 0.0,
+        "raw_tokens": round(statistics.mean(raw_tokens), 1) if raw_tokens else 0.0,
+    }
+
+
+def main():
+    parser = argparse.ArgumentParser(description="RAG 检索召回与延迟评测")
+    parser.add_argument("--eval-set", default=os.path.join(ROOT, "benchmarks", "rag_eval_set.json"))
+    parser.add_argument("--data-dir", default=os.path.join(ROOT, "data"))
+    parser.add_argument("--chunk-size", type=int, default=500)
+    parser.add_argument("--chunk-overlap", type=int, default=50)
+    parser.add_argument("--top-k", type=int, default=3, help="每个查询在 Chroma 中检索的数量（RAGEngine.top_k）")
+    parser.add_argument("--top-n", type=int, default=8, help="合并排序后保留的数量（merge_and_rerank 的 top_n）")
+    parser.add_argument("--ks", type=int, nargs="+", default=[1, 3, 5, 8])
+    parser.add_argument("--dimensions", type=int, default=256)
+    parser.add_argument("--context-budget", type=int, default=int(os.getenv("RAG_CONTEXT_TOKEN_BUDGET", 1200)))
+    parser.add_argument("--embedding-latency", type=float, default=0.0, help="每次 embedding 调用的模拟延迟（秒）")
+    parser.add_argument("--repeat", type=int, default=3, help="每个问题的检索重复次数（取各次延迟）")
+    parser.add_argument("--embedding-fixture", help="embedding 缓存文件（回放或 --record-fixture 写入）")
+    parser.add_argument("--record-fixture", action="store_true", help="调用真实 embedding 接口并写入 --embedding-fixture")
+    parser.add_argument("--report", help="JSON 报告输出路径")
+    args = parser.parse_args()
+    if args.record_fixture and not args.embedding_fixture:
+        parser.error("--record-fixture 需要同时指定 --embedding-fixture")
+
+    with open(args.eval_set, encoding="utf-8") as f:
+        items = json.load(f)["items"]
+
+    fixture = EmbeddingFixture(args.embedding_fixture, args.record_fixture) if args.embedding_fixture else None
+    llm = StubLLMServer(dimensions=args.dimensions, embedding_fn=fixture).start()
+    # HyDE 问题生成固定走本地替身，不使用 .env 中为各 chain 单独配置的模型与重试/熔断参数
+    for key in list(os.environ):
+        if key.startswith(("LLM_", "RESILIENCE_")):
+            del os.environ[key]
+
+    from langchain_openai import OpenAIEmbeddings
+    from src.context import assemble_context
+    from src.llm import get_chain_llm
+    from src.rag import RAGEngine
+    from src.utils.log import setup_logging
+    from src.utils.tokens import count_tokens
+
+    setup_logging(level="WARNING")
+    workdir = tempfile.mkdtemp(prefix="bench_rag_")
+    try:
+        rag_engine = RAGEngine(
+            db_manager=SQLiteMySQL(),
+            embedding_model_name="bench-embedding",
+            api_key="bench",
+            base_url=llm.base_url,
+            chunk_vector_db_path=os.path.join(workdir, "chunks"),
+            question_vector_db_path=os.path.join(workdir, "questions"),
+            dimensions=args.dimensions,
+            top_k=args.top_k,
+            chunk_size=args.chunk_size,
+            chunk_overlap=args.chunk_overlap,
+            embedding_function=OpenAIEmbeddings(
+                model="bench-embedding", base_url=llm.base_url, api_key="bench",
+                dimensions=args.dimensions, check_embedding_ctx_length=False,
+            ),
+        )
+
+        # 1. 灌库
+        start = time.perf_counter()
+        hyde_llm = get_chain_llm("hyde_generation", "bench-hyde_generation", llm.base_url, "bench")
+        chunks = questions = 0
+        for name in sorted(os.listdir(args.data_dir)):
+            if name.endswith(".txt"):
+                with open(os.path.join(args.data_dir, name), encoding="utf-8") as f:
+                    chunk_count, question_count = rag_engine.process_document(f.read(), source=name, llm=hyde_llm)
+                chunks += chunk_count
+                questions += question_count
+        ingest_seconds = time.perf_counter() - start
+
+        # 答案被分块切断、任何文档块都不完整包含时，该问题无法命中，不计入指标
+        stored = rag_engine.chunk_vector_db.get()
+        stored_chunks = [
+            {"content": content, "source": metadata.get("source")}
+            for content, metadata in zip(stored.get("documents") or [], stored.get("metadatas") or [])
+        ]
+        reachable = [item for item in items if first_relevant_rank(stored_chunks, item)]
+        unreachable = [item["question"] for item in items if item not in reachable]
+
+        # 2. 逐题检索：query embedding 三种方式共用，只计一次
+        llm.embedding_latency = args.embedding_latency
+        embed_latencies: List[float] = []
+        ranks: Dict[str, List[Optional[int]]] = {mode: [] for mode in MODES}
+        latencies: Dict[str, List[float]] = {mode: [] for mode in MODES}
+        context_tokens: Dict[str, List[int]] = {mode: [] for mode in MODES}
+        raw_tokens: Dict[str, List[int]] = {mode: [] for mode in MODES}
+        details = []
+        for item in reachable:
+            queries = [item["question"]]
+            detail = {"question": item["question"]}
+            for _ in range(args.repeat):
+                start = time.perf_counter()
+                query_embeddings = rag_engine.embed_queries(queries)
+                embed_latencies.append(time.perf_counter() - start)
+
+                start = time.perf_counter()
+                direct_results = rag_engine.retrieve_direct(queries, query_embeddings=query_embeddings)
+                direct_seconds = time.perf_counter() - start
+                start = time.perf_counter()
+                hyde_results = rag_engine.retrieve_hyde(queries, query_embeddings=query_embeddings)
+                hyde_seconds = time.perf_counter() - start
+
+                timed = {}
+                start = time.perf_counter()
+                timed["direct"] = rag_engine.merge_and_rerank(direct_results, [], top_n=args.top_n)
+                timed_direct = direct_seconds + time.perf_counter() - start
+                start = time.perf_counter()
+                timed["hyde"] = rag_engine.merge_and_rerank([], hyde_results, top_n=args.top_n)
+                timed_hyde = hyde_seconds + time.perf_counter() - start
+                start = time.perf_counter()
+                timed["merged"] = rag_engine.merge_and_rerank(direct_results, hyde_results, top_n=args.top_n)
+                timed_merged = direct_seconds + hyde_seconds + time.perf_counter() - start
+                latencies["direct"].append(timed_direct)
+                latencies["hyde"].append(timed_hyde)
+                latencies["merged"].append(timed_merged)
+
+            # 排名与 token 数取最后一次（检索结果是确定的）
+            for mode in MODES:
+                results = timed[mode]
+                rank = first_relevant_rank(results, item)
+                ranks[mode].append(rank)
+                context, _ = assemble_context(results, args.context_budget)
+                context_tokens[mode].append(count_tokens(context))
+                raw_tokens[mode].append(sum(count_tokens(result["content"]) for result in results))
+                detail[mode] = rank
+            details.append(detail)
+    finally:
+        llm.stop()
+        shutil.rmtree(workdir, ignore_errors=True)
+        if fixture and args.record_fixture:
+            fixture.save()
+
+    report = {
+        "config": {key: getattr(args, key) for key in
+                   ("chunk_size", "chunk_overlap", "top_k", "top_n", "dimensions", "context_budget", "repeat")},
+        "embeddings": "fixture" if fixture else "hashed",
+        "fixture_misses": fixture.misses if fixture else 0,
+        "corpus": {"chunks": chunks, "hyde_questions": questions, "ingest_seconds": round(ingest_seconds, 2)},
+        "questions": len(items),
+        "evaluated": len(reachable),
+        "unreachable": unreachable,
+        "embed_latency_ms": {
+            "p50": round(percentile(embed_latencies, 50) * 1000, 2),
+            "p95": round(percentile(embed_latencies, 95) * 1000, 2),
+        },
+        "modes": {
+            mode: summarize(ranks[mode], latencies[mode], context_tokens[mode], raw_tokens[mode], args.ks)
+            for mode in MODES
+        },
+        "details": details,
+    }
+
+    print(f"语料: {chunks} 个文档块 | {questions} 个 HyDE 问题 | 灌库 {ingest_seconds:.1f}s "
+          f"| embedding: {report['embeddings']}")
+    print(f"评测问题: {len(reachable)}/{len(items)}（{len(unreachable)} 个答案被分块切断）"
+          f" | query embedding p50 {report['embed_latency_ms']['p50']:.2f}ms")
+    header = " ".join(f"{f'R@{k}':>6}" for k in args.ks)
+    print(f"{'mode':<8} {header} {'MRR':>6} {'p50 ms':>8} {'p95 ms':>8} {'ctx tok':>8} {'raw tok':>8}")
+    for mode in MODES:
+        summary = report["modes"][mode]
+        recalls = " ".join(f"{summary[f'recall@{k}']:>6.3f}" for k in args.ks)
+        print(f"{mode:<8} {recalls} {summary['mrr']:>6.3f} {summary['latency_ms']['p50']:>8.2f} "
+              f"{summary['latency_ms']['p95']:>8.2f} {summary['context_tokens']:>8.1f} {summary['raw_tokens']:>8.1f}")
+    if fixture and fixture.misses:
+        print(f"注意: {fixture.misses} 段文本不在 embedding 缓存中，已使用哈希向量代替（可用 --record-fixture 补全）")
+    if args.report:
+        with open(args.report, "w", encoding="utf-8") as f:
+            json.dump(report, f, ensure_ascii=False, indent=2)
+        print(f"报告已写入 {args.report}")
+
+
+if __name__ == "__main__":
+    main()
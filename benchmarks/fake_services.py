@@ -0,0 +1,519 @@
+"""
+离线基准测试用的本地替身服务，全部监听 127.0.0.1，不访问外网：
+- FakeIMAPServer：最小 IMAP4rev1 服务（LOGIN / SELECT / UID SEARCH / UID FETCH / UID STORE），收件箱预置 .eml
+- SMTPSink：aiosmtpd 收信端，只计数不投递
+- StubLLMServer：OpenAI 兼容的 /chat/completions（含 tools、json_schema 与流式）与 /embeddings，可配置延迟
+- SQLiteMySQL：RAG 检索用到的 MySQLManager 接口（execute_query / execute_many），数据放在内存 SQLite
+- ListMQ：转人工任务只记录在内存列表
+embedding 使用字符 n-gram 哈希向量（hashed_embedding），同一文本每次结果相同，字面相近的文本向量也相近
+"""
+import base64
+import hashlib
+import json
+import math
+import re
+import socketserver
+import sqlite3
+import struct
+import threading
+import time
+import uuid
+from collections import Counter
+from http.server import BaseHTTPRequestHandler, ThreadingHTTPServer
+from typing import Callable, Dict, List, Optional, Sequence, Tuple
+
+
+def hashed_embedding(text: str, dimensions: int) -> List[float]:
+    """字符 unigram + bigram 哈希到固定维度并归一化（不依赖模型，结果确定）"""
+    chars = [c for c in text.lower() if c.isalnum()]
+    grams = chars + [a + b for a, b in zip(chars, chars[1:])]
+    vector = [0.0] * dimensions
+    for gram in grams:
+        digest = hashlib.md5(gram.encode("utf-8")).digest()
+        index = int.from_bytes(digest[:4], "little") % dimensions
+        vector[index] += 1.0 if digest[4] & 1 else -1.0
+    norm = math.sqrt(sum(v * v for v in vector))
+    if norm == 0:
+        vector[0] = 1.0
+        return vector
+    return [v / norm for v in vector]
+
+
+class _CountingServer:
+    """各替身服务共用的线程安全计数器"""
+    def _init_counters(self) -> None:
+        self._counter_lock = threading.Lock()
+        self.counters: Counter = Counter()
+
+    def count(self, key: str, amount: int = 1) -> None:
+        with self._counter_lock:
+            self.counters[key] += amount
+
+    def reset_counters(self) -> None:
+        with self._counter_lock:
+            self.counters.clear()
+
+
+# ---------------------------------------------------------------------------
+# IMAP
+# ---------------------------------------------------------------------------
+
+class _IMAPHandler(socketserver.StreamRequestHandler):
+    server: "FakeIMAPServer"
+
+    def _send(self, line: str) -> None:
+        self.wfile.write(line.encode("utf-8") + b"\r\n")
+
+    def handle(self) -> None:
+        self._send("* OK [CAPABILITY IMAP4rev1] fake IMAP ready")
+        while True:
+            line = self.rfile.readline()
+            if not line:
+                return
+            tag, _, rest = line.decode("utf-8", "replace").rstrip("\r\n").partition(" ")
+            command, _, args = rest.partition(" ")
+            command = command.upper()
+            if command == "UID":
+                sub_command, _, args = args.partition(" ")
+                command = f"UID {sub_command.upper()}"
+            self.server.count(command)
+            if command == "LOGOUT":
+                self._send("* BYE fake IMAP logging out")
+                self._send(f"{tag} OK LOGOUT completed")
+                return
+            handler = {
+                "CAPABILITY": self._capability,
+                "LOGIN": self._ok,
+                "NOOP": self._ok,
+                "SELECT": self._select,
+                "UID SEARCH": self._search,
+                "UID FETCH": self._fetch,
+                "UID STORE": self._store,
+            }.get(command)
+            if handler is None:
+                self._send(f"{tag} BAD unsupported command {command}")
+            else:
+                handler(tag, command, args)
+            self.wfile.flush()
+
+    def _ok(self, tag: str, command: str, args: str) -> None:
+        self._send(f"{tag} OK {command} completed")
+
+    def _capability(self, tag: str, command: str, args: str) -> None:
+        self._send("* CAPABILITY IMAP4rev1")
+        self._ok(tag, command, args)
+
+    def _select(self, tag: str, command: str, args: str) -> None:
+        self._send(f"* {len(self.server.messages)} EXISTS")
+        self._send("* 0 RECENT")
+        self._send("* OK [UIDVALIDITY 1] UIDs valid")
+        self._send(f"{tag} OK [READ-WRITE] SELECT completed")
+
+    def _search(self, tag: str, command: str, args: str) -> None:
+        # 只支持 UNSEEN；SINCE 条件忽略（预置邮件都视为在时间窗口内）
+        uids = self.server.unseen_uids()
+        self._send("* SEARCH" + "".join(f" {uid}" for uid in uids))
+        self._ok(tag, command, args)
+
+    def _fetch(self, tag: str, command: str, args: str) -> None:
+        uid = args.split(" ", 1)[0]
+        found = self.server.get(uid)
+        if found:
+            seq, raw = found
+            self.wfile.write(f"* {seq} FETCH (UID {uid} BODY[] {{{len(raw)}}}\r\n".encode("ascii") + raw + b")\r\n")
+        self._ok(tag, command, args)
+
+    def _store(self, tag: str, command: str, args: str) -> None:
+        uid = args.split(" ", 1)[0]
+        seq = self.server.mark_seen(uid)
+        if seq:
+            self._send(f"* {seq} FETCH (UID {uid} FLAGS (\\Seen))")
+        self._ok(tag, command, args)
+
+
+class FakeIMAPServer(_CountingServer, socketserver.ThreadingTCPServer):
+    """
+    收件箱预置若干 .eml 的 IMAP 服务（明文，需配合 MAIL_USE_SSL=false）
+    counters 记录各命令的调用次数
+    """
+    allow_reuse_address = True
+    daemon_threads = True
+
+    def __init__(self, messages: Sequence[bytes], host: str = "127.0.0.1", port: int = 0):
+        super().__init__((host, port), _IMAPHandler)
+        self._init_counters()
+        self._lock = threading.Lock()
+        # uid -> [序号, 原始邮件, 是否已读]
+        self.messages: Dict[str, list] = {
+            str(uid): [uid, raw, False] for uid, raw in enumerate(messages, start=1)
+        }
+        self._thread = threading.Thread(target=self.serve_forever, name="fake-imap", daemon=True)
+
+    @property
+    def port(self) -> int:
+        return self.server_address[1]
+
+    def start(self) -> "FakeIMAPServer":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+    def unseen_uids(self) -> List[str]:
+        with self._lock:
+            return [uid for uid, (_, _, seen) in self.messages.items() if not seen]
+
+    def get(self, uid: str) -> Optional[Tuple[int, bytes]]:
+        with self._lock:
+            message = self.messages.get(uid)
+            return (message[0], message[1]) if message else None
+
+    def mark_seen(self, uid: str) -> Optional[int]:
+        with self._lock:
+            message = self.messages.get(uid)
+            if not message:
+                return None
+            message[2] = True
+            return message[0]
+
+
+# ---------------------------------------------------------------------------
+# SMTP
+# ---------------------------------------------------------------------------
+
+class SMTPSink:
+    """aiosmtpd 收信端（接受任意账号登录），messages 中保存收到的原始邮件"""
+    def __init__(self, host: str = "127.0.0.1", port: int = 0):
+        from aiosmtpd.controller import Controller
+        from aiosmtpd.smtp import AuthResult
+
+        self.messages: List[bytes] = []
+        self._lock = threading.Lock()
+        self.host = host
+        self.port = port or _free_port(host)
+        self.controller = Controller(
+            self, hostname=host, port=self.port,
+            authenticator=lambda *args: AuthResult(success=True),
+            auth_require_tls=False,
+        )
+
+    async def handle_DATA(self, server, session, envelope) -> str:
+        with self._lock:
+            self.messages.append(envelope.content)
+        return "250 OK"
+
+    def start(self) -> "SMTPSink":
+        self.controller.start()
+        return self
+
+    def stop(self) -> None:
+        self.controller.stop()
+
+
+def _free_port(host: str) -> int:
+    with socketserver.TCPServer((host, 0), socketserver.BaseRequestHandler) as server:
+        return server.server_address[1]
+
+
+# ---------------------------------------------------------------------------
+# OpenAI 兼容模型服务
+# ---------------------------------------------------------------------------
+
+_SENTENCE_SPLIT_RE = re.compile(r"[。！？!?；;\n]+")
+_COMPLAINT_RE = re.compile(r"投诉|退款|失望|无法使用|扣费|太差")
+_FEEDBACK_RE = re.compile(r"建议|反馈|希望增加|很喜欢|体验不错")
+
+STUB_REPLY = (
+    "您好，感谢您的来信。关于您咨询的问题，我们已经根据产品说明为您整理了相关信息："
+    "软件支持主流手机系统与常见可穿戴设备，您可以在设置中查看账号与订阅的详细说明，"
+    "训练计划会根据您的运动数据自动调整。如果还有其他疑问，欢迎随时回复本邮件，我们会尽快为您解答。祝您运动愉快！"
+)
+
+
+class _LLMHandler(BaseHTTPRequestHandler):
+    server: "StubLLMServer"
+    protocol_version = "HTTP/1.1"
+
+    def log_message(self, format, *args) -> None:
+        pass
+
+    def do_POST(self) -> None:
+        body = json.loads(self.rfile.read(int(self.headers.get("Content-Length", 0))) or b"{}")
+        if self.path.endswith("/chat/completions"):
+            self._chat(body)
+        elif self.path.endswith("/embeddings"):
+            self._embeddings(body)
+        else:
+            self._json(404, {"error": {"message": f"unknown path {self.path}"}})
+
+    def _json(self, status: int, data: dict) -> None:
+        payload = json.dumps(data, ensure_ascii=False).encode("utf-8")
+        self.send_response(status)
+        self.send_header("Content-Type", "application/json")
+        self.send_header("Content-Length", str(len(payload)))
+        self.end_headers()
+        self.wfile.write(payload)
+
+    def _embeddings(self, body: dict) -> None:
+        inputs = body.get("input") or []
+        if isinstance(inputs, str):
+            inputs = [inputs]
+        dimensions = int(body.get("dimensions") or self.server.dimensions)
+        self.server.count("embedding_calls")
+        self.server.count("embedding_inputs", len(inputs))
+        time.sleep(self.server.embedding_latency)
+        data = []
+        for i, vector in enumerate(self.server.embed([str(text) for text in inputs], dimensions)):
+            if body.get("encoding_format") == "base64":
+                vector = base64.b64encode(struct.pack(f"<{dimensions}f", *vector)).decode("ascii")
+            data.append({"object": "embedding", "index": i, "embedding": vector})
+        tokens = sum(len(str(text)) for text in inputs)
+        self._json(200, {
+            "object": "list", "data": data, "model": body.get("model", "stub-embedding"),
+            "usage": {"prompt_tokens": tokens, "total_tokens": tokens},
+        })
+
+    def _chat(self, body: dict) -> None:
+        model = body.get("model", "stub")
+        messages = body.get("messages") or []
+        self.server.count(f"chat:{model}")
+        time.sleep(self.server.chat_latency)
+
+        user_text = _last_user_text(messages)
+        message: dict = {"role": "assistant", "content": None}
+        finish_reason = "stop"
+        tools = body.get("tools") or []
+        response_format = body.get("response_format") or {}
+        if tools:
+            function = tools[0]["function"]
+            arguments = self.server.fake_object(function.get("parameters") or {}, user_text)
+            message["tool_calls"] = [{
+                "id": f"call_{uuid.uuid4().hex[:12]}", "type": "function",
+                "function": {"name": function["name"], "arguments": json.dumps(arguments, ensure_ascii=False)},
+            }]
+            finish_reason = "tool_calls"
+            completion_text = message["tool_calls"][0]["function"]["arguments"]
+        else:
+            schema = (response_format.get("json_schema") or {}).get("schema") or {"properties": {"content": {}}}
+            message["content"] = json.dumps(self.server.fake_object(schema, user_text), ensure_ascii=False)
+            completion_text = message["content"]
+
+        # token 数按字符数粗略估算，足够比较各 chain 的相对用量
+        prompt_tokens = sum(len(str(m.get("content") or "")) for m in messages) // 2
+        usage = {
+            "prompt_tokens": prompt_tokens,
+            "completion_tokens": len(completion_text) // 2,
+            "total_tokens": prompt_tokens + len(completion_text) // 2,
+            "prompt_tokens_details": {"cached_tokens": 0},
+        }
+        if body.get("stream"):
+            self._stream(model, message, finish_reason, usage, (body.get("stream_options") or {}).get("include_usage"))
+            return
+        self._json(200, {
+            "id": f"chatcmpl-{uuid.uuid4().hex[:12]}", "object": "chat.completion", "created": int(time.time()),
+            "model": model,
+            "choices": [{"index": 0, "message": message, "finish_reason": finish_reason}],
+            "usage": usage,
+        })
+
+    def _stream(self, model: str, message: dict, finish_reason: str, usage: dict, include_usage: bool) -> None:
+        """SSE 流式输出：正文分成若干块，最后一块带 finish_reason，include_usage 时再附 token 用量"""
+        self.send_response(200)
+        self.send_header("Content-Type", "text/event-stream")
+        self.send_header("Connection", "close")
+        self.end_headers()
+        self.close_connection = True
+        base = {"id": f"chatcmpl-{uuid.uuid4().hex[:12]}", "object": "chat.completion.chunk",
+                "created": int(time.time()), "model": model}
+
+        def send(choices: list, **extra) -> None:
+            data = json.dumps({**base, "choices": choices, **extra}, ensure_ascii=False)
+            self.wfile.write(f"data: {data}\n\n".encode("utf-8"))
+            self.wfile.flush()
+
+        content = message.get("content") or ""
+        step = max(1, len(content) // 8)
+        for i in range(0, len(content), step):
+            delta = {"content": content[i:i + step]}
+            if i == 0:
+                delta["role"] = "assistant"
+            send([{"index": 0, "delta": delta, "finish_reason": None}])
+        send([{"index": 0, "delta": {}, "finish_reason": finish_reason}])
+        if include_usage:
+            send([], usage=usage)
+        self.wfile.write(b"data: [DONE]\n\n")
+        self.wfile.flush()
+
+
+def _last_user_text(messages: List[dict]) -> str:
+    for message in reversed(messages):
+        if message.get("role") == "user":
+            content = message.get("content") or ""
+            if isinstance(content, list):
+                content = "".join(part.get("text", "") for part in content if isinstance(part, dict))
+            return content
+    return ""
+
+
+class StubLLMServer(_CountingServer, ThreadingHTTPServer):
+    """
+    OpenAI 兼容的模型服务替身：
+    - 结构化输出（tools 或 response_format=json_schema）按 schema 的字段名生成合法结果：
+      category 按邮件关键词分类、queries 取正文中的句子、content 为固定的中文回复、sendable 按 reject_rate 随机拒绝
+    - counters 按 chat:<model> 统计调用次数，各 chain 配置不同的模型名即可区分
+    - chat_latency / embedding_latency（秒）可在运行中修改，如灌库时为 0、压测时模拟真实延迟
+    - embedding_fn(texts, dimensions) 可替换默认的哈希向量，如回放缓存的真实 embedding
+    """
+    daemon_threads = True
+
+    def __init__(self, host: str = "127.0.0.1", port: int = 0, chat_latency: float = 0.0,
+                 embedding_latency: float = 0.0, dimensions: int = 256, reject_rate: float = 0.0, seed: int = 0,
+                 embedding_fn: Optional[Callable[[List[str], int], List[List[float]]]] = None):
+        super().__init__((host, port), _LLMHandler)
+        self._init_counters()
+        self.embedding_fn = embedding_fn
+        self.chat_latency = chat_latency
+        self.embedding_latency = embedding_latency
+        self.dimensions = dimensions
+        self.reject_rate = reject_rate
+        self._seed = seed
+        self._thread = threading.Thread(target=self.serve_forever, name="stub-llm", daemon=True)
+
+    @property
+    def base_url(self) -> str:
+        return f"http://{self.server_address[0]}:{self.server_address[1]}/v1"
+
+    def start(self) -> "StubLLMServer":
+        self._thread.start()
+        return self
+
+    def stop(self) -> None:
+        self.shutdown()
+        self.server_close()
+
+    def embed(self, texts: List[str], dimensions: int) -> List[List[float]]:
+        if self.embedding_fn:
+            return self.embedding_fn(texts, dimensions)
+        return [hashed_embedding(text, dimensions) for text in texts]
+
+    def fake_object(self, schema: dict, user_text: str) -> dict:
+        result = {}
+        for name, spec in (schema.get("properties") or {}).items():
+            if name == "category":
+                result[name] = self.categorize(user_text)
+            elif name == "queries":
+                result[name] = self.queries(user_text)
+            elif name == "content":
+                result[name] = STUB_REPLY
+            elif name == "sendable":
+                result[name] = self._draw(user_text) >= self.reject_rate
+            elif name == "reason":
+                result[name] = "回复内容与参考信息一致，语气得体，可以发送"
+            else:
+                result[name] = {"boolean": True, "integer": 0, "number": 0, "array": []}.get(spec.get("type"), "")
+        return result
+
+    @staticmethod
+    def categorize(text: str) -> str:
+        email_text = _payload(text)
+        if _COMPLAINT_RE.search(email_text):
+            return "customer_complaint"
+        if _FEEDBACK_RE.search(email_text):
+            return "customer_feedback"
+        return "product_enquiry"
+
+    @staticmethod
+    def queries(text: str, limit: int = 3) -> List[str]:
+        """取正文（HyDE 时为文档块）中较长的几句作为查询/问题"""
+        sentences = [s.strip(" ，,：:*") for s in _SENTENCE_SPLIT_RE.split(_payload(text))]
+        sentences = [s[:40] for s in sentences if len(s) >= 6]
+        sentences.sort(key=len, reverse=True)
+        return sentences[:limit] or [text.strip()[:40]]
+
+    def _draw(self, text: str) -> float:
+        """同一草稿同一结果的伪随机数（0~1），使拒绝率可复现"""
+        digest = hashlib.md5(f"{self._seed}:{text}:{self.counters['chat_draws']}".encode("utf-8")).digest()
+        self.count("chat_draws")
+        return int.from_bytes(digest[:4], "little") / 2 ** 32
+
+
+def _payload(text: str) -> str:
+    """从提示词中取出变量部分：HyDE 的文档内容，或分类/查询提示的邮件内容"""
+    if "文档内容:" in text:
+        return text.split("文档内容:", 1)[1].split("请必须返回", 1)[0]
+    match = re.search(r"\*\*邮件内容[^*]*\*\*", text)
+    return text[match.end():] if match else text
+
+
+# ---------------------------------------------------------------------------
+# MySQL / RabbitMQ
+# ---------------------------------------------------------------------------
+
+class SQLiteMySQL:
+    """
+    RAGEngine 用到的 MySQLManager 接口（execute_query / execute_many），数据放在内存 SQLite：
+    %s 占位符转为 ?，ON DUPLICATE KEY UPDATE 转为 INSERT OR REPLACE
+    """
+    SCHEMA = """
+        CREATE TABLE chunk_metadata (
+            chunk_id TEXT PRIMARY KEY,
+            source TEXT NOT NULL,
+            document_id TEXT NOT NULL,
+            chunk_index INTEGER NOT NULL
+        );
+        CREATE TABLE question_chunk_mapping (
+            question_id TEXT PRIMARY KEY,
+            chunk_id TEXT NOT NULL,
+            question_content TEXT NOT NULL
+        );
+    """
+
+    def __init__(self):
+        self.conn = sqlite3.connect(":memory:", check_same_thread=False)
+        self.conn.executescript(self.SCHEMA)
+        self._lock = threading.Lock()
+        self.queries = 0
+
+    @staticmethod
+    def _translate(query: str) -> str:
+        query = query.replace("%s", "?")
+        if "ON DUPLICATE KEY UPDATE" in query:
+            query = "INSERT OR REPLACE" + query.split("INSERT", 1)[1].split("ON DUPLICATE KEY UPDATE", 1)[0]
+        return query
+
+    def execute_query(self, query: str, params: Optional[Tuple] = None, commit: bool = False,
+                      dictionary: bool = False, prepared: bool = False) -> Optional[List]:
+        with self._lock:
+            self.queries += 1
+            cursor = self.conn.execute(self._translate(query), params or ())
+            if cursor.description is None:
+                self.conn.commit()
+                return None
+            rows = cursor.fetchall()
+        if dictionary:
+            columns = [column[0] for column in cursor.description]
+            return [dict(zip(columns, row)) for row in rows]
+        return rows
+
+    def execute_many(self, query: str, seq_params: Sequence[Tuple]) -> int:
+        with self._lock:
+            self.queries += 1
+            cursor = self.conn.executemany(self._translate(query), seq_params)
+            self.conn.commit()
+            return cursor.rowcount
+
+
+class ListMQ:
+    """MQClient 替身：转人工任务只记录在内存中"""
+    def __init__(self):
+        self.tasks: List[dict] = []
+        self._lock = threading.Lock()
+
+    def publish_task(self, task_data: dict) -> None:
+        with self._lock:
+            self.tasks.append(task_data)
+
+    def close(self) -> None:
+        pass
@@ -0,0 +1,63 @@
+"""
+api.py 压测脚本：并发请求 GET /tasks，统计 p50/p99 延迟与吞吐
+
+用法（先启动 docker-compose 中的 MySQL 与 api.py）：
+    python benchmarks/load_test_api.py --url http://localhost:8000/tasks --concurrency 50 --requests 2000
+"""
+import argparse
+import asyncio
+import statistics
+import time
+
+import httpx
+
+
+def percentile(values, pct: float) -> float:
+    """计算百分位（最近秩法）"""
+    if not values:
+        return 0.0
+    ordered = sorted(values)
+    rank = max(0, min(len(ordered) - 1, int(round(pct / 100 * len(ordered))) - 1))
+    return ordered[rank]
+
+
+async def worker(client: httpx.AsyncClient, url: str, jobs: asyncio.Queue, latencies: list, errors: list):
+    while True:
+        try:
+            jobs.get_nowait()
+        except asyncio.QueueEmpty:
+            return
+        start = time.perf_counter()
+        try:
+            resp = await client.get(url)
+            if resp.status_code != 200:
+                errors.append(resp.status_code)
+        except Exception as e:
+            errors.append(type(e).__name__)
+        latencies.append((time.perf_counter() - start) * 1000)
+
+
+async def run(url: str, concurrency: int, total: int, timeout: float):
+    jobs = asyncio.Queue()
+    for _ in range(total):
+        jobs.put_nowait(None)
+    latencies, errors = [], []
+    limits = httpx.Limits(max_connections=concurrency, max_keepalive_connections=concurrency)
+    async with httpx.AsyncClient(timeout=timeout, limits=limits) as client:
+        start = time.perf_counter()
+        await asyncio.gather(*(worker(client, url, jobs, latencies, errors) for _ in range(concurrency)))
+        elapsed = time.perf_counter() - start
+
+    print(f"请求总数: {total} | 并发: {concurrency} | 耗时: {elapsed:.2f}s | 吞吐: {total / elapsed:.1f} req/s")
+    print(f"p50: {percentile(latencies, 50):.1f}ms | p99: {percentile(latencies, 99):.1f}ms "
+          f"| 平均: {statistics.mean(latencies):.1f}ms | 错误数: {len(errors)}")
+
+
+if __name__ == "__main__":
+    parser = argparse.ArgumentParser(description="GET /tasks 压测")
+    parser.add_argument("--url", default="http://localhost:8000/tasks")
+    parser.add_argument("--concurrency", type=int, default=50)
+    parser.add_argument("--requests", type=int, default=2000)
+    parser.add_argument("--timeout", type=float, default=30)
+    args = parser.parse_args()
+    asyncio.run(run(args.url, args.concurrency, args.requests, args.timeout))
@@ -5,31 +5,12 @@ load_dotenv()
 from src.utils.database import MySQLManager
 from src.rag import RAGEngine
 from langchain_openai import ChatOpenAI
-from src.llm import get_llm
-from colorama import Fore, Style
+from src.llm import get_chain_llm
+from src.utils.log import setup_logging, get_logger
 
 
-print(Fore.BLUE +f"============================================================================")
-print(f"===============================加载环境变量=================================")
-print(f"OPENAI_API_KEY: {os.getenv('OPENAI_API_KEY')}")
-print(f"BASE_URL: {os.getenv('BASE_URL')}")
-print(f"MODEL_NAME: {os.getenv('MODEL_NAME')}")
-print(f"EMBEDDING_MODEL_NAME: {os.getenv('EMBEDDING_MODEL_NAME')}")
-print(f"EMBEDDING_API_KEY: {os.getenv('EMBEDDING_API_KEY')}")
-print(f"DASHSCOPE_API_KEY: {os.getenv('DASHSCOPE_API_KEY')}")
-print(f"EMAIL_FROM: {os.getenv('EMAIL_FROM')}")
-print(f"SMTP_HOST: {os.getenv('SMTP_HOST')}")
-print(f"SMTP_PORT: {os.getenv('SMTP_PORT')}")
-print(f"EMAIL_ACCOUNT: {os.getenv('EMAIL_ACCOUNT')}")
-print(f"EMAIL_PASSWORD: {os.getenv('EMAIL_PASSWORD')}")
-print(f"EMAIL_DELAY_HOURS: {os.getenv('EMAIL_DELAY_HOURS')}")
-print(f"IMAP_HOST: {os.getenv('IMAP_HOST')}")
-print(f"IMAP_PORT: {os.getenv('IMAP_PORT')}")
-
-print(f"=============================================================================")
-print(f"=============================================================================")
-
-print(Fore.GREEN + "Starting workflow..." + Style.RESET_ALL)
+setup_logging()
+logger = get_logger("create_docs")
 
 def load_documents_from_dir(data_dir: str):
     """加载目录下的所有文本文件"""
@@ -49,7 +30,7 @@ def main():
         user=os.getenv("MYSQL_USER"),
         password=os.getenv("MYSQL_PASSWORD"),
         port=int(os.getenv("MYSQL_PORT")),
-        database=os.getenv("MYSQL_DATABASE")
+        db_name=os.getenv("MYSQL_DB_NAME")
     )
 
     # 2. 初始化 RAG 引擎
@@ -67,11 +48,7 @@ def main():
     )
 
     # 3. 初始化 LLM（生成 HyDE 问题）
-    llm = get_llm(
-        model_name=os.getenv("MODEL_NAME"),
-        api_key=os.getenv("OPENAI_API_KEY"),
-        base_url=os.getenv("BASE_URL"),
-    )
+    llm = get_chain_llm("hyde_generation")
 
     # 4. 加载文档
     docs = load_documents_from_dir(os.getenv("DATA_DIR"))
@@ -83,7 +60,7 @@ def main():
             source=file_name,
             llm=llm
         )
-        print(f"✅ {file_name} 已处理: {chunk_count} chunks, {question_count} hyde questions")
+        logger.info("%s 已处理: %d chunks, %d hyde questions", file_name, chunk_count, question_count)
 
 
 if __name__ == "__main__":
@@ -4,78 +4,41 @@ load_dotenv()
 
 import os
 import sys
-from colorama import Fore, Style
+
+# 先配置日志，各模块导入时的日志也按统一格式输出
+from src.utils.log import setup_logging, get_logger
+setup_logging()
+
 from src.graph import GraphWorkFlow
+from src.checkpoint import get_checkpointer
+from src.service import MailRobotService
 
 from src.utils.redis_utils import redis_conn
 from src.utils.database import MySQLManager
 from src.rag import RAGEngine
 from src.utils.rabbitmq import MQClient
-
-
-print(Fore.BLUE +f"============================================================================")
-print(f"===============================加载环境变量=================================")
-print(f"OPENAI_API_KEY: {os.getenv('OPENAI_API_KEY')}")
-print(f"BASE_URL: {os.getenv('BASE_URL')}")
-print(f"MODEL_NAME: {os.getenv('MODEL_NAME')}")
-print(f"EMBEDDING_MODEL_NAME: {os.getenv('EMBEDDING_MODEL_NAME')}")
-print(f"EMBEDDING_API_KEY: {os.getenv('EMBEDDING_API_KEY')}")
-print(f"EMAIL_FROM: {os.getenv('EMAIL_FROM')}")
-print(f"SMTP_HOST: {os.getenv('SMTP_HOST')}")
-print(f"SMTP_PORT: {os.getenv('SMTP_PORT')}")
-print(f"EMAIL_ACCOUNT: {os.getenv('EMAIL_ACCOUNT')}")
-print(f"EMAIL_PASSWORD: {os.getenv('EMAIL_PASSWORD')}")
-print(f"EMAIL_DELAY_HOURS: {os.getenv('EMAIL_DELAY_HOURS')}")
-print(f"IMAP_HOST: {os.getenv('IMAP_HOST')}")
-print(f"IMAP_PORT: {os.getenv('IMAP_PORT')}")
-print(f"REDIS_HOST: {os.getenv('REDIS_HOST')}")
-print(f"REDIS_PORT: {os.getenv('REDIS_PORT')}")
-print(f"REDIS_DB: {os.getenv('REDIS_DB')}")
-print(f"REDIS_PASSWORD: {os.getenv('REDIS_PASSWORD')}")
-print(f"MYSQL_HOST: {os.getenv('MYSQL_HOST')}")
-print(f"MYSQL_PORT: {os.getenv('MYSQL_PORT')}")
-print(f"MYSQL_USER: {os.getenv('MYSQL_USER')}")
-print(f"MYSQL_PASSWORD: {os.getenv('MYSQL_PASSWORD')}")
-print(f"MYSQL_DB_NAME: {os.getenv('MYSQL_DB_NAME')}")
-
-print(f"=============================================================================")
-print(f"=============================================================================")
-
-print(Fore.GREEN + "Starting workflow..." + Style.RESET_ALL)
-
-
+from src.utils.mail_queue import MailQueue
+from src.utils.lease import LeaseManager
+from src.utils.metrics import start_exporter
+
+logger = get_logger("main")
+
+# 只记录非敏感配置，API Key、密码等不写入日志
+logger.info(
+    "加载配置 | MODEL_NAME: %s | BASE_URL: %s | EMBEDDING_MODEL_NAME: %s | IMAP: %s:%s | SMTP: %s:%s | "
+    "REDIS: %s:%s/%s | MYSQL: %s:%s/%s",
+    os.getenv("MODEL_NAME"), os.getenv("BASE_URL"), os.getenv("EMBEDDING_MODEL_NAME"),
+    os.getenv("IMAP_HOST"), os.getenv("IMAP_PORT"), os.getenv("SMTP_HOST"), os.getenv("SMTP_PORT"),
+    os.getenv("REDIS_HOST"), os.getenv("REDIS_PORT"), os.getenv("REDIS_DB"),
+    os.getenv("MYSQL_HOST"), os.getenv("MYSQL_PORT"), os.getenv("MYSQL_DB_NAME"),
+)
 
 # 检查 Redis
 if not redis_conn:
-    print(f"{Fore.RED}❌ Redis 初始化失败，程序终止{Style.RESET_ALL}")
+    logger.critical("Redis 初始化失败，程序终止")
     sys.exit(1)
 else:
-    print(f"{Fore.GREEN}✅ Redis 连接成功{Style.RESET_ALL}")
-
-
-
-config = {'recursion_limit': 100}
-initial_state = {
-    "emails": [],
-    "current_email_index": 0,
-    "has_more": True,
-    "current_email": {
-      "id": "",
-      "threadId": "",
-      "messageId": "",
-      "references": "",
-      "sender": "",
-      "subject": "",
-      "body": ""
-    },
-    "email_category": "",
-    "generated_email": "",
-    "rag_queries": [],
-    "retrieved_documents": "",
-    "writer_messages": [],
-    "sendable": False,
-    "trials": 0
-}
+    logger.info("Redis 连接成功")
 
 
 def main():
@@ -111,12 +74,29 @@ def main():
         api_key=os.getenv('OPENAI_API_KEY'),
         rag_engine=rag_engine,
         mq_client=mq_client,
+        checkpointer=get_checkpointer(),
     )
     graph.display(path="./graph_png/graph_load_emails.png")
 
-    for output in graph.graph.stream(initial_state, config):
-        for key, value in output.items():
-            print(Fore.CYAN + f"Finished running: {key}:" + Style.RESET_ALL)
+    # 多个进程/主机共享同一邮箱：fetcher 负责拉取入队，worker 凭租约领取处理
+    leases = LeaseManager(
+        redis_conn,
+        owner=graph.mail_tools.worker_id,
+        ttl_ms=int(os.getenv("LEASE_TTL_MS", 60000)),
+    )
+    service = MailRobotService(
+        graph=graph,
+        mail_queue=MailQueue(redis_conn),
+        leases=leases,
+        role=os.getenv("SERVICE_ROLE", "all"),
+        poll_interval=float(os.getenv("POLL_INTERVAL_SECONDS", 300)),
+        concurrency=int(os.getenv("WORKER_CONCURRENCY", 4)),
+        max_in_flight=int(os.getenv("MAX_IN_FLIGHT", 16)),
+        max_attempts=int(os.getenv("MAIL_MAX_ATTEMPTS", 3)),
+    )
+    # 节点/依赖耗时等 Prometheus 指标（METRICS_PORT 为 0 时不启动）
+    start_exporter()
+    service.run()
 
 
 if __name__ == "__main__":
@@ -1,62 +1,73 @@
-from langchain_core.prompts import ChatPromptTemplate, PromptTemplate
+from langchain_core.prompts import ChatPromptTemplate
 from langchain_core.runnables import RunnablePassthrough
-from langchain_core.output_parsers import StrOutputParser
+from langchain_core.output_parsers import StrOutputParser, JsonOutputParser
 
 from .prompts_zh import (
-    CATEGORIZE_EMAIL_PROMPT,
-    GENERATE_RAG_QUERIES_PROMPT,
-    EMAIL_WRITER_PROMPT,
-    EMAIL_PROOFREADER_PROMPT,
+    CATEGORIZE_EMAIL_SYSTEM,
+    CATEGORIZE_EMAIL_USER,
+    GENERATE_RAG_QUERIES_SYSTEM,
+    GENERATE_RAG_QUERIES_USER,
+    EMAIL_WRITER_SYSTEM,
+    EMAIL_WRITER_USER,
+    EMAIL_PROOFREADER_SYSTEM,
+    EMAIL_PROOFREADER_USER,
 )
 from .schema_outputs import CategorizeEmailOutput, RAGQueriesOutput, EmailWriterOutput, EmailProofreaderOutput
-from .llm import get_llm
+from .llm import get_chain_llm, UsageRecorder
+from .utils.redis_utils import redis_conn
+from .utils.stats import StatsRecorder
+from .utils.log import get_logger
+
+logger = get_logger(__name__)
 
 class Chains:
     def __init__(self, model_name: str, base_url: str, api_key: str):
-        self.model1 = get_llm(
-             model_name=model_name,
-             base_url=base_url,
-             api_key=api_key,
-             temperature=0,
-        )
-        self.model2 = get_llm(
-             model_name=model_name,
-             base_url=base_url,
-             api_key=api_key,
-             temperature=0.7,
-        )
+        """
+        每个 chain 可单独配置模型（见 get_chain_llm），分类、生成查询等简单步骤可使用更小更快的模型；
+        model_name / base_url / api_key 为未单独配置时的默认值
+        各 chain 的 token 用量（含前缀缓存命中的 cached_tokens）与耗时记录在 qqmail:stats:llm:<chain>
+        """
+        self.models = {
+            chain: get_chain_llm(
+                chain, model_name, base_url, api_key,
+                callbacks=[UsageRecorder(chain, StatsRecorder(redis_conn, f"llm:{chain}"))],
+            )
+            for chain in ("categorize", "rag_queries", "writer", "proofreader")
+        }
+        logger.info("chain 模型配置: %s", list(self.models.values()))
+
+        # 固定的系统提示在前、本次变量在后，提示模板只构建一次
+        self.categorize_prompt = self._chat_prompt(CATEGORIZE_EMAIL_SYSTEM, CATEGORIZE_EMAIL_USER)
+        self.rag_queries_prompt = self._chat_prompt(GENERATE_RAG_QUERIES_SYSTEM, GENERATE_RAG_QUERIES_USER)
+        self.writer_prompt = self._chat_prompt(EMAIL_WRITER_SYSTEM, EMAIL_WRITER_USER)
+        self.proofreader_prompt = self._chat_prompt(EMAIL_PROOFREADER_SYSTEM, EMAIL_PROOFREADER_USER)
+
+    @staticmethod
+    def _chat_prompt(system: str, user: str) -> ChatPromptTemplate:
+        return ChatPromptTemplate.from_messages([
+            ("system", system.strip()),
+            ("human", user.strip()),
+        ])
 
     def categorize_email_chain(self) -> RunnablePassthrough:
-        email_category_prompt = PromptTemplate(
-            template=CATEGORIZE_EMAIL_PROMPT,
-            input_variables=["email_content"],
-        )
         # 输出会是一个 Pydantic 对象：CategorizeEmailOutput 而不是普通字符串
-        return email_category_prompt | self.model1.with_structured_output(CategorizeEmailOutput)
+        return self.categorize_prompt | self.models["categorize"].with_structured_output(CategorizeEmailOutput)
 
 
     def design_rag_queries_chain(self) -> RunnablePassthrough:
-        generate_query_prompt = PromptTemplate(
-            template=GENERATE_RAG_QUERIES_PROMPT,
-            input_variables=["email_content"],
-        )
-        return generate_query_prompt | self.model1.with_structured_output(RAGQueriesOutput)
+        return self.rag_queries_prompt | self.models["rag_queries"].with_structured_output(RAGQueriesOutput)
 
 
     def email_writer_chain(self) -> RunnablePassthrough:
-        writer_prompt = PromptTemplate(
-            template=EMAIL_WRITER_PROMPT,
-            input_variables=["email_information", "history"], 
-        )
-        return writer_prompt | self.model2.with_structured_output(EmailWriterOutput)
+        return self.writer_prompt | self.models["writer"].with_structured_output(EmailWriterOutput)
+
+    def email_writer_stream_chain(self) -> RunnablePassthrough:
+        # 流式输出：JsonOutputParser 边接收边解析，每次产出当前已生成的部分 {"content": "..."}
+        return self.writer_prompt | self.models["writer"].runnable() | JsonOutputParser(pydantic_object=EmailWriterOutput)
 
     def email_proofreader_chain(self) -> RunnablePassthrough:
-        proofreader_prompt = PromptTemplate(
-            template=EMAIL_PROOFREADER_PROMPT,
-            input_variables=["initial_email", "generated_email"],
-        )
-        return proofreader_prompt | self.model2.with_structured_output(EmailProofreaderOutput)
-    
+        return self.proofreader_prompt | self.models["proofreader"].with_structured_output(EmailProofreaderOutput)
+
 
     def rag_answer_chain(self) -> RunnablePassthrough:
-        pass
\ No newline at end of file
+        pass
@@ -0,0 +1,56 @@
+import os
+import sqlite3
+
+from src.utils.log import get_logger
+
+logger = get_logger(__name__)
+
+
+def get_checkpointer(backend: str = None):
+    """
+    创建 LangGraph 持久化 checkpointer，由 CHECKPOINT_BACKEND 选择：
+    - sqlite（默认，本地开发）：CHECKPOINT_SQLITE_PATH
+    - redis（生产）：使用 REDIS_HOST/REDIS_PORT/REDIS_PASSWORD/REDIS_DB
+    - mysql（生产）：使用 MYSQL_* 配置
+    - memory：仅进程内，重启即丢失（调试用）
+    """
+    backend = (backend or os.getenv("CHECKPOINT_BACKEND", "sqlite")).lower()
+    try:
+        if backend == "sqlite":
+            from langgraph.checkpoint.sqlite import SqliteSaver
+            path = os.getenv("CHECKPOINT_SQLITE_PATH", "./checkpoints/graph.sqlite")
+            os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+            saver = SqliteSaver(sqlite3.connect(path, check_same_thread=False))
+        elif backend == "redis":
+            from langgraph.checkpoint.redis import RedisSaver
+            password = os.getenv("REDIS_PASSWORD", "")
+            auth = f":{password}@" if password else ""
+            redis_url = (
+                f"redis://{auth}{os.getenv('REDIS_HOST', 'localhost')}:"
+                f"{os.getenv('REDIS_PORT', 6379)}/{os.getenv('REDIS_DB', 0)}"
+            )
+            saver = RedisSaver(redis_url=redis_url)
+        elif backend == "mysql":
+            import pymysql
+            from langgraph.checkpoint.mysql.pymysql import PyMySQLSaver
+            saver = PyMySQLSaver(pymysql.connect(
+                host=os.getenv("MYSQL_HOST"),
+                port=int(os.getenv("MYSQL_PORT", 3306)),
+                user=os.getenv("MYSQL_USER"),
+                password=os.getenv("MYSQL_PASSWORD", ""),
+                database=os.getenv("MYSQL_DB_NAME"),
+                autocommit=True,
+            ))
+        elif backend == "memory":
+            from langgraph.checkpoint.memory import MemorySaver
+            return MemorySaver()
+        else:
+            raise ValueError(f"不支持的 CHECKPOINT_BACKEND: {backend}")
+    except ImportError as e:
+        raise RuntimeError(
+            f"checkpoint 后端 {backend} 依赖未安装（langgraph-checkpoint-{backend}）: {e}"
+        )
+
+    saver.setup()
+    logger.info("已启用图执行 checkpoint，后端: %s", backend)
+    return saver
@@ -0,0 +1,100 @@
+from typing import Dict, List, Tuple
+
+from src.utils.tokens import count_tokens, truncate_to_tokens
+
+# 相邻文档块重叠部分的最大搜索长度（字符），覆盖 CHUNK_OVERLAP 的常见取值
+MAX_OVERLAP_CHARS = 400
+# 相邻块重叠部分的最小长度，避免把偶然相同的短尾巴当成重叠
+MIN_OVERLAP_CHARS = 8
+
+
+def _overlap_length(left: str, right: str) -> int:
+    """left 的后缀与 right 的前缀重合的最大长度（文本分割时 chunk_overlap 造成的重复）"""
+    for size in range(min(len(left), len(right), MAX_OVERLAP_CHARS), MIN_OVERLAP_CHARS - 1, -1):
+        if left.endswith(right[:size]):
+            return size
+    return 0
+
+
+def dedup_chunks(results: List[Dict]) -> List[Dict]:
+    """
+    检索结果去重，返回按得分从高到低排列的段落：
+    1. 内容相同（忽略空白）的文档块只保留得分最高的一个
+    2. 同一文档中 chunk_index 相邻的块合并为一段，并去掉分割时的重叠部分
+    每段带 chunk_ids（合并来源）与 score（取各块最高分）
+    """
+    seen: Dict[str, Dict] = {}
+    for result in sorted(results, key=lambda r: r.get("score", 0), reverse=True):
+        key = "".join(result.get("content", "").split())
+        if key and key not in seen:
+            seen[key] = result
+
+    # 按文档分组，组内按 chunk_index 排序后合并相邻块
+    passages: List[Dict] = []
+    by_document: Dict[str, List[Dict]] = {}
+    for result in seen.values():
+        if result.get("document_id") is None or result.get("chunk_index") is None:
+            passages.append({**result, "chunk_ids": [result["chunk_id"]]})
+        else:
+            by_document.setdefault(result["document_id"], []).append(result)
+
+    for chunks in by_document.values():
+        chunks.sort(key=lambda r: int(r["chunk_index"]))
+        current = None
+        for chunk in chunks:
+            if current is not None and int(chunk["chunk_index"]) == current["last_index"] + 1:
+                overlap = _overlap_length(current["content"], chunk["content"])
+                current["content"] += chunk["content"][overlap:]
+                current["chunk_ids"].append(chunk["chunk_id"])
+                current["score"] = max(current["score"], chunk.get("score", 0))
+                current["last_index"] += 1
+                if chunk.get("matching_question") and not current.get("matching_question"):
+                    current["matching_question"] = chunk["matching_question"]
+                continue
+            if current is not None:
+                passages.append(current)
+            current = {
+                **chunk,
+                "chunk_ids": [chunk["chunk_id"]],
+                "score": chunk.get("score", 0),
+                "last_index": int(chunk["chunk_index"]),
+            }
+        if current is not None:
+            passages.append(current)
+
+    # 稳定排序：同分（如会话复用的结果）保持原有顺序
+    order = {result["chunk_id"]: i for i, result in enumerate(results)}
+    passages.sort(key=lambda p: (-p.get("score", 0), order.get(p["chunk_ids"][0], 0)))
+    return passages
+
+
+def assemble_context(results: List[Dict], token_budget: int, min_tokens: int = 64) -> Tuple[str, List[str]]:
+    """
+    检索结果 → 写作节点的参考信息：去重合并后按得分依次放入，直到达到 token 预算；
+    放不下的段落剩余预算不少于 min_tokens 时截断放入，否则丢弃
+    返回 (参考信息文本, 实际使用的文档块ID)
+    """
+    passages = dedup_chunks(results)
+    if not passages:
+        return "未找到相关参考信息", []
+
+    blocks: List[str] = []
+    used_ids: List[str] = []
+    remaining = token_budget if token_budget > 0 else float("inf")
+    for passage in passages:
+        block = f"{len(blocks) + 1}. 来源：{passage.get('source') or '未知来源'}\n"
+        if passage.get("matching_question"):
+            block += f"（相关问题：{passage['matching_question']}）\n"
+        block += f"内容：{passage['content']}\n"
+        tokens = count_tokens(block)
+        if tokens > remaining:
+            if remaining < min_tokens:
+                break
+            block = truncate_to_tokens(block, int(remaining))
+            tokens = count_tokens(block)
+        blocks.append(block)
+        used_ids.extend(passage["chunk_ids"])
+        remaining -= tokens
+        if remaining < min_tokens:
+            break
+    return "\n".join(blocks), used_ids
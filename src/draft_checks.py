@@ -0,0 +1,158 @@
+import re
+from typing import Iterable, List, Optional, Set, Tuple
+
+# 价格：¥29 / 29元 / 29.9 元 / $9.99 / 199 RMB
+_PRICE_RE = re.compile(
+    r"(?:[¥￥$]|RMB|USD)\s*(\d+(?:\.\d+)?)|(\d+(?:\.\d+)?)\s*(?:元|块|美元|RMB|USD)",
+    re.IGNORECASE,
+)
+_URL_RE = re.compile(r"https?://[^\s，。；、！？）)\]>\"'“”]+", re.IGNORECASE)
+_URL_TRAILING = ".,;:!?"
+# 其他数量事实：期限、次数、折扣等（如 7天无理由退款、24小时内处理、8折）
+_QUANTITY_RE = re.compile(r"(\d+(?:\.\d+)?)\s*(?:天|小时|个工作日|工作日|个月|周|年|%|％|折|次|台|人)")
+# 未替换的模板变量或占位符
+_PLACEHOLDER_RE = re.compile(
+    r"\{\{.*?\}\}|\{[A-Za-z_][A-Za-z0-9_]*\}|\$\{.*?\}|<[^<>\n]{1,20}(?:姓名|名称|名字|称呼|name)>"
+    r"|[\[【](?:客户姓名|姓名|客户名称|公司名称|产品名称|链接|待补充|待定|your name|name)[\]】]|XXX|TODO|TBD",
+    re.IGNORECASE,
+)
+_CJK_RE = re.compile(r"[\u4e00-\u9fff]")
+_LATIN_RE = re.compile(r"[A-Za-z]")
+
+# 不同分类的基础风险：投诉措辞敏感，咨询涉及产品事实，反馈致谢最简单
+CATEGORY_BASE_RISK = {
+    "customer_feedback": 0.1,
+    "product_enquiry": 0.3,
+    "customer_complaint": 0.4,
+}
+
+DEFAULT_FORBIDDEN_PHRASES = (
+    "作为AI",
+    "作为一个AI",
+    "作为人工智能",
+    "语言模型",
+    "我无法回答",
+    "根据参考文档",
+    "RAG检索",
+)
+
+
+def _normalize_number(value: str) -> str:
+    """29.0 / 29.00 / 29 视为同一数值"""
+    return value.rstrip("0").rstrip(".") if "." in value else value
+
+
+def _cjk_ratio(text: str) -> float:
+    """中文字符占文字（中文 + 拉丁字母）的比例，无文字时返回 -1"""
+    cjk = len(_CJK_RE.findall(text))
+    total = cjk + len(_LATIN_RE.findall(text))
+    return cjk / total if total else -1.0
+
+
+def _prices(text: str, complete_only: bool = False) -> Set[str]:
+    prices = set()
+    for match in _PRICE_RE.finditer(text):
+        # 流式输出时位于末尾的数字可能还没写完（"29" 之后可能是 "299"）
+        if complete_only and match.end() >= len(text):
+            continue
+        prices.add(_normalize_number(match.group(1) or match.group(2)))
+    return prices
+
+
+def _urls(text: str, complete_only: bool = False) -> Set[str]:
+    urls = set()
+    for match in _URL_RE.finditer(text):
+        if complete_only and match.end() >= len(text):
+            continue
+        urls.add(match.group(0).rstrip(_URL_TRAILING).lower())
+    return urls
+
+
+class DraftChecker:
+    """
+    回复草稿的本地检查（不调用 LLM），流式写作时对已生成的部分逐步检查，明显不合格时提前中止：
+    1. 长度超出上限
+    2. 包含禁用语（暴露 AI 身份、泄露提示词结构等）
+    3. 出现参考信息中没有的价格或链接（可能是编造的）
+    参考信息为检索到的文档、客户邮件与会话摘要，客户自己提到的价格/链接不算编造
+    完整草稿另外检查长度下限、残留占位符与回复语言；通过后由 risk() 评估是否还需要 LLM 校对
+    """
+    def __init__(
+        self,
+        reference_text: str,
+        customer_text: str = "",
+        max_chars: int = 600,
+        min_chars: int = 60,
+        forbidden_phrases: Iterable[str] = DEFAULT_FORBIDDEN_PHRASES,
+    ):
+        self.max_chars = max_chars
+        self.min_chars = min_chars
+        self.forbidden_phrases = [p for p in forbidden_phrases if p]
+        self.reference_prices = _prices(reference_text)
+        # 参考信息中的数字（不带货币单位的价格也算有出处）
+        self.reference_numbers = {_normalize_number(n) for n in re.findall(r"\d+(?:\.\d+)?", reference_text)}
+        self.reference_urls = _urls(reference_text)
+        self.customer_cjk_ratio = _cjk_ratio(customer_text)
+
+    def check_partial(self, text: str) -> Optional[str]:
+        """检查已生成的部分，发现问题时返回原因"""
+        if self.max_chars and len(text) > self.max_chars:
+            return f"回复过长（超过 {self.max_chars} 字）"
+        for phrase in self.forbidden_phrases:
+            if phrase in text:
+                return f"包含禁用语“{phrase}”"
+        return self._check_facts(text, complete_only=True)
+
+    def check_final(self, text: str) -> Optional[str]:
+        """检查完整草稿"""
+        if len(text.strip()) < self.min_chars:
+            return f"回复过短（不足 {self.min_chars} 字）"
+        reason = self.check_partial(text)
+        if reason:
+            return reason
+        placeholder = _PLACEHOLDER_RE.search(text)
+        if placeholder:
+            return f"残留占位符“{placeholder.group(0)}”"
+        reason = self._check_language(text)
+        if reason:
+            return reason
+        return self._check_facts(text, complete_only=False)
+
+    def risk(self, text: str, category: str, trials: int = 1, has_references: bool = True) -> Tuple[float, List[str]]:
+        """
+        已通过检查的草稿的风险评分（0~1）及原因，低于阈值时可跳过 LLM 校对：
+        分类基础风险 + 参考信息中没有出处的数量承诺 + 咨询类缺少参考信息 + 重写稿
+        """
+        score = CATEGORY_BASE_RISK.get(category, 0.5)
+        reasons = [f"分类 {category}"]
+        ungrounded = sorted({_normalize_number(q) for q in _QUANTITY_RE.findall(text)} - self.reference_numbers)
+        if ungrounded:
+            score += 0.3 * len(ungrounded)
+            reasons.append(f"无出处的数量承诺 {ungrounded}")
+        if category == "product_enquiry" and not has_references:
+            score += 0.3
+            reasons.append("咨询类回复缺少参考信息")
+        if trials > 1:
+            score += 0.2
+            reasons.append("上一版草稿未通过")
+        return min(score, 1.0), reasons
+
+    def _check_language(self, text: str) -> Optional[str]:
+        """回复语言与客户邮件一致（中文邮件用中文回复，英文邮件用英文回复）"""
+        if self.customer_cjk_ratio < 0:
+            return None
+        draft_ratio = _cjk_ratio(text)
+        if self.customer_cjk_ratio >= 0.3 and 0 <= draft_ratio < 0.1:
+            return "客户邮件为中文，回复却不是中文"
+        if self.customer_cjk_ratio < 0.05 and draft_ratio >= 0.3:
+            return "客户邮件为英文，回复却是中文"
+        return None
+
+    def _check_facts(self, text: str, complete_only: bool) -> Optional[str]:
+        for price in _prices(text, complete_only):
+            if price not in self.reference_prices and price not in self.reference_numbers:
+                return f"价格 {price} 在参考信息中没有出处"
+        for url in _urls(text, complete_only):
+            if not any(url.startswith(ref) or ref.startswith(url) for ref in self.reference_urls):
+                return f"链接 {url} 在参考信息中没有出处"
+        return None
@@ -1,52 +1,63 @@
 from .state import GraphState
-from colorama import Fore, Style
+from .utils.log import get_logger
+
+logger = get_logger(__name__)
 
 
 
 class Edges:
-    def is_email_inbox_empty(self, state: GraphState) -> str:
+    def route_after_prefilter(self, state: GraphState) -> str:
         """
-        路由函数，根据收件箱是否为空路由到不同的节点
+        路由函数，预过滤判定为无关邮件（自动回复、退信、群发等）时直接跳过
         """
-        print(Fore.YELLOW + "Checking if email inbox is empty...\n" + Style.RESET_ALL)
-        if len(state["emails"]) == 0:
-            print(Fore.GREEN + "收件箱为空，没有邮件需要处理" + Style.RESET_ALL)
-            return "True"
-        else:
-            return "False"
+        if state.get("email_category") == "unrelated":
+            logger.info("预过滤命中（%s），跳过 LLM 分类", state.get("prefilter_reason"))
+            return "ignore"
+        return "continue"
+
+    def route_after_thread_context(self, state: GraphState) -> str:
+        """
+        路由函数，本地分类器已给出分类时直接按分类路由，否则交给 LLM 分类
+        """
+        if state.get("email_category"):
+            return self.route_email_based_on_category(state)
+        return "categorize"
 
     def route_email_based_on_category(self, state: GraphState) -> str:
         """
         路由函数，根据邮件分类路由到不同的节点
         """
-        print(Fore.YELLOW + "Routing email based on category...\n" + Style.RESET_ALL)
+        logger.debug("按分类结果路由邮件")
         category = state["email_category"]
         if category == "product_enquiry":
+            # 同一会话的追问且话题未变：已复用上一轮的检索结果，直接写回复
+            if state.get("thread_reuse"):
+                return "thread follow-up"
             return "product related"
         elif category == "customer_complaint" or category == "customer_feedback":
             return "complaint_or_feedback"
         else:
             return "unrelated"
 
+    def route_after_writer(self, state: GraphState) -> str:
+        """
+        路由函数，草稿通过本地检查时交给 LLM 校对，否则直接重写（或超过重试次数后停止）
+        """
+        if not state.get("draft_problem"):
+            return "proofread"
+        return self.is_email_sendable(state)
+
     def is_email_sendable(self, state: GraphState) -> str:
         """
         路由函数，根据邮件是否可发送路由到不同的节点
         """
         email_sendable = state["sendable"]
         if email_sendable:
-            print(Fore.GREEN + "不需要重写，直接发送" + Style.RESET_ALL)
-            state["writer_messages"] = []
+            logger.info("不需要重写，直接发送")
             return "send"
         elif state["trials"] >= 3:
-            print(Fore.RED + "超过最大重试次数，必须停止" + Style.RESET_ALL)
-            state["writer_messages"] = []
+            logger.warning("超过最大重试次数，必须停止")
             return "stop"
         else:
-            print(Fore.RED + "需要重写" + Style.RESET_ALL)
+            logger.info("需要重写")
             return "rewrite"
-    
-    def has_more_emails(self, state: GraphState) -> str:
-        """判断是否有更多邮件需要处理"""
-        if state['has_more'] == True:
-            return "True"
-        return "False"
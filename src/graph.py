@@ -1,60 +1,99 @@
+import time
+from functools import wraps
+
 from langgraph.graph import StateGraph,END
 
 from src.state import GraphState
+from src.tools.schema_mail import Email
 from src.nodes import Nodes
 from src.edges import Edges
 from src.rag import RAGEngine
 from src.utils.rabbitmq import MQClient
+from src.utils.resilience import DependencyUnavailable
+from src.utils.metrics import EMAIL_SECONDS, NODE_SECONDS
+from src.utils.log import get_logger, log_context
+
+logger = get_logger(__name__)
+
+def timed_node(name: str, fn):
+    """记录节点耗时（Prometheus 直方图 mailrobot_node_seconds）"""
+    @wraps(fn)
+    def node(state: GraphState) -> GraphState:
+        start = time.perf_counter()
+        try:
+            return fn(state)
+        finally:
+            NODE_SECONDS.labels(name).observe(time.perf_counter() - start)
+    return node
+
 
 class GraphWorkFlow:
-    def __init__(self, model_name: str, base_url: str, api_key: str, rag_engine: RAGEngine, mq_client: MQClient):
+    def __init__(self, model_name: str, base_url: str, api_key: str, rag_engine: RAGEngine, mq_client: MQClient, checkpointer=None):
+        """
+        单封邮件的处理流程图；每封邮件以 email:<id> 作为 thread_id 单独执行，
+        配置 checkpointer 后每完成一个节点都会持久化，进程崩溃重启后从最后完成的节点继续
+        """
         workflow = StateGraph(GraphState)
-        nodes = Nodes(model_name, base_url, api_key, rag_engine, mq_client)
+        self.nodes = Nodes(model_name, base_url, api_key, rag_engine, mq_client)
+        self.mail_tools = self.nodes.qq_mail_tools
+        self.checkpointer = checkpointer
         edges = Edges()
 
-        workflow.add_node("load_inbox_emails", nodes.load_new_emails)
-        workflow.add_node("is_email_inbox_empty", nodes.is_email_inbox_empty)   # todo
-        workflow.add_node("check_more_emails", nodes.check_more_emails)  # 检查是否有更多邮件
-
-        workflow.add_node("get_next_email", nodes.get_next_email)  # 获取下一封邮件
-        workflow.add_node("categorize_email", nodes.categorize_email)
-        
-        workflow.add_node("construct_rag_queries", nodes.construct_rag_queries)
-        workflow.add_node("retrieve_from_rag", nodes.retrieve_from_rag)
-        workflow.add_node("email_writer", nodes.write_email)
-        workflow.add_node("email_proofreader", nodes.verify_generated_email)
-        workflow.add_node("send_email", nodes.send_email)
-        workflow.add_node("manual_pending", nodes.manual_pending)
-        workflow.add_node("skip_unrelated_email", nodes.skip_unrelated_email)
-        workflow.add_node("wait_for_next_check", nodes.wait_for_next_check)
-
-        workflow.set_entry_point("load_inbox_emails")
-        workflow.add_edge("load_inbox_emails", "is_email_inbox_empty")
-        workflow.add_edge("is_email_inbox_empty", "check_more_emails")
+        workflow.add_node("prefilter_email", timed_node("prefilter_email", self.nodes.prefilter_email))
+        workflow.add_node("load_thread_context", timed_node("load_thread_context", self.nodes.load_thread_context))
+        workflow.add_node("categorize_email", timed_node("categorize_email", self.nodes.categorize_email))
+        workflow.add_node("construct_rag_queries", timed_node("construct_rag_queries", self.nodes.construct_rag_queries))
+        workflow.add_node("retrieve_from_rag", timed_node("retrieve_from_rag", self.nodes.retrieve_from_rag))
+        workflow.add_node("email_writer", timed_node("email_writer", self.nodes.write_email))
+        workflow.add_node("email_proofreader", timed_node("email_proofreader", self.nodes.verify_generated_email))
+        workflow.add_node("send_email", timed_node("send_email", self.nodes.send_email))
+        workflow.add_node("manual_pending", timed_node("manual_pending", self.nodes.manual_pending))
+        workflow.add_node("skip_unrelated_email", timed_node("skip_unrelated_email", self.nodes.skip_unrelated_email))
 
+        workflow.set_entry_point("prefilter_email")
         workflow.add_conditional_edges(
-            "check_more_emails",
-            edges.has_more_emails,
+            "prefilter_email",
+            edges.route_after_prefilter,
             {
-                "True": "get_next_email",
-                "False": "wait_for_next_check",
+                "ignore": "skip_unrelated_email",
+                "continue": "load_thread_context",
+            },
+        )
+        # 本地分类器已给出分类时跳过 LLM 分类
+        workflow.add_conditional_edges(
+            "load_thread_context",
+            edges.route_after_thread_context,
+            {
+                "categorize": "categorize_email",
+                "product related": "construct_rag_queries",
+                "thread follow-up": "email_writer",
+                "complaint_or_feedback": "email_writer",
+                "unrelated": "skip_unrelated_email",
             },
         )
-
-        workflow.add_edge("get_next_email", "categorize_email")
 
         workflow.add_conditional_edges(
             "categorize_email",
             edges.route_email_based_on_category,
             {
                 "product related": "construct_rag_queries",
+                "thread follow-up": "email_writer",
                 "complaint_or_feedback": "email_writer",
                 "unrelated": "skip_unrelated_email",
             },
         )
         workflow.add_edge("construct_rag_queries", "retrieve_from_rag")
         workflow.add_edge("retrieve_from_rag", "email_writer")
-        workflow.add_edge("email_writer", "email_proofreader")
+        # 本地检查未通过的草稿不经 LLM 校对，直接重写
+        workflow.add_conditional_edges(
+            "email_writer",
+            edges.route_after_writer,
+            {
+                "proofread": "email_proofreader",
+                "rewrite": "email_writer",
+                "stop": "manual_pending"
+            },
+        )
         workflow.add_conditional_edges(
             "email_proofreader",
             edges.is_email_sendable,
@@ -64,25 +103,92 @@ class GraphWorkFlow:
                 "stop": "manual_pending"
             },
         )
-        # 各种处理结束后检查是否有更多邮件
-        workflow.add_edge("send_email", "check_more_emails")
-        workflow.add_edge("manual_pending", "check_more_emails")
-        workflow.add_edge("skip_unrelated_email", "check_more_emails")
-    
+        # 各种处理结束后本封邮件流程结束
+        workflow.add_edge("send_email", END)
+        workflow.add_edge("manual_pending", END)
+        workflow.add_edge("skip_unrelated_email", END)
+
+        self.graph = workflow.compile(checkpointer=checkpointer)
+
+    @staticmethod
+    def thread_config(email_id: str) -> dict:
+        """每封邮件一个 checkpoint thread"""
+        return {"configurable": {"thread_id": f"email:{email_id}"}}
+
+    @staticmethod
+    def initial_state(email: Email) -> GraphState:
+        return {
+            "current_email": email,
+            "email_category": "",
+            "prefilter_reason": "",
+            "generated_email": "",
+            "rag_queries": [],
+            "retrieved_documents": "",
+            "retrieved_chunk_ids": [],
+            "thread_key": "",
+            "thread_context": "",
+            "thread_reuse": False,
+            "writer_messages": [],
+            "draft_problem": "",
+            "manual_reason": "",
+            "sendable": False,
+            "trials": 0
+        }
+
+    def process_email(self, email: Email) -> None:
+        """处理一封邮件；若该邮件已有未完成的 checkpoint（上次执行中断），则从断点继续"""
+        config = self.thread_config(email.id)
+        start = time.perf_counter()
+        # 本封邮件处理期间的日志（含各节点、工具、依赖调用）都带 correlation_id，与 checkpoint thread_id 一致
+        with log_context(config["configurable"]["thread_id"]):
+            try:
+                if self.checkpointer and self.graph.get_state(config).next:
+                    logger.warning("邮件 %s 存在未完成的执行记录，从断点继续", email.id)
+                    self._run(email.id, None, config)
+                else:
+                    self._run(email.id, self.initial_state(email), config)
+            except DependencyUnavailable as e:
+                # 依赖熔断中：不等待恢复，直接转人工处理
+                logger.error("邮件 %s 处理中断（%s），转人工处理", email.id, e)
+                self._route_to_manual(email, config, f"dependency_unavailable:{e.name}")
+            finally:
+                EMAIL_SECONDS.observe(time.perf_counter() - start)
+
+    def _run(self, email_id: str, graph_input, config: dict) -> None:
+        for output in self.graph.stream(graph_input, config):
+            for key in output:
+                logger.debug("节点执行完成: %s", key)
+                self.mail_tools.update_email_stage(email_id, key)
+        # 已完成的 thread 不再需要，清理 checkpoint 避免无限增长
+        delete_thread = getattr(self.checkpointer, "delete_thread", None)
+        if delete_thread:
+            delete_thread(config["configurable"]["thread_id"])
 
-        # 等待一段时间后重新检查邮箱
-        workflow.add_edge("wait_for_next_check", "load_inbox_emails")
-        # workflow.add_edge("email_writer", END)
+    def route_to_manual(self, email: Email, reason: str) -> None:
+        """不再执行图，直接把邮件转人工（如多次处理失败）；转人工失败时抛出"""
+        config = self.thread_config(email.id)
+        with log_context(config["configurable"]["thread_id"]):
+            self._route_to_manual(email, config, reason)
 
-        self.graph = workflow.compile()
+    def _route_to_manual(self, email: Email, config: dict, reason: str) -> None:
+        """跳过剩余节点直接转人工；已有 checkpoint 时带上已完成节点的结果（如分类）"""
+        state = self.initial_state(email)
+        if self.checkpointer:
+            state.update(self.graph.get_state(config).values or {})
+        state["manual_reason"] = reason
+        # 转人工本身失败（如 RabbitMQ 也不可用）时抛出，由调用方稍后重试
+        self.nodes.manual_pending(state)
+        self.mail_tools.update_email_stage(email.id, "manual_pending")
+        delete_thread = getattr(self.checkpointer, "delete_thread", None)
+        if delete_thread:
+            delete_thread(config["configurable"]["thread_id"])
 
-    
     def display(self, path: str):
         try:
             image_data = self.graph.get_graph().draw_mermaid_png()
 
             with open(path, "wb") as f:
                 f.write(image_data)
-            print(f"流程图已成功保存为 {path}")
+            logger.info("流程图已成功保存为 %s", path)
         except Exception as e:
-            print(f"保存流程图时出错: {e}")
+            logger.error("保存流程图时出错: %s", e)
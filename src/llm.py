@@ -1,10 +1,215 @@
+import os
+import time
+from typing import Callable, Dict, List, Optional
+from uuid import UUID
+
+import openai
+from langchain_core.callbacks import BaseCallbackHandler
+from langchain_core.outputs import LLMResult
 from langchain_openai import ChatOpenAI
 
+from src.utils.metrics import LLM_SECONDS, LLM_TOKENS
+from src.utils.resilience import DependencyUnavailable, get_dependency
+from src.utils.tokens import count_tokens
+
+# 各 chain 可单独配置模型（LLM_<CHAIN>_MODEL 等），未配置时使用 MODEL_NAME / BASE_URL / OPENAI_API_KEY
+CHAIN_NAMES = ("categorize", "rag_queries", "writer", "proofreader", "hyde_generation")
+DEFAULT_TEMPERATURES = {
+    "categorize": 0,
+    "rag_queries": 0,
+    "writer": 0.7,
+    "proofreader": 0.7,
+    "hyde_generation": 0.7,
+}
+# 这些错误计为端点故障（计入熔断），主端点出现时切换到备用端点；请求参数错误等不切换
+ENDPOINT_ERRORS = (
+    openai.APITimeoutError,
+    openai.APIConnectionError,
+    openai.RateLimitError,
+    openai.InternalServerError,
+)
+FALLBACK_EXCEPTIONS = ENDPOINT_ERRORS + (DependencyUnavailable,)
 
-def get_llm(model_name: str, base_url: str, api_key: str, temperature: float = 0.7):
+
+def get_llm(model_name: str, base_url: str, api_key: str, temperature: float = 0.7,
+            timeout: Optional[float] = None, max_tokens: Optional[int] = None, max_retries: int = 2,
+            callbacks: Optional[List[BaseCallbackHandler]] = None):
     return ChatOpenAI(
         model=model_name,
         base_url=base_url,
         api_key=api_key,
         temperature=temperature,
-    )
\ No newline at end of file
+        timeout=timeout,
+        max_tokens=max_tokens,
+        max_retries=max_retries,
+        # 流式输出时也在最后一个分块返回 token 用量
+        stream_usage=True,
+        callbacks=callbacks,
+    )
+
+
+class UsageRecorder(BaseCallbackHandler):
+    """
+    记录每次模型调用的 token 用量与耗时（写入 StatsRecorder 与 Prometheus 指标）：
+    calls / prompt_tokens / cached_tokens（命中服务端提示词前缀缓存的部分）/ completion_tokens / llm_ms
+    流式输出被本地中止（如草稿未通过流式检查）的调用计为 aborted 而不是 errors；
+    此时服务端不返回用量，prompt/completion tokens 按本地估算计入
+    """
+    def __init__(self, chain: str, stats):
+        self.chain = chain
+        self.stats = stats
+        self._started: Dict[UUID, float] = {}
+        # run_id -> [提示词估算 tokens, 已流式输出的估算 tokens]，只用于中止的调用
+        self._estimates: Dict[UUID, List[int]] = {}
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, **kwargs) -> None:
+        self._started[run_id] = time.perf_counter()
+        prompt_tokens = sum(count_tokens(str(message.content)) for batch in messages for message in batch)
+        self._estimates[run_id] = [prompt_tokens, 0]
+
+    def on_llm_new_token(self, token: str, *, run_id: UUID, **kwargs) -> None:
+        estimate = self._estimates.get(run_id)
+        if estimate is not None:
+            estimate[1] += count_tokens(token)
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs) -> None:
+        self._estimates.pop(run_id, None)
+        started = self._started.pop(run_id, None)
+        usage = self._token_usage(response)
+        for kind in ("prompt", "cached", "completion"):
+            LLM_TOKENS.labels(self.chain, kind).inc(usage[f"{kind}_tokens"])
+        counters = {"calls": 1, **usage}
+        if started is not None:
+            elapsed = time.perf_counter() - started
+            LLM_SECONDS.labels(self.chain).observe(elapsed)
+            counters["llm_ms"] = elapsed * 1000
+        self.stats.incr(**counters)
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs) -> None:
+        started = self._started.pop(run_id, None)
+        estimate = self._estimates.pop(run_id, None)
+        if not isinstance(error, GeneratorExit):
+            self.stats.incr(errors=1)
+            return
+        # 调用方关闭了流式生成器：不是模型故障，已消耗的 token 仍要计入
+        prompt_tokens, completion_tokens = estimate or (0, 0)
+        LLM_TOKENS.labels(self.chain, "prompt").inc(prompt_tokens)
+        LLM_TOKENS.labels(self.chain, "completion").inc(completion_tokens)
+        counters = {"aborted": 1, "prompt_tokens": prompt_tokens, "completion_tokens": completion_tokens}
+        if started is not None:
+            elapsed = time.perf_counter() - started
+            LLM_SECONDS.labels(self.chain).observe(elapsed)
+            counters["llm_ms"] = elapsed * 1000
+        self.stats.incr(**counters)
+
+    @staticmethod
+    def _token_usage(response: LLMResult) -> Dict[str, int]:
+        # 新版 langchain-openai 在消息的 usage_metadata 中给出用量（含缓存命中），旧版只有 llm_output
+        for generations in response.generations:
+            for generation in generations:
+                usage = getattr(getattr(generation, "message", None), "usage_metadata", None)
+                if usage:
+                    return {
+                        "prompt_tokens": usage.get("input_tokens", 0),
+                        "cached_tokens": (usage.get("input_token_details") or {}).get("cache_read", 0) or 0,
+                        "completion_tokens": usage.get("output_tokens", 0),
+                    }
+        usage = (response.llm_output or {}).get("token_usage") or {}
+        return {
+            "prompt_tokens": usage.get("prompt_tokens", 0),
+            "cached_tokens": (usage.get("prompt_tokens_details") or {}).get("cached_tokens", 0) or 0,
+            "completion_tokens": usage.get("completion_tokens", 0),
+        }
+
+
+class CircuitBreakerCallback(BaseCallbackHandler):
+    """
+    模型端点的熔断：调用前检查（熔断中直接抛出 DependencyUnavailable，有备用端点时切换），
+    调用结果计入熔断器；raise_error 使调用前的检查能中断调用
+    """
+    raise_error = True
+
+    def __init__(self, name: str):
+        self.dependency = get_dependency(name)
+
+    def on_chat_model_start(self, serialized, messages, *, run_id: UUID, **kwargs) -> None:
+        self.dependency.breaker.before_call()
+
+    def on_llm_end(self, response: LLMResult, *, run_id: UUID, **kwargs) -> None:
+        self.dependency.breaker.record_success()
+
+    def on_llm_error(self, error: BaseException, *, run_id: UUID, **kwargs) -> None:
+        if isinstance(error, ENDPOINT_ERRORS):
+            self.dependency.breaker.record_failure()
+        else:
+            self.dependency.breaker.release()
+
+
+class ChainLLM:
+    """
+    一个 chain 使用的模型：主模型 + 可选的备用端点（超时、连接失败、限流、服务端错误时自动切换）
+    用法与 ChatOpenAI 相同：runnable() 得到普通模型，with_structured_output() 得到结构化输出模型
+    """
+    def __init__(self, name: str, primary: ChatOpenAI, fallback: Optional[ChatOpenAI] = None):
+        self.name = name
+        self.primary = primary
+        self.fallback = fallback
+
+    def runnable(self, transform: Callable = lambda model: model):
+        primary = transform(self.primary)
+        if self.fallback is None:
+            return primary
+        return primary.with_fallbacks([transform(self.fallback)], exceptions_to_handle=FALLBACK_EXCEPTIONS)
+
+    def with_structured_output(self, schema):
+        return self.runnable(lambda model: model.with_structured_output(schema))
+
+    def __repr__(self) -> str:
+        fallback = f" -> {self.fallback.model_name}" if self.fallback is not None else ""
+        return f"{self.name}: {self.primary.model_name}{fallback}"
+
+
+def get_chain_llm(chain: str, model_name: Optional[str] = None, base_url: Optional[str] = None,
+                  api_key: Optional[str] = None, callbacks: Optional[List[BaseCallbackHandler]] = None) -> ChainLLM:
+    """
+    按 chain 名称读取模型配置：
+        LLM_<CHAIN>_MODEL / _BASE_URL / _API_KEY / _TEMPERATURE / _TIMEOUT / _MAX_TOKENS
+        LLM_<CHAIN>_FALLBACK_MODEL / _FALLBACK_BASE_URL / _FALLBACK_API_KEY（备用端点，不配置则不切换）
+    未配置的项依次使用参数、全局配置（MODEL_NAME、BASE_URL、OPENAI_API_KEY、LLM_TIMEOUT、LLM_MAX_TOKENS）
+    """
+    prefix = f"LLM_{chain.upper()}_"
+
+    def env(key: str, default=None):
+        return os.getenv(prefix + key) or default
+
+    model_name = env("MODEL", model_name or os.getenv("MODEL_NAME"))
+    base_url = env("BASE_URL", base_url or os.getenv("BASE_URL"))
+    api_key = env("API_KEY", api_key or os.getenv("OPENAI_API_KEY"))
+    temperature = float(env("TEMPERATURE", DEFAULT_TEMPERATURES.get(chain, 0.7)))
+    timeout = env("TIMEOUT", os.getenv("LLM_TIMEOUT"))
+    timeout = float(timeout) if timeout else get_dependency("llm").timeout
+    max_tokens = env("MAX_TOKENS", os.getenv("LLM_MAX_TOKENS"))
+    max_tokens = int(max_tokens) if max_tokens else None
+    # 客户端自带指数退避重试（超时、连接失败、限流、5xx）
+    max_retries = int(os.getenv("LLM_MAX_RETRIES", get_dependency("llm").retries))
+    callbacks = list(callbacks or [])
+
+    # 熔断回调必须排在最前：熔断中 before_call 抛出后调用不会开始，也不会有 end/error 回调，
+    # 排在它之前的回调（如 UsageRecorder）在 start 中登记的状态会一直残留
+    fallback_model = env("FALLBACK_MODEL")
+    fallback = None
+    if fallback_model:
+        # 有备用端点时主端点少重试，尽快切换
+        max_retries = int(os.getenv("LLM_FALLBACK_MAX_RETRIES", 0))
+        fallback = get_llm(
+            model_name=fallback_model,
+            base_url=env("FALLBACK_BASE_URL", base_url),
+            api_key=env("FALLBACK_API_KEY", api_key),
+            temperature=temperature,
+            timeout=timeout,
+            max_tokens=max_tokens,
+            callbacks=[CircuitBreakerCallback(f"llm:{chain}:fallback")] + callbacks,
+        )
+    primary = get_llm(model_name, base_url, api_key, temperature, timeout, max_tokens, max_retries,
+                      [CircuitBreakerCallback(f"llm:{chain}")] + callbacks)
+    return ChainLLM(chain, primary, fallback)
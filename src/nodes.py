@@ -1,14 +1,27 @@
-from colorama import Fore, Style
-from typing import Dict, Any
-from time import sleep
+import os
+import time
+import random
 from langchain.schema import HumanMessage, AIMessage
 from datetime import datetime
 
 from .tools.QQMailTools import QQMailTools
-from .state import GraphState, Email
+from .state import GraphState
 from .chains import Chains
+from .prompts_zh import EMAIL_WRITER_SYSTEM, EMAIL_WRITER_USER
 from src.rag import RAGEngine
 from src.utils.rabbitmq import MQClient
+from src.utils.redis_utils import redis_conn
+from src.utils.thread_memory import ThreadMemory
+from src.utils.tokens import count_tokens, fit_sections
+from src.context import assemble_context
+from src.prefilter import PreFilter
+from src.draft_checks import DraftChecker, DEFAULT_FORBIDDEN_PHRASES
+from src.schema_outputs import EmailCategory
+from src.utils.centroid_classifier import CentroidClassifier
+from src.utils.stats import StatsRecorder
+from src.utils.log import get_logger
+
+logger = get_logger(__name__)
 
 
 class Nodes:
@@ -17,271 +30,409 @@ class Nodes:
         self.chains = Chains(model_name, base_url, api_key)
         self.rag_engine = rag_engine
         self.mq_client = mq_client
+        self.thread_memory = ThreadMemory(redis_conn, summary_tokens=int(os.getenv("THREAD_SUMMARY_TOKENS", 400)))
+        # 追问与上一轮客户邮件的 embedding 相似度不低于该值时视为同一话题
+        self.thread_topic_similarity = float(os.getenv("THREAD_TOPIC_SIMILARITY", 0.8))
+        # 写作提示词的 token 上限（含模板本身）
+        self.writer_prompt_budget = int(os.getenv("WRITER_PROMPT_TOKEN_BUDGET", 3000))
+        self._writer_template_tokens = count_tokens(EMAIL_WRITER_SYSTEM) + count_tokens(EMAIL_WRITER_USER)
+        # 分类前的预过滤（邮件头规则 + 可选的本地分类器）
+        self.prefilter = PreFilter(
+            redis_conn,
+            model_path=os.getenv("PREFILTER_MODEL_PATH", "./models/prefilter.json"),
+            min_confidence=float(os.getenv("PREFILTER_MIN_CONFIDENCE", 0.95)),
+        )
+        # 第一层分类：正文 embedding 质心分类，置信度不足时回退到 LLM 分类
+        self.centroid_classifier = CentroidClassifier(
+            redis_conn,
+            labels=[category.value for category in EmailCategory],
+            min_samples=int(os.getenv("CENTROID_MIN_SAMPLES", 20)),
+        )
+        self.centroid_min_confidence = float(os.getenv("CENTROID_MIN_CONFIDENCE", 0.9))
+        self.centroid_shadow_rate = float(os.getenv("CENTROID_SHADOW_RATE", 0.05))
+        self.classifier_stats = StatsRecorder(redis_conn, "classifier")
+        # 写作提示词中参考文档部分的 token 上限
+        self.rag_context_budget = int(os.getenv("RAG_CONTEXT_TOKEN_BUDGET", 1200))
+        # 流式写作：边生成边做本地检查，明显不合格的草稿提前中止，不再交给 LLM 校对
+        self.writer_streaming = os.getenv("WRITER_STREAMING", "true").lower() == "true"
+        self.writer_max_chars = int(os.getenv("WRITER_MAX_CHARS", 600))
+        self.writer_min_chars = int(os.getenv("WRITER_MIN_CHARS", 60))
+        forbidden = os.getenv("WRITER_FORBIDDEN_PHRASES")
+        self.writer_forbidden_phrases = [p.strip() for p in forbidden.split(",")] if forbidden else list(DEFAULT_FORBIDDEN_PHRASES)
+        self.writer_stats = StatsRecorder(redis_conn, "writer")
+        # 通过本地检查且风险评分低于阈值的草稿不再调用 LLM 校对
+        self.proofreader_skip_low_risk = os.getenv("PROOFREADER_SKIP_LOW_RISK", "true").lower() == "true"
+        self.proofreader_risk_threshold = float(os.getenv("PROOFREADER_RISK_THRESHOLD", 0.3))
 
     # 定义节点
-    def load_new_emails(self, state: GraphState) -> GraphState:
+    def prefilter_email(self, state: GraphState) -> GraphState:
         """
-        加载新的未处理过的邮件
+        预过滤：自动回复、退信、群发邮件直接忽略；本地分类器置信度足够高时直接给出分类，省去 LLM 分类
         """
-        print(Fore.BLUE + "正在加载新邮件...\n" + Style.RESET_ALL)
-        recent_emails = self.qq_mail_tools.fetch_unanswered_emails()
-        emails = [Email(**email) for email in recent_emails]
-        return {"emails": emails}
-        
-    def is_email_inbox_empty(self, state: GraphState) -> GraphState:
-        """
-        Check if the email inbox is empty.
-        """
-        return state
-    
-    
-    def check_more_emails(self, state: GraphState) -> Dict[str, Any]:
-        """检查是否有更多邮件需要处理"""
-        current_index = state["current_email_index"]
-        total_emails = len(state["emails"])
-        has_more = current_index < total_emails
-        print(Fore.CYAN + f"🔍 check_more_emails：当前索引={current_index}，总邮件数={total_emails}，是否有更多={has_more}" + Style.RESET_ALL)
-        return {**state, "has_more": has_more}
-    
+        current_email = state["current_email"]
+        reason = self.prefilter.check_headers(current_email)
+        if reason:
+            logger.info("预过滤命中邮件头规则: %s", reason)
+            self.qq_mail_tools.mark_email_ignored(current_email.id, reason)
+            return {"email_category": "unrelated", "prefilter_reason": reason}
 
+        predicted = self.prefilter.classify(current_email)
+        if not predicted:
+            return {}
+        category, confidence = predicted
+        reason = f"classifier:{confidence:.2f}"
+        logger.info("本地分类器结果: %s（置信度 %.2f）", category, confidence)
+        if category == "unrelated":
+            self.qq_mail_tools.mark_email_ignored(current_email.id, reason)
+        else:
+            self.qq_mail_tools.update_email_category(current_email.id, category)
+        return {"email_category": category, "prefilter_reason": reason}
 
-    def get_next_email(self, state: GraphState) -> GraphState:
-        """进入此节点，必定有更多邮件需要处理，获取下一封邮件进行处理"""
-        index = state["current_email_index"]
-        next_index = index + 1
+    def load_thread_context(self, state: GraphState) -> GraphState:
+        """
+        加载会话记忆：追问时提供此前往来的摘要；话题未变时直接复用上一轮的查询与检索结果
+        """
+        current_email = state["current_email"]
+        thread_key = self.thread_memory.thread_key(current_email)
+        memory = self.thread_memory.load(thread_key)
+        if not memory:
+            return {"thread_key": thread_key}
 
-        return {
-            **state,
-            # 重置当前邮件相关的状态
-            "current_email": state["emails"][index],
-            "current_email_index": next_index,
-            "email_category": "",
-            "generated_email": "",
-            "rag_queries": [],
-            "retrieved_documents": "",
-            "writer_messages": [],
-            "sendable": False,
-            "trials": 0
-        }
+        logger.info("检测到同一会话的追问，加载会话上下文")
+        update = {"thread_key": thread_key, "thread_context": self.thread_memory.render_summary(memory)}
+        if memory.get("chunk_ids") and memory.get("topic"):
+            try:
+                similarity = self.rag_engine.text_similarity(current_email.body, memory["topic"])
+            except Exception:
+                # 无法判断话题时按新话题处理，走完整的查询构造与检索
+                similarity = 0.0
+            logger.info("与上一轮话题相似度: %.3f", similarity)
+            if similarity >= self.thread_topic_similarity:
+                chunks = self.rag_engine.get_chunks(memory["chunk_ids"])
+                if chunks:
+                    retrieved_str, used_chunk_ids = assemble_context(chunks, self.rag_context_budget)
+                    update.update({
+                        "thread_reuse": True,
+                        "rag_queries": memory.get("rag_queries", []),
+                        "retrieved_chunk_ids": used_chunk_ids,
+                        "retrieved_documents": retrieved_str,
+                    })
+        return update
 
     def categorize_email(self, state: GraphState) -> GraphState:
         """
-        调用分类chain对邮件进行分类
+        邮件分类：先用正文 embedding 的质心分类器（第一层），置信度不足时再调用分类chain
         """
-        print(Fore.BLUE + "正在分类邮件...\n" + Style.RESET_ALL)
+        logger.debug("正在分类邮件")
         current_email = state["current_email"]
+
+        # 1. 第一层：质心分类（embedding 有缓存，会话话题判断时可能已经算过）
+        start = time.perf_counter()
+        embedding, predicted = None, None
+        try:
+            embedding = self.rag_engine.embed_cached([current_email.body])[0]
+            predicted = self.centroid_classifier.predict(embedding)
+        except Exception as e:
+            logger.warning("质心分类失败，使用 LLM 分类: %s", e)
+        centroid_ms = (time.perf_counter() - start) * 1000
+
+        confident = predicted is not None and predicted[1] >= self.centroid_min_confidence
+        # 命中时按比例仍调用 LLM，用于持续评估与 LLM 的一致率
+        shadow = confident and random.random() < self.centroid_shadow_rate
+        if confident and not shadow:
+            category, confidence = predicted
+            logger.info("质心分类结果: %s（置信度 %.2f）", category, confidence)
+            # 只累计质心分类耗时，节省的时间由 /stats/pipeline 按 LLM 分类的平均耗时推算
+            self.classifier_stats.incr(requests=1, centroid_hits=1, centroid_ms=centroid_ms)
+            self.qq_mail_tools.update_email_category(current_email.id, category)
+            return {"email_category": category}
+
+        # 2. 第二层：LLM 分类
+        start = time.perf_counter()
         result = self.chains.categorize_email_chain().invoke({"email_content": current_email.body})
-        print(Fore.MAGENTA + f"nodes info: 分类结果Email category: {result.category.value}" + Style.RESET_ALL)
+        category = result.category.value
+        llm_ms = (time.perf_counter() - start) * 1000
+        logger.info("分类结果: %s", category)
+        self.qq_mail_tools.update_email_category(current_email.id, category)
 
-        return {
-            **state,
-            "email_category": result.category.value,
-        }
+        counters = {"requests": 1, "llm_calls": 1, "llm_ms": llm_ms}
+        if predicted is not None:
+            # 质心分类与 LLM 的一致率（全部预测 / 高置信度预测分别统计）
+            counters.update(compared=1, agreed=int(predicted[0] == category))
+            if confident:
+                counters.update(shadow_compared=1, shadow_agreed=int(predicted[0] == category))
+        self.classifier_stats.incr(**counters)
+
+        # LLM 分类结果作为本地分类器的训练样本
+        self.prefilter.record_sample(current_email, category)
+        if embedding is not None:
+            self.centroid_classifier.add_sample(category, embedding)
+
+        return {"email_category": category}
     
 
     def construct_rag_queries(self, state: GraphState) -> GraphState:
         """
         调用RAG agent构造RAG查询
         """
-        print(Fore.BLUE + "正在构造RAG查询...\n" + Style.RESET_ALL)
+        logger.debug("正在构造RAG查询")
         email_content = state["current_email"].body
         query_result = self.chains.design_rag_queries_chain().invoke({"email_content": email_content})
 
         for query in query_result.queries:
-            print(Fore.MAGENTA + f"nodes info: 构造RAG查询: {query}" + Style.RESET_ALL)
+            logger.debug("构造RAG查询: %s", query)
         
-        return {
-            **state,
-            "rag_queries": query_result.queries
-        }
+        return {"rag_queries": query_result.queries}
         
     
     def write_email(self, state: GraphState) -> GraphState:
         """
         调用邮件chain编写邮件
+        重写时只带上一版草稿和校对意见（不重复历次输入），整个提示词受 token 预算约束
         """
-        print(Fore.BLUE + "正在编写邮件...\n" + Style.RESET_ALL)
+        logger.debug("正在编写邮件")
 
         # 1. 从state中获取所需信息（确保前置节点已存入这些数据）
         current_email = state.get("current_email")  # 当前处理的客户邮件
         email_category = state.get("email_category")  # 邮件分类结果
-        rag_queries = state.get("rag_queries", [])  # RAG查询结果（可选，为空不影响）
-        history_messages = state.get("writer_messages", [])  # 历史编写记录
+        retrieved_documents = state.get("retrieved_documents", "")  # RAG检索到的参考信息（可选，为空不影响）
+        thread_context = state.get("thread_context", "")  # 同一会话此前往来的摘要
         trials = state.get("trials", 0) + 1  # 重试次数
 
+        # 2. 上一版草稿与校对意见（writer_messages 每轮整体替换，最多各一条）
+        last_draft, critique = "", ""
+        for msg in state.get("writer_messages", []):
+            if isinstance(msg, AIMessage):
+                last_draft = msg.content
+            elif isinstance(msg, HumanMessage):
+                critique = msg.content
 
-        #  构造提示词（优化：从 Message 对象提取 content，避免字符串拼接错误）
-        history_str_list = []
-        for msg in history_messages:
-            if isinstance(msg, HumanMessage):
-                history_str_list.append(f"用户：{msg.content}")
-            elif isinstance(msg, AIMessage):
-                history_str_list.append(f"AI：{msg.content}")
-        history_str = "\n".join(history_str_list) if history_str_list else "无历史沟通记录"
+        # 3. 按重要性从高到低压缩到预算内：校对意见 > 客户邮件 > 参考信息 > 上一版草稿 > 会话摘要
+        #    预算扣除模板与各段标题（按全部标题都出现计算）
+        frame_tokens = sum(map(count_tokens, self._writer_frame(email_category, {}, with_thread=True, with_history=True)))
+        sections = fit_sections([
+            ("critique", critique),
+            ("body", current_email.body),
+            ("references", retrieved_documents or "无"),
+            ("draft", last_draft),
+            ("thread_context", thread_context),
+        ], self.writer_prompt_budget - self._writer_template_tokens - frame_tokens)
 
-        email_information = (
-            f"# 客户邮件内容：{current_email.body}\n"
-            f"# 邮件分类：{email_category}\n"
-            f"# RAG检索参考：{rag_queries if rag_queries else '无'}\n"
+        email_information, history_str = self._writer_frame(
+            email_category, sections,
+            with_thread=bool(sections["thread_context"]),
+            with_history=bool(sections["draft"] or sections["critique"]),
         )
 
-        email_result = self.chains.email_writer_chain().invoke({
-            "email_information": email_information,  
-            "history": history_str 
-        })
-        email_content = email_result.content
-        print(Fore.MAGENTA + f"nodes info: 编写邮件内容: {email_content}" + Style.RESET_ALL)
-        
-        # 4. 关键：追加 Message 对象（而非字符串），统一类型
-        updated_history = history_messages + [
-            HumanMessage(content=f"第{trials}次编写的输入信息：{email_information}"),
-            AIMessage(content=f"第{trials}次编写结果：{email_content}")
-        ]
+        prompt_tokens = self._writer_template_tokens + count_tokens(email_information) + count_tokens(history_str)
+        logger.info("第%d次编写，提示词约 %d tokens", trials, prompt_tokens)
+
+        checker = self._draft_checker(state)
+        writer_input = {"email_information": email_information, "history": history_str}
+        if self.writer_streaming:
+            email_content, problem = self._stream_draft(writer_input, checker)
+        else:
+            email_content = self.chains.email_writer_chain().invoke(writer_input).content
+            problem = None
+        if problem is None:
+            problem = checker.check_final(email_content)
+        logger.debug("编写邮件内容: %s", email_content)
+        self.qq_mail_tools.mark_email_drafted(current_email.id, trials)
 
+        # 4. 只保留本次草稿（替换而非追加）；本地检查未通过时直接附上原因，不再调用 LLM 校对
+        if problem:
+            logger.warning("草稿未通过本地检查: %s", problem)
+            self.writer_stats.incr(drafts=1, local_rejects=1)
+            return {
+                "generated_email": email_content,
+                "trials": trials,
+                "sendable": False,
+                "draft_problem": problem,
+                "writer_messages": [
+                    AIMessage(content=email_content),
+                    HumanMessage(content=f"本地检查未通过：{problem}，请修改。")
+                ]
+            }
+        self.writer_stats.incr(drafts=1)
         return {
-            **state,
-            "generated_email": email_content, 
+            "generated_email": email_content,
             "trials": trials,
-            "writer_messages": updated_history
+            "draft_problem": "",
+            "writer_messages": [AIMessage(content=email_content)]
         }
-    
+
+    @staticmethod
+    def _writer_frame(email_category: str, sections: dict, with_thread: bool, with_history: bool) -> tuple:
+        """拼出写作提示词的 email_information 与 history 两部分；sections 为空时得到只含标题的框架"""
+        email_information = (
+            f"# 客户邮件内容：{sections.get('body', '')}\n"
+            f"# 邮件分类：{email_category}\n"
+            f"# RAG检索参考：\n{sections.get('references', '')}\n"
+        )
+        if with_thread:
+            email_information += f"# 此前往来摘要：\n{sections.get('thread_context', '')}\n"
+        if with_history:
+            history_str = f"上一版草稿：{sections.get('draft') or '（过长已省略）'}\n校对意见：{sections.get('critique', '')}"
+        else:
+            history_str = "无历史沟通记录"
+        return email_information, history_str
+
+    def _draft_checker(self, state: GraphState) -> DraftChecker:
+        """草稿的本地检查器，参考信息为检索结果、客户邮件与会话摘要"""
+        current_email = state["current_email"]
+        return DraftChecker(
+            "\n".join([state.get("retrieved_documents", ""), current_email.body, state.get("thread_context", "")]),
+            customer_text=current_email.body,
+            max_chars=self.writer_max_chars,
+            min_chars=self.writer_min_chars,
+            forbidden_phrases=self.writer_forbidden_phrases,
+        )
+
+    def _stream_draft(self, writer_input: dict, checker: DraftChecker):
+        """
+        流式生成草稿，每收到一段就检查已生成的部分；发现问题时停止接收（关闭流即取消后续生成）
+        返回 (已生成的内容, 问题原因或 None)
+        """
+        content = ""
+        stream = self.chains.email_writer_stream_chain().stream(writer_input)
+        try:
+            for partial in stream:
+                new_content = (partial or {}).get("content") or ""
+                if len(new_content) == len(content):
+                    continue
+                content = new_content
+                problem = checker.check_partial(content)
+                if problem:
+                    return content, problem
+        finally:
+            stream.close()
+        return content, None
+
 
     def verify_generated_email(self, state: GraphState) -> GraphState:
         """
-        调用邮件chain校对邮件
+        调用邮件chain校对邮件；草稿已通过本地检查且风险评分低于阈值时跳过 LLM 校对
         """
-        print(Fore.BLUE + "正在校对邮件...\n" + Style.RESET_ALL)
+        logger.debug("正在校对邮件")
+        if self.proofreader_skip_low_risk:
+            retrieved_documents = state.get("retrieved_documents", "")
+            risk, reasons = self._draft_checker(state).risk(
+                state["generated_email"],
+                state["email_category"],
+                trials=state.get("trials", 1),
+                has_references=bool(retrieved_documents) and retrieved_documents != "未提供有效查询，无检索结果",
+            )
+            logger.info("草稿风险评分 %.2f（%s）", risk, "; ".join(reasons))
+            if risk < self.proofreader_risk_threshold:
+                self.writer_stats.incr(proofreader_skipped=1)
+                return {"sendable": True}
+        self.writer_stats.incr(proofreader_calls=1)
         review = self.chains.email_proofreader_chain().invoke({
             "initial_email": state["current_email"].body,
             "generated_email": state["generated_email"],
         })
-        writer_messages = state.get('writer_messages', [])
-        writer_messages.append(f"# 校对结果：\n{review.reason}")
 
         return {
-            **state,
             "sendable": review.sendable,
-            "writer_messages": writer_messages
+            "writer_messages": [
+                AIMessage(content=state["generated_email"]),
+                HumanMessage(content=review.reason)
+            ]
         }
     
     def send_email(self, state: GraphState) -> GraphState:
         """
         发送邮件
         """
-        print(Fore.BLUE + "正在发送邮件...\n" + Style.RESET_ALL)
-        print(Fore.MAGENTA + f"nodes info: 原始邮件内容: {state['current_email']}" + Style.RESET_ALL)
-        print(Fore.MAGENTA + f"nodes info: 发送邮件内容: {state['generated_email']}" + Style.RESET_ALL)
-        self.qq_mail_tools.send_reply(
+        logger.info("正在发送邮件")
+        logger.debug("原始邮件内容: %s", state["current_email"])
+        logger.debug("发送邮件内容: %s", state["generated_email"])
+        sent = self.qq_mail_tools.send_reply(
             state["current_email"],
             state["generated_email"]
         )
-        return {
-            **state,
-            "retrieved_documents": "",  # 重置RAG检索结果（避免影响下一封邮件）
-            "trials": 0  # 重置重试次数（避免下一封邮件继承重试计数）
-        }
+        if not sent:
+            return {}
+        # 记入会话记忆，同一会话的追问可复用本轮的分类与检索结果
+        self.thread_memory.record_turn(
+            state.get("thread_key") or self.thread_memory.thread_key(state["current_email"]),
+            category=state["email_category"],
+            rag_queries=state.get("rag_queries", []),
+            chunk_ids=state.get("retrieved_chunk_ids", []),
+            customer_message=state["current_email"].body,
+            reply=state["generated_email"],
+        )
+        return {}
     
     def manual_pending(self, state: GraphState) -> GraphState:
         """
         手动处理邮件
         """
-        print(Fore.BLUE + "正在手动处理邮件...\n" + Style.RESET_ALL)
-        print(Fore.MAGENTA + f"{state}" + Style.RESET_ALL)
+        logger.info("转人工处理（%s）", state.get("manual_reason") or "max_trials")
+        logger.debug("转人工时的流程状态: %s", state)
         
         current_email = state["current_email"]
         task_data = {
             "email_id": current_email.id,
             "thread_id": current_email.threadId,
+            "message_id": current_email.messageId,
             "sender": current_email.sender,
             "subject": current_email.subject,
             "body": current_email.body,
             "category": state["email_category"],
+            "reason": state.get("manual_reason") or "max_trials",
             "created_at": datetime.now().isoformat(),
             "status": "pending"
         }
         self.mq_client.publish_task(task_data)
-
-        # todo : 更新redis状态
+        self.qq_mail_tools.update_manual_status(current_email.id, is_replied=False, operator="system")
         
-        return state
+        return {}
     
     def skip_unrelated_email(self, state: GraphState) -> GraphState:
         """
         跳过无关邮件(垃圾、广告邮件等)
         """
-        print(Fore.BLUE + "正在跳过无关邮件...\n" + Style.RESET_ALL)
-        print(Fore.MAGENTA + f"nodes info: 邮件内容: {state['current_email']}" + Style.RESET_ALL)
-        current_email_idx = state["current_email_index"] - 1
-        if 0 <= current_email_idx < len(state["emails"]):
-            state["emails"].pop(current_email_idx)  # 删除当前处理的邮件
-        else:
-            print(Fore.YELLOW + f"警告：无效的邮件索引 {current_email_idx}，跳过删除" + Style.RESET_ALL)
-        
-        return state    
+        logger.info("跳过无关邮件")
+        logger.debug("邮件内容: %s", state["current_email"])
+        return {}
     
     def retrieve_from_rag(self, state: GraphState) -> GraphState:
         """
         从RAG中检索文档
         """
-        print(Fore.BLUE + "正在从RAG中检索文档...\n" + Style.RESET_ALL)
+        logger.debug("正在从RAG中检索文档")
         
         rag_queries = state.get("rag_queries", [])
         if not rag_queries:
-            print(Fore.YELLOW + "警告：未获取到 RAG 查询，检索跳过" + Style.RESET_ALL)
-            return {"retrieved_documents": "未提供有效查询，无检索结果", "retrieval_details": []}
+            logger.warning("未获取到 RAG 查询，检索跳过")
+            return {"retrieved_documents": "未提供有效查询，无检索结果"}
         
-        # 检索
+        # 检索（查询向量只生成一次，两路检索共用）
+        query_embeddings = self.rag_engine.embed_queries(rag_queries)
         # 1. 直接检索
         direct_results = self.rag_engine.retrieve_direct(
-            queries=rag_queries
+            queries=rag_queries,
+            query_embeddings=query_embeddings
         )
         # 2. HyDE检索
         hyde_results = self.rag_engine.retrieve_hyde(
-            queries=rag_queries
+            queries=rag_queries,
+            query_embeddings=query_embeddings
         )
-        # 3. 合并检索结果
+        # 3. 合并检索结果（按文档块去重、按得分排序）
         merged_results = self.rag_engine.merge_and_rerank(
             direct_results=direct_results,
             hyde_results=hyde_results,
         )
-        
-        # 4. 生成最终答案
-        retrieved_str = ""
-        retrieval_details = []  # 存储详细信息（用于调试）
-        if merged_results:
-            retrieved_str += f"找到 {len(merged_results)} 个相关参考信息：\n\n"
-            for idx, doc in enumerate(merged_results, 1):
-                # 只保留来源和内容（HyDE检索时补充匹配的问题）
-                source = doc.get("source", "未知来源")
-                content = doc.get("content", "无内容")
-                matching_question = doc.get("matching_question", "")  # 仅HyDE有
-                
-                # 简化格式
-                retrieved_str += f"{idx}. 来源：{source}\n"
-                if matching_question:  # 若有匹配问题，简要说明
-                    retrieved_str += f"（相关问题：{matching_question}）\n"
-                retrieved_str += f"内容：{content}\n\n"
-        else:
-            retrieved_str = "未找到相关参考信息"
 
-        print(Fore.MAGENTA + f"\n\nnodes info: RAG 检索结果：\n{retrieved_str}\n\n" + Style.RESET_ALL)
+        # 4. 组装参考信息：合并重叠块、按得分压缩到 token 预算内
+        retrieved_str, used_chunk_ids = assemble_context(merged_results, self.rag_context_budget)
+
+        logger.info("RAG 检索结果 %d 段，%d tokens", len(used_chunk_ids), count_tokens(retrieved_str))
+        logger.debug("RAG 检索结果：\n%s", retrieved_str)
         
         return {
-            **state,
-            "retrieved_documents": retrieved_str
+            "retrieved_documents": retrieved_str,
+            "retrieved_chunk_ids": used_chunk_ids,
         }
-
-
-    def wait_for_next_check(self, state: GraphState) -> Dict[str, Any]:
-        """等待一段时间后再检查新邮件"""
-        # 从环境变量获取等待时间，默认为1小时
-        wait_hours = 1
-        print(f"所有邮件处理完毕，将在{wait_hours}小时后再次检查新邮件...")
-        sleep(wait_hours * 3600) 
-        return {
-            **state,
-            "emails": [],  # 清空旧邮件列表
-            "current_email_index": 0,  # 重置索引为0
-            "has_more": False,  # 重置为“无更多邮件”
-            "current_email": None  # 清空当前邮件
-        }
\ No newline at end of file
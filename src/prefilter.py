@@ -0,0 +1,91 @@
+import os
+import re
+from typing import Optional, Tuple
+
+from src.tools.schema_mail import Email
+from src.utils.text_classifier import HashedNgramClassifier
+from src.utils.log import get_logger
+
+logger = get_logger(__name__)
+
+_BOUNCE_SENDER_RE = re.compile(r"mailer-daemon|postmaster|no-?reply@.*bounce", re.IGNORECASE)
+# 主题规则只在没有邮件头证据时兜底，必须是邮件系统生成的固定主题，不能误伤客户在主题里提到的「退信」「休假」
+# 自动回复：前缀后必须紧跟冒号（「自动回复: 原主题」「Automatic reply: ...」）
+_AUTO_REPLY_SUBJECT_RE = re.compile(
+    r"^(自动回复|自动答复|auto(matic)?[ -]?reply|out of (the )?office( reply)?)\s*[:：]", re.IGNORECASE
+)
+# 退信：常见 MTA 的固定主题（Postfix / Gmail / Exim / Sendmail / Outlook / QQ 邮箱）
+_BOUNCE_SUBJECT_RE = re.compile(
+    r"^(undelivered mail returned to sender$"
+    r"|delivery status notification \((failure|delay)\)$"
+    r"|mail delivery failed: returning message to sender$"
+    r"|returned mail: see transcript for details$"
+    r"|undeliverable\s*[:：]"
+    r"|系统退信$"
+    r"|退信通知\s*[:：]?$)",
+    re.IGNORECASE,
+)
+
+
+class PreFilter:
+    """
+    分类前的低成本预过滤，命中时不再调用 LLM 分类：
+    1. 邮件头规则：自动回复（Auto-Submitted / X-Autoreply）、退信（空发件人、multipart/report）、群发（Precedence: bulk、List-Unsubscribe）；
+       没有邮件头证据时，只有邮件系统生成的固定主题（如「Undelivered Mail Returned to Sender」「自动回复:」）才会命中
+    2. 可选的本地文本分类器（哈希 n-gram 逻辑回归，由历史 LLM 分类结果训练），置信度足够高时直接给出分类
+    """
+    # 训练样本：LLM 分类结果（正文截断后）写入 Redis 列表，供 train_classifier.py 训练
+    SAMPLES_KEY = "qqmail:classifier:samples"
+    MAX_SAMPLES = 20000
+
+    def __init__(self, redis_conn=None, model_path: Optional[str] = None, min_confidence: float = 0.95):
+        """
+        params:
+            model_path: 本地分类器模型文件，不存在时只使用邮件头规则
+            min_confidence: 本地分类器的最低置信度，低于该值交给 LLM 分类
+        """
+        self.redis_conn = redis_conn
+        self.min_confidence = min_confidence
+        self.classifier = None
+        if model_path and os.path.exists(model_path):
+            self.classifier = HashedNgramClassifier.load(model_path)
+            logger.info("已加载本地预分类模型 %s，类别: %s", model_path, self.classifier.labels)
+
+    def check_headers(self, email: Email) -> Optional[str]:
+        """邮件头规则，命中时返回忽略原因"""
+        headers = {k.lower(): v.strip().lower() for k, v in email.headers.items()}
+        if headers.get("auto-submitted", "no") != "no" or "x-autoreply" in headers or "x-autorespond" in headers:
+            return "auto_reply"
+        if headers.get("return-path") == "<>" or _BOUNCE_SENDER_RE.search(email.sender or ""):
+            return "bounce"
+        if "multipart/report" in headers.get("content-type", ""):
+            return "bounce"
+        if headers.get("precedence") in ("bulk", "junk", "list", "auto_reply"):
+            return "bulk"
+        if "list-unsubscribe" in headers or "list-id" in headers:
+            return "newsletter"
+        subject = (email.subject or "").strip()
+        if _BOUNCE_SUBJECT_RE.search(subject):
+            return "bounce"
+        if _AUTO_REPLY_SUBJECT_RE.search(subject):
+            return "auto_reply"
+        return None
+
+    def classify(self, email: Email) -> Optional[Tuple[str, float]]:
+        """本地分类器预测，置信度足够高时返回 (类别, 置信度)"""
+        if self.classifier is None:
+            return None
+        label, confidence = self.classifier.predict(f"{email.subject}\n{email.body}")
+        if label and confidence >= self.min_confidence:
+            return label, confidence
+        return None
+
+    def record_sample(self, email: Email, category: str) -> None:
+        """记录一条 LLM 分类结果作为训练样本"""
+        if not self.redis_conn:
+            return
+        text = f"{email.subject}\n{email.body}"[:2000]
+        pipe = self.redis_conn.pipeline()
+        pipe.lpush(self.SAMPLES_KEY, f"{category}\t{text}")
+        pipe.ltrim(self.SAMPLES_KEY, 0, self.MAX_SAMPLES - 1)
+        pipe.execute()
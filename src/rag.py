@@ -1,17 +1,26 @@
 import os
 import uuid
+import hashlib
+import threading
+from collections import OrderedDict
 from typing import List, Dict, Tuple, Optional
 
 from openai import OpenAI
 from langchain_chroma import Chroma
 from langchain.text_splitter import RecursiveCharacterTextSplitter
 from langchain_core.prompts import PromptTemplate
-from langchain_openai import ChatOpenAI
 from langchain.docstore.document import Document
 from langchain_dashscope import DashScopeEmbeddings
+from langchain_core.embeddings import Embeddings
 
 from src.schema_outputs import RAGQueriesOutput
 from src.utils.database import MySQLManager
+from src.llm import ChainLLM, ENDPOINT_ERRORS
+from src.utils.resilience import get_dependency
+from src.utils.metrics import EMBEDDING_BATCH_SIZE
+from src.utils.log import get_logger
+
+logger = get_logger(__name__)
 
 
 class RAGEngine:
@@ -27,6 +36,7 @@ class RAGEngine:
         top_k: int = 3,
         chunk_size: int = 500,
         chunk_overlap: int = 50,
+        embedding_function: Optional[Embeddings] = None,
     ):
         """
         初始化 RAG 引擎
@@ -38,6 +48,7 @@ class RAGEngine:
             top_k: 检索文档数量, 默认为 3
             chunk_size: 文档块大小, 默认为 500
             chunk_overlap: 文档块重叠大小, 默认为 50
+            embedding_function: Chroma 写入文档时使用的 Embeddings，默认为 DashScopeEmbeddings（离线基准测试可替换）
         """
         self.embedding_model_name = embedding_model_name
         self.dimensions = dimensions
@@ -46,11 +57,20 @@ class RAGEngine:
         self.chunk_overlap = chunk_overlap
         self.db_manager = db_manager
 
-        # 初始化 Embedding 客户端 
-        self.embedding_client = OpenAI(api_key=api_key, base_url=base_url)
+        # 外部调用的超时、重试与熔断策略
+        self.embedding_dependency = get_dependency("embedding")
+        self.chroma_dependency = get_dependency("chroma")
+
+        # 初始化 Embedding 客户端（重试由 embedding_dependency 统一处理）
+        self.embedding_client = OpenAI(
+            api_key=api_key,
+            base_url=base_url,
+            timeout=self.embedding_dependency.timeout,
+            max_retries=0,
+        )
 
         # 初始化 LangChain 的 Embeddings 封装，用于 Chroma
-        self.embedding_model = DashScopeEmbeddings(
+        self.embedding_model = embedding_function or DashScopeEmbeddings(
             model=embedding_model_name,
             api_key=api_key
         )
@@ -67,6 +87,11 @@ class RAGEngine:
             collection_name="hyde_questions"
         )
 
+        # 文本向量的进程内 LRU 缓存（同一封邮件的正文会被分类、会话话题判断等多处使用）
+        self._embedding_cache: "OrderedDict[str, List[float]]" = OrderedDict()
+        self._embedding_cache_size = 256
+        self._embedding_cache_lock = threading.Lock()
+
         # 初始化文本分割器
         self.text_splitter = RecursiveCharacterTextSplitter(
             chunk_size=self.chunk_size,
@@ -76,8 +101,11 @@ class RAGEngine:
 
     def _embed_texts(self, texts: List[str]) -> List[List[float]]:
         """调用 embedding 模型生成向量 (直接 API 调用，用于自定义逻辑)"""
+        EMBEDDING_BATCH_SIZE.observe(len(texts))
         try:
-            response = self.embedding_client.embeddings.create(
+            response = self.embedding_dependency.call(
+                self.embedding_client.embeddings.create,
+                errors=ENDPOINT_ERRORS,
                 model=self.embedding_model_name,
                 input=texts,
                 encoding_format="float",
@@ -85,10 +113,28 @@ class RAGEngine:
             )
             return [item.embedding for item in response.data]
         except Exception as e:
-            print(f"Embedding 嵌入生成失败: {e}")
+            logger.error("Embedding 嵌入生成失败: %s", e)
             raise
 
-    def _generate_hyde_questions(self, chunk_content: str, llm: ChatOpenAI) -> List[str]:
+    def embed_cached(self, texts: List[str]) -> List[List[float]]:
+        """带缓存的 embedding：未命中的文本合并为一次调用"""
+        keys = [hashlib.sha1(text.encode("utf-8")).hexdigest() for text in texts]
+        with self._embedding_cache_lock:
+            cached = {key: self._embedding_cache[key] for key in keys if key in self._embedding_cache}
+        missing = list(dict.fromkeys(key for key in keys if key not in cached))
+        if missing:
+            missing_texts = [texts[keys.index(key)] for key in missing]
+            for key, embedding in zip(missing, self._embed_texts(missing_texts)):
+                cached[key] = embedding
+        with self._embedding_cache_lock:
+            for key in keys:
+                self._embedding_cache[key] = cached[key]
+                self._embedding_cache.move_to_end(key)
+            while len(self._embedding_cache) > self._embedding_cache_size:
+                self._embedding_cache.popitem(last=False)
+        return [cached[key] for key in keys]
+
+    def _generate_hyde_questions(self, chunk_content: str, llm: ChainLLM) -> List[str]:
         """基于文档块生成反向 HyDE 问题"""
         prompt = """
         你是一个问题生成专家。
@@ -115,7 +161,7 @@ class RAGEngine:
             result = chain.invoke({"chunk_content": chunk_content})
             return result.queries
         except Exception as e:
-            print(f"Prompt 模板生成失败: {e}")
+            logger.error("Prompt 模板生成失败: %s", e)
             return []
 
     def process_document(
@@ -123,7 +169,7 @@ class RAGEngine:
         document_content: str,
         document_id: Optional[str] = None,
         source: str = "unknown",
-        llm: ChatOpenAI = None
+        llm: ChainLLM = None
     ) -> Tuple[int, int]:
         """分割并存储文档，生成 HyDE 问题"""
         if not document_id:
@@ -132,14 +178,13 @@ class RAGEngine:
         # 1. 分割文档块
         chunks = self.text_splitter.split_text(document_content)
         chunk_count = len(chunks)
-        question_count = 0
-
-        # 2. 处理每个文档块
-        for i, chunk in enumerate(chunks):
-            chunk_id = str(uuid.uuid4())
+        if not chunks:
+            return 0, 0
 
-            # 3. 存储到向量库
-            doc = Document(
+        # 2. 批量存储文档块到向量库（一次批量 embedding）
+        chunk_ids = [str(uuid.uuid4()) for _ in chunks]
+        chunk_docs = [
+            Document(
                 page_content=chunk,
                 metadata={
                     "chunk_id": chunk_id,
@@ -148,111 +193,175 @@ class RAGEngine:
                     "chunk_index": i
                 }
             )
-            self.chunk_vector_db.add_documents([doc])
-
-            # 4. 存储文档块元数据到 MySQL
-            self.db_manager.execute_query("""
-                INSERT INTO chunk_metadata 
-                (chunk_id, source, document_id, chunk_index)
-                VALUES (%s, %s, %s, %s)
-                ON DUPLICATE KEY UPDATE 
-                source = VALUES(source), 
-                document_id = VALUES(document_id),
-                chunk_index = VALUES(chunk_index)
-                """, (chunk_id, source, document_id, i), commit=True)
-
-            # 5. 为文档块生成 HyDE 问题
-            questions = self._generate_hyde_questions(chunk, llm)
-            question_count += len(questions)
-
-            if questions:
-                # 6. 存储问题及其向量
-                question_ids = [str(uuid.uuid4()) for _ in questions]
-                question_docs = [
-                    Document(
-                        page_content=question,
-                        metadata={"question_id": qid, "chunk_id": chunk_id}
-                    )
-                    for qid, question in zip(question_ids, questions)
-                ]
-                self.question_vector_db.add_documents(question_docs)
-
-                # 存储问题与文档块的映射关系
-                for qid, question in zip(question_ids, questions):
-                    self.db_manager.execute_query("""
-                    INSERT INTO question_chunk_mapping 
-                    (question_id, chunk_id, question_content)
-                    VALUES (%s, %s, %s)
-                    ON DUPLICATE KEY UPDATE 
-                    question_content = VALUES(question_content)
-                    """, (qid, chunk_id, question), commit=True)
+            for i, (chunk_id, chunk) in enumerate(zip(chunk_ids, chunks))
+        ]
+        self.chunk_vector_db.add_documents(chunk_docs)
+
+        # 3. 批量存储文档块元数据到 MySQL
+        self.db_manager.execute_many("""
+            INSERT INTO chunk_metadata 
+            (chunk_id, source, document_id, chunk_index)
+            VALUES (%s, %s, %s, %s)
+            ON DUPLICATE KEY UPDATE 
+            source = VALUES(source), 
+            document_id = VALUES(document_id),
+            chunk_index = VALUES(chunk_index)
+            """, [(chunk_id, source, document_id, i) for i, chunk_id in enumerate(chunk_ids)])
+
+        # 4. 为每个文档块生成 HyDE 问题
+        question_docs = []
+        mapping_rows = []
+        for chunk_id, chunk in zip(chunk_ids, chunks):
+            for question in self._generate_hyde_questions(chunk, llm):
+                qid = str(uuid.uuid4())
+                question_docs.append(Document(
+                    page_content=question,
+                    metadata={"question_id": qid, "chunk_id": chunk_id}
+                ))
+                mapping_rows.append((qid, chunk_id, question))
+        question_count = len(question_docs)
+
+        if question_docs:
+            # 5. 批量存储问题及其向量
+            self.question_vector_db.add_documents(question_docs)
+
+            # 6. 批量存储问题与文档块的映射关系
+            self.db_manager.execute_many("""
+            INSERT INTO question_chunk_mapping 
+            (question_id, chunk_id, question_content)
+            VALUES (%s, %s, %s)
+            ON DUPLICATE KEY UPDATE 
+            question_content = VALUES(question_content)
+            """, mapping_rows)
 
         return chunk_count, question_count
 
-    def retrieve_direct(self, queries: List[str], top_k: int = 3) -> List[Dict]:
+    def embed_queries(self, queries: List[str]) -> List[List[float]]:
+        """一次 embedding 调用生成全部查询的向量（direct 与 HyDE 检索共用）"""
+        return self._embed_texts(queries) if queries else []
+
+    @staticmethod
+    def _relevance(distance: float) -> float:
+        """Chroma 返回的是距离（越小越相似），转换为 (0, 1] 的相关度分数"""
+        return 1.0 / (1.0 + max(distance, 0.0))
+
+    def retrieve_direct(
+        self, queries: List[str], top_k: Optional[int] = None, query_embeddings: Optional[List[List[float]]] = None
+    ) -> List[Dict]:
         """直接根据用户 query 检索文档块"""
+        top_k = top_k or self.top_k
+        if query_embeddings is None:
+            query_embeddings = self.embed_queries(queries)
         all_results = []
-        for query in queries:
-            query_embedding = self._embed_texts([query])[0]
-            results = self.chunk_vector_db.similarity_search_by_vector(
+        for query_embedding in query_embeddings:
+            results = self.chroma_dependency.call(
+                self.chunk_vector_db.similarity_search_by_vector_with_relevance_scores,
                 embedding=query_embedding,
                 k=top_k
             )
 
-            for doc in results:
+            for doc, distance in results:
                 all_results.append({
                     "chunk_id": doc.metadata.get("chunk_id"),
                     "content": doc.page_content,
                     "source": doc.metadata.get("source"),
                     "document_id": doc.metadata.get("document_id"),
+                    "chunk_index": doc.metadata.get("chunk_index"),
                     "retrieval_path": "direct",
-                    "score": 0.0
+                    "score": self._relevance(distance)
                 })
         return all_results
 
-    def retrieve_hyde(self, queries: List[str], top_k: int = 3) -> List[Dict]:
-        """根据 HyDE 问题检索文档块"""
-        all_results = []
-        for query in queries:
-            query_embedding = self._embed_texts([query])[0]
-            similar_questions = self.question_vector_db.similarity_search_by_vector(
+    def retrieve_hyde(
+        self, queries: List[str], top_k: Optional[int] = None, query_embeddings: Optional[List[List[float]]] = None
+    ) -> List[Dict]:
+        """根据 HyDE 问题检索文档块（所有查询命中的问题一次查映射、一次取回文档块）"""
+        top_k = top_k or self.top_k
+        if query_embeddings is None:
+            query_embeddings = self.embed_queries(queries)
+
+        # 1. 每个查询检索相似问题，同一问题取最高分
+        question_scores: Dict[str, float] = {}
+        for query_embedding in query_embeddings:
+            similar_questions = self.chroma_dependency.call(
+                self.question_vector_db.similarity_search_by_vector_with_relevance_scores,
                 embedding=query_embedding,
                 k=top_k
             )
+            for question, distance in similar_questions:
+                question_id = question.metadata.get("question_id")
+                if question_id:
+                    question_scores[question_id] = max(question_scores.get(question_id, 0.0), self._relevance(distance))
+        if not question_scores:
+            return []
 
-            question_ids = [q.metadata.get("question_id") for q in similar_questions if q.metadata.get("question_id")]
-            if not question_ids:
-                continue
-
-            placeholders = ", ".join(["%s"] * len(question_ids))
-            mappings = self.db_manager.execute_query(f"""
-            SELECT qcm.chunk_id, qcm.question_content, cm.source, cm.document_id
-            FROM question_chunk_mapping qcm
-            JOIN chunk_metadata cm ON qcm.chunk_id = cm.chunk_id
-            WHERE qcm.question_id IN ({placeholders})
-            """, tuple(question_ids), dictionary=True)
-
-            if not mappings:
-                continue
-
-            for mapping in mappings:
-                chunk_id = mapping["chunk_id"]
-                chunks = self.chunk_vector_db.get(
-                    where={"chunk_id": chunk_id},
-                    limit=1
-                )
-                if chunks and chunks["documents"]:
-                    all_results.append({
-                        "chunk_id": chunk_id,
-                        "content": chunks["documents"][0],
-                        "source": mapping["source"],
-                        "document_id": mapping["document_id"],
-                        "matching_question": mapping["question_content"],
-                        "retrieval_path": "hyde",
-                        "score": 0.0
-                    })
+        # 2. 问题 → 文档块映射
+        question_ids = list(question_scores)
+        placeholders = ", ".join(["%s"] * len(question_ids))
+        mappings = self.db_manager.execute_query(f"""
+        SELECT qcm.question_id, qcm.chunk_id, qcm.question_content, cm.source, cm.document_id, cm.chunk_index
+        FROM question_chunk_mapping qcm
+        JOIN chunk_metadata cm ON qcm.chunk_id = cm.chunk_id
+        WHERE qcm.question_id IN ({placeholders})
+        """, tuple(question_ids), dictionary=True)
+        if not mappings:
+            return []
+
+        # 3. 同一文档块只保留得分最高的匹配问题
+        best: Dict[str, Dict] = {}
+        for mapping in mappings:
+            score = question_scores.get(mapping["question_id"], 0.0)
+            if mapping["chunk_id"] not in best or score > best[mapping["chunk_id"]]["score"]:
+                best[mapping["chunk_id"]] = {**mapping, "score": score}
+
+        # 4. 批量取回文档块内容
+        chunks = self.chroma_dependency.call(self.chunk_vector_db.get, where={"chunk_id": {"$in": list(best)}})
+        contents = {
+            metadata.get("chunk_id"): content
+            for content, metadata in zip(chunks.get("documents") or [], chunks.get("metadatas") or [])
+        }
+        all_results = []
+        for chunk_id, mapping in best.items():
+            if chunk_id in contents:
+                all_results.append({
+                    "chunk_id": chunk_id,
+                    "content": contents[chunk_id],
+                    "source": mapping["source"],
+                    "document_id": mapping["document_id"],
+                    "chunk_index": mapping["chunk_index"],
+                    "matching_question": mapping["question_content"],
+                    "retrieval_path": "hyde",
+                    "score": mapping["score"]
+                })
         return all_results
 
+    def get_chunks(self, chunk_ids: List[str]) -> List[Dict]:
+        """按文档块ID批量取回文档块（会话追问复用上一轮的检索结果）"""
+        if not chunk_ids:
+            return []
+        chunks = self.chroma_dependency.call(self.chunk_vector_db.get, where={"chunk_id": {"$in": list(chunk_ids)}})
+        by_id = {
+            metadata.get("chunk_id"): {
+                "chunk_id": metadata.get("chunk_id"),
+                "content": content,
+                "source": metadata.get("source"),
+                "document_id": metadata.get("document_id"),
+                "chunk_index": metadata.get("chunk_index"),
+                "retrieval_path": "thread",
+                "score": 0.0
+            }
+            for content, metadata in zip(chunks.get("documents") or [], chunks.get("metadatas") or [])
+        }
+        # 保持上一轮的排序
+        return [by_id[chunk_id] for chunk_id in chunk_ids if chunk_id in by_id]
+
+    def text_similarity(self, text_a: str, text_b: str) -> float:
+        """两段文本的 embedding 余弦相似度（最多一次 embedding 调用）"""
+        vec_a, vec_b = self.embed_cached([text_a, text_b])
+        dot = sum(a * b for a, b in zip(vec_a, vec_b))
+        norm = (sum(a * a for a in vec_a) ** 0.5) * (sum(b * b for b in vec_b) ** 0.5)
+        return dot / norm if norm else 0.0
+
     def merge_and_rerank(
         self, 
         direct_results: List[Dict], 
@@ -261,16 +370,19 @@ class RAGEngine:
         top_n: int = 8,
         score_threshold: float = 0.5
     ) -> List[Dict]:
-        # 暂时仅仅合并，不进行 rerank
-        """合并 direct + HyDE 检索结果，并去重 + 排序"""
+        """合并 direct + HyDE 检索结果，按文档块去重（保留最高分）并按得分排序，取前 top_n"""
+        # 暂不进行模型 rerank，也不按 score_threshold 过滤（两路得分尺度不同）
         chunk_map = {}
         for result in direct_results + hyde_results:
             chunk_id = result["chunk_id"]
-            if chunk_id not in chunk_map:
+            existing = chunk_map.get(chunk_id)
+            if existing is None:
                 chunk_map[chunk_id] = result
-            else:
-                if result.get("score", 0) > chunk_map[chunk_id].get("score", 0):
-                    chunk_map[chunk_id] = result
+            elif result.get("score", 0) > existing.get("score", 0):
+                # 保留 HyDE 的匹配问题，便于写作时理解该块为何被召回
+                chunk_map[chunk_id] = {**existing, **result}
+            elif result.get("matching_question") and not existing.get("matching_question"):
+                existing["matching_question"] = result["matching_question"]
 
-        results = list(chunk_map.values())
-        return results
+        results = sorted(chunk_map.values(), key=lambda r: r.get("score", 0), reverse=True)
+        return results[:top_n]
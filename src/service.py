@@ -0,0 +1,198 @@
+import os
+import signal
+import threading
+from typing import List, Set
+
+from src.graph import GraphWorkFlow
+from src.tools.schema_mail import Email
+from src.utils.lease import LeaseManager
+from src.utils.mail_queue import MailQueue
+from src.utils.log import get_logger, shutdown_logging
+
+logger = get_logger(__name__)
+
+
+class MailRobotService:
+    """
+    常驻的邮件处理服务，多个进程/主机可共享同一个邮箱：
+    - fetcher：定时拉取新邮件，原子认领后发布到 Redis 共享队列
+    - worker：从共享队列领取邮件，抢到租约（SET NX + 心跳续期）后执行一次图
+    - 恢复：处理中但无人持有租约的邮件（持有者崩溃或执行失败）重新入队，由任意 worker 从 checkpoint 继续；
+      同一封邮件处理失败超过 max_attempts 次后转人工（转人工也失败则移入死信集合），不再占用处理中名额
+    - 背压：全局处理中的邮件数达到上限时暂停拉取（IMAP 读取会把邮件标记为已读，拉多了会积压）
+    - 优雅退出：收到 SIGINT/SIGTERM 后停止拉取与领取，等待处理中的邮件完成；再次收到信号则立即退出进程，
+      中断的邮件租约过期后由其他 worker 从 checkpoint 继续
+    """
+    ROLES = ("all", "fetcher", "worker")
+
+    def __init__(
+        self,
+        graph: GraphWorkFlow,
+        mail_queue: MailQueue,
+        leases: LeaseManager,
+        role: str = "all",
+        poll_interval: float = 300,
+        concurrency: int = 4,
+        max_in_flight: int = 16,
+        max_attempts: int = 3,
+    ):
+        """
+        params:
+            role: all（拉取+处理）/ fetcher（只拉取）/ worker（只处理）
+            poll_interval: 两次拉取新邮件之间的间隔（秒），也是无主邮件的检查间隔
+            concurrency: 本进程并发处理的邮件数（worker 线程数）
+            max_in_flight: 全局已入队但未处理完的邮件上限，超过后暂停拉取
+            max_attempts: 单封邮件最多处理次数（含进程崩溃中断的次数），用尽后转人工
+        """
+        if role not in self.ROLES:
+            raise ValueError(f"不支持的服务角色: {role}，可选: {', '.join(self.ROLES)}")
+        self.graph = graph
+        self.mail_tools = graph.mail_tools
+        self.mail_queue = mail_queue
+        self.leases = leases
+        self.role = role
+        self.poll_interval = poll_interval
+        self.concurrency = concurrency
+        self.max_in_flight = max(max_in_flight, concurrency)
+        self.max_attempts = max(max_attempts, 1)
+
+        self._stop = threading.Event()
+        self._lock = threading.Lock()
+        self._running: Set[str] = set()
+        self._workers: List[threading.Thread] = []
+
+    @property
+    def fetches(self) -> bool:
+        return self.role in ("all", "fetcher")
+
+    @property
+    def processes(self) -> bool:
+        return self.role in ("all", "worker")
+
+    def run(self) -> None:
+        """阻塞运行，直到收到退出信号"""
+        self._install_signal_handlers()
+        logger.info("邮件服务已启动 | 角色: %s | 并发: %d | 处理中上限: %d | 拉取间隔: %ss",
+                    self.role, self.concurrency, self.max_in_flight, self.poll_interval)
+        if self.processes:
+            for i in range(self.concurrency):
+                worker = threading.Thread(target=self._worker_loop, name=f"mail-worker-{i}")
+                worker.start()
+                self._workers.append(worker)
+        try:
+            while not self._stop.is_set():
+                if self.processes:
+                    self._requeue_orphans()
+                if self.fetches:
+                    self._fetch_once()
+                self._stop.wait(self.poll_interval)
+        finally:
+            self._shutdown()
+
+    def stop(self) -> None:
+        """请求停止：不再拉取和领取新邮件，处理中的邮件会继续处理完"""
+        if not self._stop.is_set():
+            logger.warning("收到退出信号，停止拉取新邮件，等待处理中的邮件完成...")
+        self._stop.set()
+
+    def _fetch_once(self) -> None:
+        capacity = self.max_in_flight - self.mail_queue.in_flight_count()
+        if capacity <= 0:
+            logger.warning("处理中邮件已达上限 %d，本轮暂停拉取", self.max_in_flight)
+            return
+        # 入队与认领标记在同一个 pipeline 中提交，认领成功的邮件一定在共享队列里
+        emails = self.mail_tools.fetch_unanswered_emails(max_results=capacity, on_email=self.mail_queue.enqueue)
+        if emails:
+            logger.info("已将 %d 封新邮件发布到共享队列", len(emails))
+
+    def _requeue_orphans(self) -> None:
+        for email_id in self.mail_queue.in_flight_ids():
+            with self._lock:
+                if email_id in self._running:
+                    continue
+            if not self.leases.is_held(email_id):
+                # 重复入队无害：领取时由租约去重，已完成的邮件会被跳过
+                self.mail_queue.requeue(email_id)
+
+    def _worker_loop(self) -> None:
+        while not self._stop.is_set():
+            try:
+                email_id = self.mail_queue.pop(timeout=1)
+            except Exception as e:
+                logger.error("领取邮件失败: %s", e)
+                self._stop.wait(1)
+                continue
+            if email_id:
+                self._process(email_id)
+
+    def _process(self, email_id: str) -> None:
+        # 抢不到租约说明其他 worker 正在处理这封邮件
+        if not self.leases.acquire(email_id):
+            return
+        with self._lock:
+            self._running.add(email_id)
+        try:
+            if not self.mail_queue.is_in_flight(email_id):
+                # 重复入队，邮件已由其他 worker 处理完成
+                return
+            payload = self.mail_queue.get_payload(email_id)
+            if payload is None:
+                # 邮件内容已过期，无法再处理：移出处理中集合，不再重复入队
+                logger.error("邮件 %s 的内容已过期，移出处理中集合", email_id)
+                self.mail_queue.complete(email_id)
+                return
+            email = Email.from_dict(payload)
+            attempts = self.mail_queue.record_attempt(email_id)
+            if attempts > self.max_attempts:
+                self._give_up(email, attempts - 1)
+                return
+            self.graph.process_email(email)
+            self.mail_queue.complete(email_id)
+        except Exception as e:
+            # 邮件仍留在处理中集合，租约释放后下一轮检查会重新入队，从 checkpoint 重试
+            logger.exception("邮件 %s 处理失败，将在下一轮重试: %s", email_id, e)
+        finally:
+            with self._lock:
+                self._running.discard(email_id)
+            self.leases.release(email_id)
+
+    def _give_up(self, email: Email, failures: int) -> None:
+        """多次处理失败的邮件转人工；转人工也失败时移入死信集合，两种情况都释放处理中名额"""
+        logger.error("邮件 %s 已处理失败 %d 次，不再重试，转人工处理", email.id, failures)
+        try:
+            self.graph.route_to_manual(email, f"max_attempts:{failures}")
+        except Exception as e:
+            logger.exception("邮件 %s 转人工失败，移入死信集合: %s", email.id, e)
+            self.mail_queue.dead_letter(email.id)
+            return
+        self.mail_queue.complete(email.id)
+
+    def _shutdown(self) -> None:
+        self._stop.set()
+        with self._lock:
+            pending = len(self._running)
+        if pending:
+            logger.info("等待 %d 封处理中的邮件完成...", pending)
+        for worker in self._workers:
+            worker.join()
+        self.leases.close()
+        self.mail_tools.mail_parser.close()
+        logger.info("邮件服务已退出")
+
+    def _install_signal_handlers(self) -> None:
+        if threading.current_thread() is not threading.main_thread():
+            return
+
+        def _handler(signum, frame):
+            if self._stop.is_set():
+                # 第二次信号：不再等待处理中的邮件（worker 线程不会被 KeyboardInterrupt 打断），直接结束进程；
+                # 邮件仍在处理中集合里，租约过期后重新入队
+                with self._lock:
+                    running = sorted(self._running)
+                logger.critical("再次收到退出信号，立即退出 | 中断的邮件: %s", running)
+                shutdown_logging()
+                os._exit(1)
+            self.stop()
+
+        signal.signal(signal.SIGINT, _handler)
+        signal.signal(signal.SIGTERM, _handler)
@@ -1,25 +1,29 @@
-from typing import List, TypedDict, Annotated
-from langgraph.graph import add_messages
-from typing import Optional
+from typing import List, TypedDict
 
 from src.tools.schema_mail import Email
 
+# 每封邮件单独执行一次图（一个 checkpoint thread），邮件批次不进入图状态；
+# 节点只返回本步变化的字段（增量），LangGraph 每个字段是独立的 channel，未返回的字段不会被复制
 class GraphState(TypedDict):
-    # 1. 多邮件处理必需字段
-    emails: List[Email]  # 存储加载的所有邮件（Email 类型列表）
-    current_email_index: int  # 跟踪当前处理的邮件索引（新增，解决循环问题）
-    has_more: bool  # 标记是否有更多邮件待处理（新增，与 initial_state 对齐）
-    
-    # 2. 当前邮件信息（Email 类型，与 schema 一致）
-    current_email: Optional[Email]  # 用 Optional 允许初始为 None，后续赋值
-    
-    # 3. 邮件分类与处理字段
+    # 1. 当前邮件信息
+    current_email: Email
+
+    # 2. 邮件分类与处理字段
     email_category: str  # 邮件分类结果（product/complaint/unrelated）
+    prefilter_reason: str  # 预过滤命中原因（邮件头规则或本地分类器），为空表示由 LLM 分类
     generated_email: str  # 生成的回复邮件内容
     rag_queries: List[str]  # RAG 检索用的查询语句列表
     retrieved_documents: str  # RAG 检索到的文档内容
-    
+    retrieved_chunk_ids: List[str]  # RAG 检索到的文档块ID（记入会话记忆，追问时复用）
+
+    # 3. 会话上下文字段（同一 thread 的追问）
+    thread_key: str  # 会话键（会话根邮件的 Message-ID）
+    thread_context: str  # 此前往来的摘要，代替完整的引用历史交给写作节点
+    thread_reuse: bool  # 话题未变，复用上一轮的查询与检索结果
+
     # 4. LLM 对话与重试字段
-    writer_messages: Annotated[list, add_messages]  # 邮件生成的对话历史
+    writer_messages: list  # 最近一版草稿与校对意见（每轮整体替换，不累积历次记录）
+    draft_problem: str  # 草稿未通过本地检查的原因，为空表示通过（交给 LLM 校对）
     sendable: bool  # 邮件是否可发送（校验结果）
-    trials: int  # 重试次数（避免无限循环）
\ No newline at end of file
+    trials: int  # 重试次数（避免无限循环）
+    manual_reason: str  # 转人工的原因（超过重试次数 / 依赖熔断），为空表示超过重试次数
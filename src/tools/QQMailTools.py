@@ -1,23 +1,31 @@
 import os
-import re
 import uuid
+import socket
+import threading
 import smtplib
 import imaplib
-import email
 from datetime import datetime, timedelta
 from email.mime.text import MIMEText
 from email.mime.multipart import MIMEMultipart
-from email.header import decode_header
 from enum import Enum 
-from colorama import Fore, Style
+from typing import Callable, Dict, List, Optional, Tuple
 from dotenv import load_dotenv
 load_dotenv()
 
 from src.utils.redis_utils import redis_conn
+from src.utils.resilience import DependencyUnavailable, get_dependency
+from src.utils.metrics import observe_dependency
+from src.utils.log import get_logger
 from .schema_mail import Email
+from .mail_parser import MailParser
+
+logger = get_logger(__name__)
+
 
 class EmailStatus(Enum):
     UNPROCESSED = ("unprocessed", "新读取的邮件，未处理")
+    CATEGORIZED = ("categorized", "已分类，处理中")
+    DRAFTED = ("drafted", "已生成回复草稿，待校对/发送")
     AUTO_REPLIED = ("auto_replied", "已自动回复的邮件") 
     MANUAL_PENDING = ("manual_pending", "需人工处理，暂存待介入")
     MANUAL_REPLIED = ("manual_replied", "已人工处理并回复的邮件")
@@ -33,7 +41,16 @@ class EmailStatus(Enum):
         """快速获取状态值（可选，避免记混元组顺序）"""
         return self.value[0]
 
+# 计为邮件服务器故障（网络、超时、连接断开）的异常；认证失败等配置错误不重试
+IMAP_ERRORS = (imaplib.IMAP4.abort, ConnectionError, TimeoutError, socket.gaierror)
+SMTP_ERRORS = (smtplib.SMTPServerDisconnected, smtplib.SMTPConnectError, ConnectionError, TimeoutError, socket.gaierror)
+
+
 class QQMailTools:
+    # 认领后、入队前的短期认领时长；入队成功后延长为长期认领（与状态记录同为30天）
+    CLAIM_PENDING_SECONDS = 600
+    CLAIM_KEEP_SECONDS = 60 * 60 * 24 * 30
+
     def __init__(self):
         self.email_from = os.getenv("EMAIL_FROM")
         self.smtp_host = os.getenv("SMTP_HOST")
@@ -43,116 +60,238 @@ class QQMailTools:
         self.email_delay_hours = os.getenv("EMAIL_DELAY_HOURS")
         self.imap_host = os.getenv("IMAP_HOST")
         self.imap_port = os.getenv("IMAP_PORT")
+        # 自建/本地测试邮件服务器可关闭 SSL（QQ 邮箱只支持 SSL）
+        self.mail_use_ssl = os.getenv("MAIL_USE_SSL", "true").lower() == "true"
 
         # 引入Redis
         self.redis_conn = redis_conn
+        # 当前进程标识，用于邮件认领
+        self.worker_id = f"{socket.gethostname()}:{os.getpid()}"
+
+        # IMAP / SMTP 的超时、重试与熔断策略
+        self.imap_dependency = get_dependency("imap")
+        self.smtp_dependency = get_dependency("smtp")
+
+        # 复用的 SMTP 会话（懒加载），加锁保证同一时刻只有一个线程在使用
+        self._smtp_server = None
+        self._smtp_lock = threading.Lock()
+
+        # 邮件解析阶段（MAIL_PARSE_WORKERS > 0 时使用进程池），正文按 MAIL_BODY_TOKEN_BUDGET 截断
+        self.mail_parser = MailParser(
+            max_workers=int(os.getenv("MAIL_PARSE_WORKERS", 0)),
+            token_budget=int(os.getenv("MAIL_BODY_TOKEN_BUDGET", 1500)),
+        )
     
-    def fetch_unanswered_emails(self, max_results=20):
+    def fetch_unanswered_emails(self, max_results=20, on_email: Optional[Callable[[dict, object], None]] = None):
         """
         获取最近 N 小时内的未读且未处理
+        多进程共享同一邮箱时，每封邮件先用 SET NX 原子认领，只有认领成功的进程会读取它：
+        1. 认领（短 TTL）→ 2. BODY.PEEK 读取（不标记已读）→ 3. 与 on_email 的写入在同一事务中把认领延长为长期
+        → 4. 标记已读。任一步崩溃时短 TTL 认领会过期，邮件仍是未读，下次拉取会重新认领
+        :param on_email: 认领成功后的回调 (email_info, pipeline)，如入队到共享队列；写命令需排进 pipeline
         """
         try:
             # 得到
             if not self.email_delay_hours or not self.email_delay_hours.isdigit():
-                print(f"{Fore.YELLOW} EMAIL_DELAY_HOURS配置无效, 默认使用8小时{Style.RESET_ALL}")
+                logger.warning("EMAIL_DELAY_HOURS配置无效, 默认使用8小时")
                 self.email_delay_hours = "8"
 
             now = datetime.now()
             time_limit = now - timedelta(hours=int(self.email_delay_hours))
             since_str = time_limit.strftime("%d-%b-%Y")
 
-            # 建立IMAP连接
-            mail = imaplib.IMAP4_SSL(self.imap_host, self.imap_port)
-            mail.login(self.email_account, self.email_password)
-            mail.select("inbox")
-
-            # 搜索最近 N 小时内的未读邮件
-            search_criteria = f'(UNSEEN SINCE "{since_str}")'
-            status, data = mail.search(None, search_criteria)
-            if status != "OK":
-                print(f"{Fore.RED} 搜索邮件失败 {Style.RESET_ALL}")
-                return []
-            email_ids = data[0].split()
-
-            unanswered_emails = []
-            for eid in email_ids[:max_results]:
-                eid_str = eid.decode()
-                redis_key = self._get_redis_key(eid_str)
-                # 判重逻辑：排除非「UNPROCESSED」状态的邮件
-                if self.redis_conn and self.redis_conn.exists(redis_key):
-                    existing_status = self.redis_conn.hget(redis_key, "status")
-                    # 非未处理状态列表（包含其他4种状态）
-                    non_unprocessed_status = [
-                        EmailStatus.AUTO_REPLIED.status_value,
-                        EmailStatus.MANUAL_PENDING.status_value,
-                        EmailStatus.MANUAL_REPLIED.status_value,
-                        EmailStatus.IGNORED.status_value
-                    ]
-                    if existing_status in non_unprocessed_status:
-                        existing_desc = self.redis_conn.hget(redis_key, "status_desc")
-                        print(f"⏭️  邮件{eid_str}已跳过 | 状态：{existing_desc}")
-                        continue
-
-                # 解析邮件
-                status, msg_data = mail.fetch(eid, "(RFC822)")
+            # 建立IMAP连接（连接失败时抖动重试，连续失败后熔断）
+            mail = self.imap_dependency.call(self._connect_imap, errors=IMAP_ERRORS)
+            try:
+                # 搜索最近 N 小时内的未读邮件（使用 UID，序号会随删除变化，不能跨会话/跨进程使用）
+                search_criteria = f'(UNSEEN SINCE "{since_str}")'
+                with observe_dependency("imap", "search"):
+                    status, data = mail.uid("search", None, search_criteria)
                 if status != "OK":
-                    print(f"{Fore.RED}❌ 获取邮件{eid_str}失败{Style.RESET_ALL}")
-                    continue
-                msg = email.message_from_bytes(msg_data[0][1])
-
-                # 解析主题（处理中文编码）
-                subject, encoding = decode_header(msg.get("Subject", ""))[0]
-                if isinstance(subject, bytes):
-                    subject = subject.decode(encoding or "utf-8", errors="ignore")
-                # 解析发件人、Message-ID、对话线程ID
-                from_ = msg.get("From", "Unknown")
-                message_id = msg.get("Message-ID", f"<{uuid.uuid4()}@qq.com>")
-                thread_id = msg.get("In-Reply-To", message_id)
-                # 解析正文
-                body = self._get_email_body(msg)
-                # 2解析 References 字段（从邮件头获取，对应 Email 类的 references 字段）
-                references = msg.get("References", "")  # 若邮件头无References，默认空字符串
-                references = references.strip()
-                email_info = {
-                    "id": eid_str,
-                    "threadId": thread_id,
-                    "messageId": message_id,
-                    "references": references,
-                    "sender": from_,
-                    "subject": subject,
-                    "body": body,
-                    "fetch_time": datetime.now().isoformat()  # 读取时间
-                }
-                self._update_email_status(email_info, status=EmailStatus.UNPROCESSED)
-                unanswered_emails.append(email_info)
-
-            mail.logout()
-            print(f"{Fore.GREEN} ✅ 读取完成 | 共找到{len(unanswered_emails)}封未处理邮件 {Style.RESET_ALL}")
-            return unanswered_emails
+                    logger.error("搜索邮件失败: %s", status)
+                    return []
+                email_ids = data[0].split()
+
+                def _download():
+                    """逐封认领并下载原始邮件，边下载边交给解析阶段"""
+                    for eid in email_ids:
+                        eid_str = eid.decode()
+                        # 判重逻辑：原子认领，已被本进程或其他进程认领的邮件直接跳过
+                        if not self._claim_email(eid_str):
+                            logger.info("邮件%s已跳过 | 已被认领", eid_str)
+                            continue
+                        # PEEK 不会标记为已读
+                        with observe_dependency("imap", "fetch"):
+                            status, msg_data = mail.uid("fetch", eid, "(BODY.PEEK[])")
+                        if status != "OK" or not msg_data or not isinstance(msg_data[0], tuple):
+                            logger.error("获取邮件%s失败", eid_str)
+                            self._release_claim(eid_str)
+                            continue
+                        downloaded.append(eid_str)
+                        yield eid_str, msg_data[0][1]
+                        if len(downloaded) >= max_results:
+                            return
+
+                downloaded = []
+                unanswered_emails = []
+                # 解析（MIME、正文清理）在进程池中进行，按完成顺序逐封入队，无需等整批解析完
+                for eid_str, email_info, error in self.mail_parser.parse_many(_download()):
+                    if error is not None:
+                        logger.error("解析邮件%s失败: %s", eid_str, error)
+                        self._release_claim(eid_str)
+                        continue
+                    logger.debug("邮件%s正文 token: %s → %s", eid_str, email_info["body_tokens_raw"], email_info["body_tokens"])
+                    if self.redis_conn:
+                        pipe = self.redis_conn.pipeline()
+                        self._update_email_status(email_info, status=EmailStatus.UNPROCESSED, extra_data={
+                            "body_tokens_raw": email_info["body_tokens_raw"],
+                            "body_tokens": email_info["body_tokens"],
+                        }, pipeline=pipe)
+                        if on_email:
+                            on_email(email_info, pipe)
+                        pipe.expire(self._get_claim_key(eid_str), self.CLAIM_KEEP_SECONDS)
+                        pipe.execute()
+                    elif on_email:
+                        on_email(email_info, None)
+                    with observe_dependency("imap", "store"):
+                        mail.uid("store", eid_str, "+FLAGS", "(\\Seen)")
+                    unanswered_emails.append(email_info)
+
+                logger.info("读取完成 | 共找到%d封未处理邮件", len(unanswered_emails))
+                return unanswered_emails
+            finally:
+                # 搜索失败提前返回或下载/解析中出错时也要关闭会话，避免每轮拉取泄漏一个 IMAP 连接
+                self._close_imap(mail)
         except Exception as e:
-            print(f"{Fore.RED} 获取邮件失败: {e} {Style.RESET_ALL}")
+            logger.error("获取邮件失败: %s", e)
             return []
+
+    def _connect_imap(self) -> imaplib.IMAP4:
+        """建立 IMAP 连接并选择收件箱；套接字超时对之后的每条命令都生效"""
+        imap_class = imaplib.IMAP4_SSL if self.mail_use_ssl else imaplib.IMAP4
+        mail = imap_class(self.imap_host, self.imap_port, timeout=self.imap_dependency.timeout)
+        try:
+            mail.login(self.email_account, self.email_password)
+            mail.select("inbox")
+        except Exception:
+            mail.shutdown()
+            raise
+        return mail
+
+    @staticmethod
+    def _close_imap(mail: imaplib.IMAP4) -> None:
+        """登出 IMAP 会话，登出失败（连接已断开等）时直接关闭套接字"""
+        try:
+            mail.logout()
+        except Exception:
+            try:
+                mail.shutdown()
+            except Exception:
+                pass
+
+    def _claim_email(self, email_id: str) -> bool:
+        """原子认领一封邮件（SET NX），未连接 Redis 时视为认领成功"""
+        if not self.redis_conn:
+            return True
+        return bool(self.redis_conn.set(
+            self._get_claim_key(email_id), self.worker_id, nx=True, ex=self.CLAIM_PENDING_SECONDS
+        ))
+
+    def _release_claim(self, email_id: str):
+        """读取失败时释放认领，允许下次重试"""
+        if self.redis_conn:
+            self.redis_conn.delete(self._get_claim_key(email_id))
         
-    def send_reply(self, initial_email: Email, reply_text: str):
+    def send_reply(self, initial_email: Email, reply_text: str, from_name: str = "AI Reply"):
         """
         发送回复邮件, 并更新状态为 AUTO_REPLIED
         """
+        with self._smtp_lock:
+            return self._send_with_session(initial_email, reply_text, from_name)
+
+    def send_replies(self, replies: List[Tuple[Email, str]], from_name: str = "AI Reply") -> List[Optional[dict]]:
+        """
+        批量发送回复邮件：所有邮件复用同一个 SMTP 会话，只登录一次
+        :param replies: (原始邮件, 回复内容) 列表
+        :return: 与 replies 一一对应的发送结果，失败的为 None
+        SMTP 熔断时不再抛出：已发送的结果照常返回，当前及之后的邮件均视为发送失败
+        """
+        results: List[Optional[dict]] = []
+        with self._smtp_lock:
+            for initial_email, reply_text in replies:
+                try:
+                    results.append(self._send_with_session(initial_email, reply_text, from_name))
+                except DependencyUnavailable as e:
+                    logger.warning("SMTP 熔断中，剩余 %d 封回复未发送: %s", len(replies) - len(results), e)
+                    break
+        return results + [None] * (len(replies) - len(results))
+
+    def close_smtp(self):
+        """关闭复用的 SMTP 会话"""
+        with self._smtp_lock:
+            self._reset_smtp_server()
+
+    def _get_smtp_server(self) -> smtplib.SMTP:
+        """
+        获取复用的 SMTP 会话，连接失效（服务端超时断开等）时重新登录
+        调用方需持有 _smtp_lock
+        """
+        if self._smtp_server is not None:
+            try:
+                if self._smtp_server.noop()[0] == 250:
+                    return self._smtp_server
+            except (smtplib.SMTPException, OSError):
+                pass
+            self._reset_smtp_server()
+
+        self._smtp_server = self.smtp_dependency.call(self._connect_smtp, errors=SMTP_ERRORS)
+        return self._smtp_server
+
+    def _connect_smtp(self) -> smtplib.SMTP:
+        smtp_class = smtplib.SMTP_SSL if self.mail_use_ssl else smtplib.SMTP
+        server = smtp_class(self.smtp_host, self.smtp_port, timeout=self.smtp_dependency.timeout)
+        try:
+            server.login(self.email_account, self.email_password)
+        except Exception:
+            server.close()
+            raise
+        return server
+
+    def _reset_smtp_server(self):
+        """丢弃当前 SMTP 会话"""
+        if self._smtp_server is None:
+            return
+        try:
+            self._smtp_server.quit()
+        except Exception:
+            pass
+        self._smtp_server = None
+
+    def _send_with_session(self, initial_email: Email, reply_text: str, from_name: str):
+        """
+        通过复用的 SMTP 会话发送一封回复，调用方需持有 _smtp_lock
+        """
         try:
             # 1. 校验原始邮件信息
             if not initial_email.id or not initial_email.sender:
-                print(f"{Fore.RED} 原始邮件信息不完整缺少id或sender {Style.RESET_ALL}")
+                logger.error("原始邮件信息不完整缺少id或sender")
                 return None
             
             # 2. 创建回复邮件
             reply_msg = self._create_reply_message(initial_email, reply_text, send=True)
             # 优化发件人显示（如“自动回复 <xxx@qq.com>”）
-            reply_msg["From"] = f'"AI Reply" <{self.email_account}>'
-
-            server = smtplib.SMTP_SSL(self.smtp_host, self.smtp_port)
-            
-            server.login(self.email_account, self.email_password)
-            server.sendmail(self.email_account, initial_email.sender, reply_msg.as_string())
-            server.quit()
+            reply_msg["From"] = f'"{from_name}" <{self.email_account}>'
+
+            # 3. 发送（会话异常断开时丢弃，下次重新登录）；发送不是幂等操作，不自动重试
+            server = self._get_smtp_server()
+            try:
+                self.smtp_dependency.call(
+                    server.sendmail, self.email_account, initial_email.sender, reply_msg.as_string(),
+                    idempotent=False, errors=SMTP_ERRORS,
+                )
+            except SMTP_ERRORS:
+                self._reset_smtp_server()
+                raise
 
             # 4. 发送成功：更新状态为 AUTO_REPLIED
             extra_data = {
@@ -170,9 +309,12 @@ class QQMailTools:
                 "original_email_id": initial_email.id,
                 "reply_message_id": reply_msg["Message-ID"]
             }
+        except DependencyUnavailable:
+            # SMTP 熔断中：单封发送（send_reply）交给调用方转人工处理，批量发送由 send_replies 处理
+            raise
         except Exception as e:
             error_msg = f"发送失败：{str(e)}"
-            print(f"{Fore.RED}❌ {error_msg} | 原始邮件ID：{initial_email.id}{Style.RESET_ALL}")
+            logger.error("%s | 原始邮件ID：%s", error_msg, initial_email.id)
             return None
         
     def update_email_category(self, email_id: str, category: str):
@@ -183,13 +325,13 @@ class QQMailTools:
         """
         # 1. 校验参数
         if not self.redis_conn or not email_id or not category:
-            print("❌ 缺少必要参数（Redis未连接/邮件ID/分类结果）")
+            logger.error("缺少必要参数（Redis未连接/邮件ID/分类结果）")
             return False
 
         # 2. 检查邮件是否存在于Redis
         redis_key = self._get_redis_key(email_id)
         if not self.redis_conn.exists(redis_key):
-            print(f"❌ 邮件{email_id}不存在于Redis")
+            logger.error("邮件%s不存在于Redis", email_id)
             return False
 
         # 3. 获取邮件基础信息
@@ -208,20 +350,51 @@ class QQMailTools:
         self._update_email_status(email_info, status=EmailStatus.CATEGORIZED, extra_data=extra_data)
         return True
 
-    def update_manual_status(self, email_id: str, is_replied: bool, operator: str, reply_note: str = ""):
+    def mark_email_drafted(self, email_id: str, trials: int):
+        """
+        回复草稿生成后，更新状态为「DRAFTED」（待校对/发送）
+        :param trials: 第几次生成草稿
+        """
+        if not self.redis_conn or not email_id:
+            logger.error("缺少必要参数（Redis未连接/邮件ID）")
+            return False
+
+        redis_key = self._get_redis_key(email_id)
+        if not self.redis_conn.exists(redis_key):
+            logger.error("邮件%s不存在于Redis", email_id)
+            return False
+
+        email_info = {
+            "id": email_id,
+            "thread_id": self.redis_conn.hget(redis_key, "thread_id"),
+            "sender": self.redis_conn.hget(redis_key, "sender"),
+            "subject": self.redis_conn.hget(redis_key, "subject")
+        }
+
+        extra_data = {
+            "draft_trials": trials,
+            "draft_time": datetime.now().isoformat(),
+        }
+        self._update_email_status(email_info, status=EmailStatus.DRAFTED, extra_data=extra_data)
+        return True
+
+    def update_manual_status(self, email_id: str, is_replied: bool, operator: str, reply_note: str = "", pipeline=None,
+                             reply_message_id: str = ""):
         """
         更新人工处理状态：MANUAL_PENDING（待人工）或 MANUAL_REPLIED（已人工回复）
         :param is_replied: True=已回复，False=待处理
         :param operator: 操作人（必须填用户名，如"admin"）
         :param reply_note: 人工处理备注（可选）
+        :param reply_message_id: 人工回复邮件的 Message-ID（可选）
+        :param pipeline: Redis pipeline（可选），传入时只排队写命令，由调用方统一 execute
         """
         if not self.redis_conn or not email_id or not operator:
-            print("❌ 缺少必要参数（Redis未连接/邮件ID/操作人）")
+            logger.error("缺少必要参数（Redis未连接/邮件ID/操作人）")
             return False
 
         redis_key = self._get_redis_key(email_id)
         if not self.redis_conn.exists(redis_key):
-            print(f"❌ 邮件{email_id}不存在于Redis")
+            logger.error("邮件%s不存在于Redis", email_id)
             return False
 
         # 1. 确定目标状态
@@ -240,9 +413,11 @@ class QQMailTools:
             "manual_note": reply_note,
             "updated_by": operator
         }
+        if reply_message_id:
+            extra_data["reply_message_id"] = reply_message_id
 
         # 4. 更新状态
-        self._update_email_status(email_info, status=target_status, extra_data=extra_data)
+        self._update_email_status(email_info, status=target_status, extra_data=extra_data, pipeline=pipeline)
         return True
 
     def mark_email_ignored(self, email_id: str, reason: str, operator: str = "system"):
@@ -251,12 +426,12 @@ class QQMailTools:
         :param reason: 忽略原因（如"spam"垃圾邮件、"duplicate"重复邮件）
         """
         if not self.redis_conn or not email_id or not reason:
-            print("❌ 缺少必要参数(Redis未连接/邮件ID/忽略原因）")
+            logger.error("缺少必要参数(Redis未连接/邮件ID/忽略原因）")
             return False
 
         redis_key = self._get_redis_key(email_id)
         if not self.redis_conn.exists(redis_key):
-            print(f"❌ 邮件{email_id}不存在于Redis")
+            logger.error("邮件%s不存在于Redis", email_id)
             return False
 
         email_info = {
@@ -275,6 +450,31 @@ class QQMailTools:
         self._update_email_status(email_info, status=EmailStatus.IGNORED, extra_data=extra_data)
         return True
 
+    def update_email_stage(self, email_id: str, stage: str):
+        """
+        记录邮件当前所处的流程节点（图执行中每完成一个节点更新一次）
+        """
+        if not self.redis_conn or not email_id:
+            return False
+        redis_key = self._get_redis_key(email_id)
+        self.redis_conn.hset(redis_key, mapping={
+            "stage": stage,
+            "updated_at": datetime.now().isoformat(),
+        })
+        return True
+
+    def get_email_statuses(self, email_ids: List[str]) -> Dict[str, dict]:
+        """
+        一个 Redis pipeline 内批量读取邮件状态记录
+        :return: email_id → 状态 hash（不存在的邮件不返回），未连接 Redis 时返回空字典
+        """
+        if not self.redis_conn or not email_ids:
+            return {}
+        pipe = self.redis_conn.pipeline()
+        for email_id in email_ids:
+            pipe.hgetall(self._get_redis_key(email_id))
+        return {email_id: data for email_id, data in zip(email_ids, pipe.execute()) if data}
+
     def _create_reply_message(self, initial_email: Email, reply_text: str, send=False):
         """
         构造 HTML 回复邮件
@@ -301,51 +501,34 @@ class QQMailTools:
         msg.attach(MIMEText(html_content, "html", "utf-8"))
         return msg
 
-    def _get_email_body(self, msg):
-        """
-        提取正文（优先 text/plain，其次 text/html）
-        """
-        body = ""
-        if msg.is_multipart():
-            for part in msg.walk():
-                content_type = part.get_content_type()
-                if content_type == "text/plain":
-                    body = part.get_payload(decode=True).decode("utf-8", errors="ignore")
-                    break
-                elif content_type == "text/html":
-                    body = part.get_payload(decode=True).decode("utf-8", errors="ignore")
-        else:
-            body = msg.get_payload(decode=True).decode("utf-8", errors="ignore")
-
-        return self._clean_body_text(body)
-
-    def _clean_body_text(self, text):
-        """
-        清理正文文本
-        """
-        return re.sub(r"\s+", " ", text).strip()
-
     def _get_redis_key(self, email_id: str) -> str:
         """
         生成 Redis 键名
         """
         return f"qqmail:email:status:{email_id}"
+
+    def _get_claim_key(self, email_id: str) -> str:
+        """
+        邮件认领标记的 Redis 键名
+        """
+        return f"qqmail:email:claim:{email_id}"
     
 
-    def _update_email_status(self, email_info: dict, status: EmailStatus, extra_data: dict = None):
+    def _update_email_status(self, email_info: dict, status: EmailStatus, extra_data: dict = None, pipeline=None):
         """
         更新邮件状态
         :param email_info: 邮件基础信息 含id、sender等
         :param status: 目标状态 EmailStatus枚举值
         :param extra_data: 额外数据（如分类结果、人工备注，可选）        
+        :param pipeline: Redis pipeline（可选），传入时由调用方负责 execute
         """
         if not self.redis_conn or not email_info.get("id"):
-            print(f"{Fore.YELLOW}⚠️ Redis未连接或邮件信息不完整，跳过状态更新{Style.RESET_ALL}")
+            logger.warning("Redis未连接或邮件信息不完整，跳过状态更新")
             return
                 
         base_data = {
             "email_id": email_info["id"],
-            "thread_id": email_info.get("threadId", ""),
+            "thread_id": email_info.get("threadId") or email_info.get("thread_id") or "",
             "sender": email_info.get("sender", "Unknown"),
             "subject": email_info.get("subject", "No Subject"),
             "status": status.status_value,  # 存储枚举的状态值（如"unprocessed"）
@@ -358,10 +541,13 @@ class QQMailTools:
             base_data.update(extra_data)
 
         redis_key = self._get_redis_key(email_info["id"])
-        self.redis_conn.hset(redis_key, mapping=base_data)
-        self.redis_conn.expire(redis_key, 60 * 60 * 24 * 30)  # 30天过期
+        pipe = pipeline if pipeline is not None else self.redis_conn.pipeline()
+        pipe.hset(redis_key, mapping=base_data)
+        pipe.expire(redis_key, 60 * 60 * 24 * 30)  # 30天过期
+        if pipeline is None:
+            pipe.execute()
 
-        print(f"{Fore.GREEN} 📧 邮件状态更新 | ID: {email_info['id']} | 状态：{status.name}({status.desc}) {Style.RESET_ALL}")
+        logger.info("邮件状态更新 | ID: %s | 状态：%s(%s)", email_info["id"], status.name, status.desc)
 
 
 
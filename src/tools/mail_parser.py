@@ -0,0 +1,265 @@
+import re
+import uuid
+import email
+from concurrent.futures import Future, ProcessPoolExecutor, as_completed
+from datetime import datetime
+from email.header import decode_header
+from html.parser import HTMLParser
+from typing import Dict, Iterable, Iterator, List, Optional, Tuple
+
+from src.utils.tokens import count_tokens, truncate_to_tokens
+
+_TAG_RE = re.compile(r"<[^>]+>")
+_INLINE_SPACE_RE = re.compile(r"[ \t\f\v\u200b]+")
+_BLANK_LINES_RE = re.compile(r"\n{3,}")
+_QUOTE_HEADER_RE = re.compile(
+    r"^(-{2,}\s*(原始邮件|Original Message|Forwarded message|转发邮件)\s*-{2,}"
+    r"|On .+wrote:$|在 .+写道[:：]$|.{0,40}于.+写道[:：]$)",
+    re.IGNORECASE,
+)
+# Outlook / Foxmail 等客户端的引用头：「From:/发件人:」行之后紧跟「Sent:/发送时间:」行
+_FORWARD_FROM_RE = re.compile(r"^\*?(From|发件人)\s*[:：]", re.IGNORECASE)
+_FORWARD_SENT_RE = re.compile(r"^\*?(Sent|Date|发送时间|日期)\s*[:：]", re.IGNORECASE)
+# 引用行：「> 」「>>」或单独的「>」；「>100元」这类以大于号开头的正文不算
+_QUOTE_LINE_RE = re.compile(r"^>(\s|>|$)")
+# 预过滤（自动回复、退信、群发邮件）需要的邮件头，其余邮件头不保留
+PREFILTER_HEADERS = (
+    "Auto-Submitted", "Precedence", "List-Unsubscribe", "List-Id", "Return-Path",
+    "X-Autoreply", "X-Autorespond", "X-Auto-Response-Suppress", "Content-Type",
+)
+_SIGNATURE_RE = re.compile(r"^(-- ?$|__+\s*$|发自我的|Sent from my )", re.IGNORECASE)
+
+
+def parse_email(email_id: str, raw: bytes, token_budget: int = 0) -> Dict:
+    """
+    解析一封 RFC822 原始邮件，返回与 Email 字段一致的紧凑字典（不含原始字节与附件）
+    模块级函数，可直接提交到进程池
+    :param token_budget: 正文 token 上限，0 表示不截断
+    """
+    msg = email.message_from_bytes(raw)
+
+    # 解析发件人、Message-ID、对话线程ID
+    message_id = msg.get("Message-ID", f"<{uuid.uuid4()}@qq.com>")
+    body, raw_tokens, body_tokens = normalize_body(*get_email_body(msg), token_budget=token_budget)
+    return {
+        "id": email_id,
+        "threadId": msg.get("In-Reply-To", message_id),
+        "messageId": message_id,
+        "references": msg.get("References", "").strip(),
+        "sender": msg.get("From", "Unknown"),
+        "subject": decode_header_value(msg.get("Subject", "")),
+        "body": body,
+        "headers": {name: str(msg[name]) for name in PREFILTER_HEADERS if msg[name] is not None},
+        "body_tokens_raw": raw_tokens,  # 规范化前的正文 token 数
+        "body_tokens": body_tokens,
+        "fetch_time": datetime.now().isoformat()  # 读取时间
+    }
+
+
+def decode_header_value(value: str) -> str:
+    """
+    解析编码的邮件头（处理中文编码），多段编码逐段解码
+    """
+    chunks = []
+    for chunk, encoding in decode_header(value):
+        if isinstance(chunk, bytes):
+            try:
+                chunk = chunk.decode(encoding or "utf-8")
+            except (LookupError, UnicodeDecodeError):
+                chunk = chunk.decode("gb18030", errors="ignore")
+        chunks.append(chunk)
+    return "".join(chunks).strip()
+
+
+def get_email_body(msg) -> Tuple[str, bool]:
+    """
+    提取原始正文（优先 text/plain，其次 text/html），返回 (正文, 是否为 HTML)
+    """
+    plain, html = None, None
+    parts = msg.walk() if msg.is_multipart() else [msg]
+    for part in parts:
+        # 跳过附件
+        if part.get_content_disposition() == "attachment":
+            continue
+        content_type = part.get_content_type()
+        if content_type == "text/plain" and plain is None:
+            plain = decode_part(part)
+        elif content_type == "text/html" and html is None:
+            html = decode_part(part)
+    if plain and plain.strip():
+        return plain, False
+    return html or "", bool(html)
+
+
+def decode_part(part) -> str:
+    """
+    按邮件声明的 charset 解码，未声明或解码失败时依次尝试 utf-8、gb18030（兼容 gbk/gb2312）
+    """
+    payload = part.get_payload(decode=True)
+    if payload is None:
+        return ""
+    charsets = [part.get_content_charset(), "utf-8", "gb18030"]
+    for charset in filter(None, charsets):
+        try:
+            return payload.decode(charset)
+        except (LookupError, UnicodeDecodeError):
+            continue
+    return payload.decode("utf-8", errors="ignore")
+
+
+class _HTMLTextExtractor(HTMLParser):
+    """丢弃 script/style 等不可见内容和图片（跟踪像素），块级标签转换为换行"""
+    SKIP_TAGS = {"script", "style", "head", "title", "noscript", "template", "svg"}
+    BLOCK_TAGS = {"p", "div", "br", "tr", "li", "ul", "ol", "table", "h1", "h2", "h3", "h4", "h5", "h6",
+                  "blockquote", "section", "article", "header", "footer", "hr", "pre"}
+
+    def __init__(self):
+        super().__init__(convert_charrefs=True)
+        self._chunks: List[str] = []
+        self._skip_depth = 0
+
+    def handle_starttag(self, tag, attrs):
+        if tag in self.SKIP_TAGS:
+            self._skip_depth += 1
+        elif tag in self.BLOCK_TAGS:
+            self._chunks.append("\n")
+        elif tag == "td":
+            self._chunks.append(" ")
+
+    def handle_endtag(self, tag):
+        if tag in self.SKIP_TAGS:
+            self._skip_depth = max(0, self._skip_depth - 1)
+        elif tag in self.BLOCK_TAGS:
+            self._chunks.append("\n")
+
+    def handle_data(self, data):
+        if not self._skip_depth:
+            self._chunks.append(data)
+
+    def text(self) -> str:
+        return "".join(self._chunks)
+
+
+def html_to_text(html: str) -> str:
+    """HTML 正文转纯文本"""
+    extractor = _HTMLTextExtractor()
+    try:
+        extractor.feed(html)
+        extractor.close()
+    except Exception:
+        # 严重损坏的 HTML：退化为去标签
+        return _TAG_RE.sub(" ", html)
+    return extractor.text()
+
+
+def strip_quoted_text(text: str) -> str:
+    """
+    去掉引用的历史邮件与签名：
+    - 回复分隔行（QQ 邮箱「原始邮件」、Outlook「Original Message」、「On ... wrote:」等）之后的全部内容
+    - Outlook 式引用头（「From:/发件人:」后紧跟「Sent:/发送时间:」）之后的全部内容
+    - 正文末尾连续的「> 」引用块（正文中间的引用与「>100元」这类内容保留）
+    - 签名分隔符「-- 」及「发自我的iPhone」等客户端签名之后的内容
+    """
+    all_lines = text.splitlines()
+    lines = []
+    for index, line in enumerate(all_lines):
+        if _is_quote_header(all_lines, index) or _SIGNATURE_RE.match(line):
+            break
+        lines.append(line)
+    while lines and (not lines[-1].strip() or _QUOTE_LINE_RE.match(lines[-1].strip())):
+        lines.pop()
+    result = "\n".join(lines).strip()
+    # 整封邮件都是引用（如纯转发）时保留原文，避免正文为空
+    return result or text
+
+
+def _is_quote_header(lines: List[str], index: int) -> bool:
+    """第 index 行是否为引用历史邮件的开头"""
+    stripped = lines[index].strip()
+    if _QUOTE_HEADER_RE.match(stripped):
+        return True
+    following = [line.strip() for line in lines[index + 1:index + 4]]
+    # Gmail 较长的「On ... <地址>」会把「wrote:」折到下一行
+    if stripped.startswith("On ") and following and following[0].endswith("wrote:"):
+        return True
+    return bool(_FORWARD_FROM_RE.match(stripped)) and any(_FORWARD_SENT_RE.match(line) for line in following)
+
+
+def clean_body_text(text: str) -> str:
+    """
+    清理正文文本：行内空白合并为一个空格，保留段落（最多一个空行）
+    """
+    text = _INLINE_SPACE_RE.sub(" ", text.replace("\xa0", " "))
+    text = _BLANK_LINES_RE.sub("\n\n", "\n".join(line.strip() for line in text.splitlines()))
+    return text.strip()
+
+
+def normalize_body(body: str, is_html: bool = False, token_budget: int = 0) -> Tuple[str, int, int]:
+    """
+    正文规范化：HTML 转纯文本 → 去引用/签名 → 清理空白 → 按 token 预算截断
+    返回 (正文, 原始 token 数, 规范化后 token 数)
+    """
+    raw_tokens = count_tokens(body)
+    text = html_to_text(body) if is_html else body
+    text = clean_body_text(strip_quoted_text(text))
+    if token_budget > 0:
+        text = truncate_to_tokens(text, token_budget, marker="……（正文过长，已截断）")
+    return text, raw_tokens, count_tokens(text)
+
+
+class MailParser:
+    """
+    邮件解析阶段：MIME 解析与正文清理是 CPU 密集型操作，积压较多或 HTML 较重时会阻塞拉取线程
+    - max_workers > 0：原始邮件分发到进程池并行解析，按完成顺序返回
+    - max_workers == 0：在当前线程内逐封解析（邮件少时省去进程间传输开销）
+    进程池懒加载，首次使用时创建
+    """
+    def __init__(self, max_workers: int = 0, token_budget: int = 0):
+        """
+        params:
+            max_workers: 解析进程数，0 表示在当前线程内解析
+            token_budget: 正文 token 上限，超出时在段落/句子边界截断，0 表示不截断
+        """
+        self.max_workers = max_workers
+        self.token_budget = token_budget
+        self._executor: Optional[ProcessPoolExecutor] = None
+
+    def parse_many(self, raw_emails: Iterable[Tuple[str, bytes]]) -> Iterator[Tuple[str, Optional[Dict], Optional[Exception]]]:
+        """
+        解析一批原始邮件，逐封产出 (email_id, email_info, error)，解析失败时 email_info 为 None
+        raw_emails 可以是边下载边产出的生成器：每封下载完成即提交，下载与解析重叠进行
+        """
+        if self.max_workers <= 0:
+            for email_id, raw in raw_emails:
+                try:
+                    yield email_id, parse_email(email_id, raw, self.token_budget), None
+                except Exception as e:
+                    yield email_id, None, e
+            return
+
+        executor = self._get_executor()
+        pending: Dict[Future, str] = {}
+        for email_id, raw in raw_emails:
+            pending[executor.submit(parse_email, email_id, raw, self.token_budget)] = email_id
+            # 不必等全部下载完，已解析完成的邮件先产出
+            for future in [f for f in pending if f.done()]:
+                yield self._collect(future, pending.pop(future))
+        for future in as_completed(list(pending)):
+            yield self._collect(future, pending.pop(future))
+
+    def close(self) -> None:
+        if self._executor:
+            self._executor.shutdown(wait=True)
+            self._executor = None
+
+    @staticmethod
+    def _collect(future: Future, email_id: str) -> Tuple[str, Optional[Dict], Optional[Exception]]:
+        try:
+            return email_id, future.result(), None
+        except Exception as e:
+            return email_id, None, e
+
+    def _get_executor(self) -> ProcessPoolExecutor:
+        if self._executor is None:
+            self._executor = ProcessPoolExecutor(max_workers=self.max_workers)
+        return self._executor
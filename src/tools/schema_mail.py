@@ -1,12 +1,26 @@
-from pydantic import BaseModel, Field
+from dataclasses import MISSING, dataclass, field, fields
+from typing import Any, Dict
 
 
+@dataclass(frozen=True, slots=True)
+class Email:
+    """
+    单封邮件的紧凑只读记录（__slots__，无实例 __dict__）
+    批量加载的邮件会长期驻留在图状态中，保持小而不可变
+    """
+    id: str            # Unique identifier of the email
+    threadId: str      # Thread identifier of the email
+    messageId: str     # Message identifier of the email
+    references: str    # References of the email
+    sender: str        # Email address of the sender
+    subject: str       # Subject line of the email
+    body: str          # Body content of the email
+    headers: Dict[str, str] = field(default_factory=dict)  # 预过滤用的少量邮件头（Auto-Submitted、Precedence 等）
 
-class Email(BaseModel):
-    id: str = Field(..., description="Unique identifier of the email")
-    threadId: str = Field(..., description="Thread identifier of the email")
-    messageId: str = Field(..., description="Message identifier of the email")
-    references: str = Field(..., description="References of the email")
-    sender: str = Field(..., description="Email address of the sender")
-    subject: str = Field(..., description="Subject line of the email")
-    body: str = Field(..., description="Body content of the email")
\ No newline at end of file
+    @classmethod
+    def from_dict(cls, data: Dict[str, Any]) -> "Email":
+        """从 fetch_unanswered_emails 返回的字典构造，忽略多余字段（如 fetch_time）"""
+        return cls(**{
+            f.name: data[f.name] if f.name in data else ("" if f.default_factory is MISSING else f.default_factory())
+            for f in fields(cls)
+        })
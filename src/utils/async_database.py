@@ -0,0 +1,154 @@
+import asyncio
+import aiomysql
+from contextlib import asynccontextmanager
+from typing import Optional, Dict, List, Tuple
+
+from src.utils.metrics import observe_dependency
+from src.utils.log import get_logger
+
+logger = get_logger(__name__)
+
+
+class AsyncMySQLManager:
+    """
+    基于 aiomysql 的异步 MySQL 访问层，供 FastAPI 的 async 接口使用，
+    避免阻塞调用占满 Starlette 线程池
+    """
+    def __init__(
+        self,
+        host: str,
+        user: str,
+        port: int,
+        password: str = "",
+        db_name: str = "rag_hyde",
+        pool_minsize: int = 1,
+        pool_maxsize: int = 20,
+        connect_timeout: float = 5,
+        query_timeout: float = 10,
+    ):
+        """
+        params:
+            pool_minsize: 连接池最小连接数
+            pool_maxsize: 连接池最大连接数（按需增长到该上限）
+            connect_timeout: 建立连接超时时间（秒）
+            query_timeout: 单条SQL默认超时时间（秒）
+        """
+        self.host = host
+        self.user = user
+        self.port = port
+        self.password = password
+        self.db_name = db_name
+        self.pool_minsize = pool_minsize
+        self.pool_maxsize = pool_maxsize
+        self.connect_timeout = connect_timeout
+        self.query_timeout = query_timeout
+        self.pool: Optional[aiomysql.Pool] = None
+
+    async def init_pool(self) -> None:
+        """初始化异步连接池（需在事件循环中调用，如 FastAPI lifespan）"""
+        if self.pool:
+            return
+        try:
+            self.pool = await aiomysql.create_pool(
+                host=self.host,
+                port=self.port,
+                user=self.user,
+                password=self.password,
+                db=self.db_name,
+                minsize=self.pool_minsize,
+                maxsize=self.pool_maxsize,
+                connect_timeout=self.connect_timeout,
+                autocommit=False,
+                charset="utf8mb4",
+            )
+            logger.info("成功创建异步MySQL连接池 (大小: %s-%s)", self.pool_minsize, self.pool_maxsize)
+        except Exception as e:
+            logger.error("异步MySQL连接池创建失败: %s", e)
+            raise
+
+    async def execute_query(
+        self,
+        query: str,
+        params: Optional[Tuple] = None,
+        commit: bool = False,
+        dictionary: bool = False,
+        timeout: Optional[float] = None,
+    ) -> List[Dict] | None:
+        """
+        执行SQL查询，参数语义与 MySQLManager.execute_query 保持一致
+
+        Args:
+            query: SQL语句
+            params: 查询参数
+            commit: 是否需要提交事务
+            dictionary: 是否返回字典格式的结果
+            timeout: 超时时间（秒），默认使用 query_timeout
+
+        Returns:
+            查询结果（SELECT语句）或None（其他语句）
+        """
+        if not self.pool:
+            await self.init_pool()
+
+        cursor_class = aiomysql.DictCursor if dictionary else aiomysql.Cursor
+        async with self.pool.acquire() as conn:
+            try:
+                operation = query.split(None, 1)[0].upper() if query.strip() else "UNKNOWN"
+                with observe_dependency("mysql", operation):
+                    return await asyncio.wait_for(
+                        self._execute(conn, cursor_class, query, params, commit),
+                        timeout=timeout or self.query_timeout,
+                    )
+            except asyncio.TimeoutError:
+                # 超时的连接上可能还有未读完的结果，直接关闭，避免归还脏连接
+                conn.close()
+                logger.error("SQL执行超时 | Query: %s", query)
+                raise
+            except Exception as e:
+                logger.error("SQL执行失败: %s | Query: %s", e, query)
+                if commit and not conn.closed:
+                    await conn.rollback()
+                raise
+
+    async def _execute(self, conn, cursor_class, query: str, params: Optional[Tuple], commit: bool):
+        async with conn.cursor(cursor_class) as cursor:
+            await cursor.execute(query, params or ())
+            if commit:
+                await conn.commit()
+                return None
+            result = await cursor.fetchall()
+            # 只读查询也结束事务，避免 REPEATABLE READ 下读到旧快照
+            await conn.rollback()
+            return list(result)
+
+    @asynccontextmanager
+    async def transaction(self, dictionary: bool = False):
+        """
+        在同一个连接上执行多条语句，正常退出时统一提交，异常时回滚
+
+        用法:
+            async with async_db.transaction(dictionary=True) as cursor:
+                await cursor.execute(...)
+        """
+        if not self.pool:
+            await self.init_pool()
+
+        cursor_class = aiomysql.DictCursor if dictionary else aiomysql.Cursor
+        async with self.pool.acquire() as conn:
+            try:
+                async with conn.cursor(cursor_class) as cursor:
+                    yield cursor
+                await conn.commit()
+            except BaseException as e:
+                logger.error("事务执行失败，已回滚: %s", e)
+                if not conn.closed:
+                    await conn.rollback()
+                raise
+
+    async def close_pool(self) -> None:
+        """关闭异步连接池"""
+        if self.pool:
+            self.pool.close()
+            await self.pool.wait_closed()
+            logger.info("异步MySQL连接池已关闭")
+            self.pool = None
@@ -0,0 +1,93 @@
+import asyncio
+import json
+from contextlib import asynccontextmanager
+from typing import Any, Dict, Optional, Set
+
+from src.utils.log import get_logger
+
+logger = get_logger(__name__)
+
+
+class TaskBroadcaster:
+    """
+    新人工任务推送广播器
+    - 进程内：每个 SSE 连接一个 asyncio.Queue，新任务扇出到所有队列
+    - 多副本：配置 Redis 时经 pub/sub 频道中转，所有 API 副本都能收到其他副本消费到的任务
+    """
+    def __init__(self, redis_conn=None, channel: str = "qqmail:manual_tasks", queue_size: int = 100):
+        """
+        params:
+            redis_conn: Redis 连接，为 None 时只在进程内广播
+            channel: Redis pub/sub 频道名
+            queue_size: 每个订阅者的缓冲上限，慢消费者会丢弃最旧的消息
+        """
+        self.redis_conn = redis_conn
+        self.channel = channel
+        self.queue_size = queue_size
+        self._subscribers: Set[asyncio.Queue] = set()
+        self._loop: Optional[asyncio.AbstractEventLoop] = None
+        self._pubsub = None
+        self._pubsub_thread = None
+
+    def start(self, loop: asyncio.AbstractEventLoop) -> None:
+        """绑定事件循环，并在配置 Redis 时启动订阅线程"""
+        self._loop = loop
+        if not self.redis_conn:
+            return
+        try:
+            self._pubsub = self.redis_conn.pubsub(ignore_subscribe_messages=True)
+            self._pubsub.subscribe(**{self.channel: self._on_redis_message})
+            self._pubsub_thread = self._pubsub.run_in_thread(sleep_time=1, daemon=True)
+            logger.info("已订阅任务推送频道: %s", self.channel)
+        except Exception as e:
+            logger.warning("订阅任务推送频道失败，仅进程内广播: %s", e)
+            self._pubsub = None
+
+    def stop(self) -> None:
+        """停止订阅线程"""
+        if self._pubsub_thread:
+            self._pubsub_thread.stop()
+            self._pubsub_thread = None
+        if self._pubsub:
+            self._pubsub.close()
+            self._pubsub = None
+
+    def publish(self, task: Dict[str, Any]) -> None:
+        """
+        发布新任务，可在任意线程调用（如 MQ 消费线程）
+        """
+        data = json.dumps(task, ensure_ascii=False, default=str)
+        if self._pubsub:
+            try:
+                self.redis_conn.publish(self.channel, data)
+                return
+            except Exception as e:
+                logger.warning("Redis 发布任务失败，退化为进程内广播: %s", e)
+        self._fanout_threadsafe(data)
+
+    @asynccontextmanager
+    async def subscribe(self):
+        """订阅新任务，退出上下文时自动取消订阅"""
+        queue = asyncio.Queue(maxsize=self.queue_size)
+        self._subscribers.add(queue)
+        try:
+            yield queue
+        finally:
+            self._subscribers.discard(queue)
+
+    @property
+    def subscriber_count(self) -> int:
+        return len(self._subscribers)
+
+    def _on_redis_message(self, message) -> None:
+        self._fanout_threadsafe(message["data"])
+
+    def _fanout_threadsafe(self, data: str) -> None:
+        if self._loop and not self._loop.is_closed():
+            self._loop.call_soon_threadsafe(self._fanout, data)
+
+    def _fanout(self, data: str) -> None:
+        for queue in list(self._subscribers):
+            if queue.full():
+                queue.get_nowait()
+            queue.put_nowait(data)
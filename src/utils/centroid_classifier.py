@@ -0,0 +1,95 @@
+import json
+import math
+import threading
+import time
+from typing import Dict, List, Optional, Sequence, Tuple
+
+from src.utils.log import get_logger
+
+logger = get_logger(__name__)
+
+
+class CentroidClassifier:
+    """
+    基于邮件正文 embedding 的质心分类器（第一层路由）
+    - 样本：LLM 分类结果及对应的正文向量，每个类别在 Redis 中保留最近 max_samples 条
+    - 预测：与各类别质心的余弦相似度经 softmax 得到置信度
+    - 只有所有类别都积累了 min_samples 条样本后才启用，避免样本缺失的类别永远不会被预测到
+    质心在进程内缓存，每 refresh_seconds 从 Redis 重新计算一次
+    """
+    SAMPLES_PREFIX = "qqmail:centroid:samples:"
+
+    def __init__(
+        self,
+        redis_conn,
+        labels: Sequence[str],
+        max_samples: int = 200,
+        min_samples: int = 20,
+        temperature: float = 0.05,
+        refresh_seconds: float = 300,
+    ):
+        """
+        params:
+            labels: 全部类别
+            temperature: softmax 温度，越小置信度越集中于最相似的类别
+        """
+        self.redis_conn = redis_conn
+        self.labels = list(labels)
+        self.max_samples = max_samples
+        self.min_samples = min_samples
+        self.temperature = temperature
+        self.refresh_seconds = refresh_seconds
+        self._centroids: Dict[str, List[float]] = {}
+        self._refreshed_at = 0.0
+        self._lock = threading.Lock()
+
+    def add_sample(self, label: str, embedding: Sequence[float]) -> None:
+        if not self.redis_conn or label not in self.labels:
+            return
+        key = f"{self.SAMPLES_PREFIX}{label}"
+        pipe = self.redis_conn.pipeline()
+        pipe.lpush(key, json.dumps([round(v, 5) for v in embedding]))
+        pipe.ltrim(key, 0, self.max_samples - 1)
+        pipe.execute()
+
+    def predict(self, embedding: Sequence[float]) -> Optional[Tuple[str, float]]:
+        """返回 (类别, 置信度)，样本不足未启用时返回 None"""
+        centroids = self._get_centroids()
+        if not centroids:
+            return None
+        query = _normalize(embedding)
+        sims = {label: sum(a * b for a, b in zip(query, centroid)) for label, centroid in centroids.items()}
+        top = max(sims.values())
+        exp = {label: math.exp((sim - top) / self.temperature) for label, sim in sims.items()}
+        total = sum(exp.values())
+        label = max(exp, key=exp.get)
+        return label, exp[label] / total
+
+    def _get_centroids(self) -> Dict[str, List[float]]:
+        with self._lock:
+            if time.monotonic() - self._refreshed_at >= self.refresh_seconds:
+                self._refreshed_at = time.monotonic()
+                try:
+                    self._centroids = self._compute_centroids()
+                except Exception as e:
+                    logger.warning("计算分类质心失败: %s", e)
+            return self._centroids
+
+    def _compute_centroids(self) -> Dict[str, List[float]]:
+        if not self.redis_conn:
+            return {}
+        pipe = self.redis_conn.pipeline()
+        for label in self.labels:
+            pipe.lrange(f"{self.SAMPLES_PREFIX}{label}", 0, -1)
+        centroids = {}
+        for label, samples in zip(self.labels, pipe.execute()):
+            if len(samples) < self.min_samples:
+                return {}
+            vectors = [_normalize(json.loads(sample)) for sample in samples]
+            centroids[label] = _normalize([sum(values) / len(vectors) for values in zip(*vectors)])
+        return centroids
+
+
+def _normalize(vector: Sequence[float]) -> List[float]:
+    norm = math.sqrt(sum(v * v for v in vector)) or 1.0
+    return [v / norm for v in vector]
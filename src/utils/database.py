@@ -1,8 +1,231 @@
+import time
+import threading
 import mysql.connector
-from mysql.connector import pooling
+from collections import OrderedDict, deque
+from contextlib import contextmanager
 from mysql.connector.connection import MySQLConnection
 from mysql.connector.cursor import MySQLCursor
-from typing import Optional, Dict, List, Tuple
+from mysql.connector.errors import PoolError
+from typing import Optional, Dict, List, Tuple, Sequence, Iterator
+
+from src.utils.metrics import observe_dependency
+from src.utils.log import get_logger
+
+logger = get_logger(__name__)
+
+# manual_email_tasks 建表后新增的列（列名 → 定义），启动时对已有表补齐
+MANUAL_TASK_ADDED_COLUMNS = {
+    "message_id": "VARCHAR(255)",   # 原始邮件的 Message-ID，人工回复的 In-Reply-To
+    "sending_at": "DATETIME",       # 标记为 sending 的时间，用于回收卡住的任务
+}
+
+
+def _operation(query: str) -> str:
+    """SQL 语句类型（SELECT / INSERT ...），作为耗时指标的标签"""
+    words = query.split(None, 1)
+    return words[0].upper() if words else "UNKNOWN"
+
+
+class _PooledConnection:
+    """连接池中的一个物理连接，附带预编译语句缓存"""
+    __slots__ = ("conn", "last_used", "statements")
+
+    def __init__(self, conn: MySQLConnection):
+        self.conn = conn
+        self.last_used = time.monotonic()
+        # SQL -> 预编译游标，同一连接上同一语句只在服务端 prepare 一次
+        self.statements: "OrderedDict[str, MySQLCursor]" = OrderedDict()
+
+
+class ConnectionPool:
+    """
+    按需增长的连接池
+    - 初始创建 pool_size 个连接，不够用时按需新建，直到 max_pool_size
+    - 达到上限时等待 checkout_timeout 秒，仍无空闲连接才抛出 PoolError
+    - 取出时对空闲超过 ping_interval 秒的连接做一次 ping，失效则重建
+    """
+    def __init__(
+        self,
+        pool_size: int,
+        max_pool_size: int,
+        checkout_timeout: float,
+        ping_interval: float,
+        **connect_kwargs
+    ):
+        self.pool_size = pool_size
+        self.max_pool_size = max(pool_size, max_pool_size)
+        self.checkout_timeout = checkout_timeout
+        self.ping_interval = ping_interval
+        self.connect_kwargs = connect_kwargs
+
+        self._idle: deque = deque()
+        self._cond = threading.Condition()
+        self._created = 0
+        self._in_use = 0
+        # 统计信息
+        self._checkouts = 0
+        self._checkout_failures = 0
+        self._reconnects = 0
+        self._total_wait = 0.0
+        self._max_wait = 0.0
+
+        for _ in range(pool_size):
+            self._idle.append(self._connect())
+            self._created += 1
+
+    def _connect(self) -> _PooledConnection:
+        return _PooledConnection(mysql.connector.connect(**self.connect_kwargs))
+
+    def checkout(self) -> _PooledConnection:
+        """取出一个可用连接"""
+        start = time.monotonic()
+        deadline = start + self.checkout_timeout
+        entry = None
+        with self._cond:
+            while True:
+                if self._idle:
+                    entry = self._idle.pop()
+                    break
+                if self._created < self.max_pool_size:
+                    self._created += 1
+                    break
+                remaining = deadline - time.monotonic()
+                if remaining <= 0:
+                    self._checkout_failures += 1
+                    raise PoolError(f"连接池已耗尽（上限 {self.max_pool_size}），等待 {self.checkout_timeout}s 超时")
+                self._cond.wait(remaining)
+            self._in_use += 1
+
+        try:
+            if entry is None:
+                entry = self._connect()
+            elif time.monotonic() - entry.last_used > self.ping_interval:
+                entry = self._validate(entry)
+        except Exception:
+            with self._cond:
+                self._in_use -= 1
+                self._created -= 1
+                self._checkout_failures += 1
+                self._cond.notify()
+            raise
+
+        waited = time.monotonic() - start
+        with self._cond:
+            self._checkouts += 1
+            self._total_wait += waited
+            self._max_wait = max(self._max_wait, waited)
+        return entry
+
+    def _validate(self, entry: _PooledConnection) -> _PooledConnection:
+        """轻量存活检查：ping 失败（如超过 wait_timeout 被服务端断开）则重建连接"""
+        try:
+            entry.conn.ping(reconnect=False)
+            return entry
+        except Exception:
+            self._close_quietly(entry)
+            with self._cond:
+                self._reconnects += 1
+            return self._connect()
+
+    def release(self, entry: _PooledConnection, discard: bool = False) -> None:
+        """归还连接；未结束的事务会被回滚，discard=True 时直接关闭"""
+        if not discard:
+            try:
+                if entry.conn.in_transaction:
+                    entry.conn.rollback()
+            except Exception:
+                discard = True
+
+        with self._cond:
+            self._in_use -= 1
+            if discard:
+                self._created -= 1
+            else:
+                entry.last_used = time.monotonic()
+                self._idle.append(entry)
+            self._cond.notify()
+        if discard:
+            self._close_quietly(entry)
+
+    def close(self) -> None:
+        """关闭所有空闲连接（使用中的连接归还时仍会放回池中）"""
+        with self._cond:
+            idle = list(self._idle)
+            self._idle.clear()
+            self._created -= len(idle)
+        for entry in idle:
+            self._close_quietly(entry)
+
+    def stats(self) -> Dict:
+        """连接池统计信息"""
+        with self._cond:
+            return {
+                "size": self._created,
+                "max_size": self.max_pool_size,
+                "in_use": self._in_use,
+                "idle": len(self._idle),
+                "checkouts": self._checkouts,
+                "checkout_failures": self._checkout_failures,
+                "reconnects": self._reconnects,
+                "avg_wait_ms": round(self._total_wait / self._checkouts * 1000, 3) if self._checkouts else 0.0,
+                "max_wait_ms": round(self._max_wait * 1000, 3),
+            }
+
+    @staticmethod
+    def _close_quietly(entry: _PooledConnection) -> None:
+        for cursor in entry.statements.values():
+            try:
+                cursor.close()
+            except Exception:
+                pass
+        entry.statements.clear()
+        try:
+            entry.conn.close()
+        except Exception:
+            pass
+
+
+class MySQLTransaction:
+    """transaction() 上下文中的执行器：同一连接执行多条语句"""
+    def __init__(self, manager: "MySQLManager", entry: _PooledConnection, dictionary: bool):
+        self._manager = manager
+        self._entry = entry
+        self._dictionary = dictionary
+        # 缓冲游标：允许同一事务内连续执行多条语句而不必先读完结果
+        self._cursor = entry.conn.cursor(buffered=True, dictionary=dictionary)
+        self._rowcount = -1
+
+    def execute(self, query: str, params: Optional[Tuple] = None, prepared: bool = False) -> List | None:
+        """执行一条语句，有结果集时返回全部行，否则返回None"""
+        with observe_dependency("mysql", _operation(query)):
+            if prepared:
+                rows = self._manager._run_prepared(self._entry, query, params, self._dictionary)
+                cursor = self._entry.statements.get(query)
+                self._rowcount = cursor.rowcount if cursor is not None else -1
+                return rows
+            self._cursor.execute(query, params or ())
+            self._rowcount = self._cursor.rowcount
+            return self._cursor.fetchall() if self._cursor.with_rows else None
+
+    def execute_many(self, query: str, seq_params: Sequence[Tuple]) -> int:
+        """批量执行同一条语句，返回受影响的行数"""
+        if not seq_params:
+            return 0
+        with observe_dependency("mysql", _operation(query)):
+            self._cursor.executemany(query, seq_params)
+        return self._cursor.rowcount
+
+    @property
+    def lastrowid(self) -> Optional[int]:
+        return self._cursor.lastrowid
+
+    @property
+    def rowcount(self) -> int:
+        """最近一条 execute 语句影响的行数（INSERT ... ON DUPLICATE KEY UPDATE 新插入为 1，未改动的已有行为 0）"""
+        return self._rowcount
+
+    def close(self) -> None:
+        self._cursor.close()
 
 
 class MySQLManager:
@@ -15,8 +238,19 @@ class MySQLManager:
         db_name: str = "rag_hyde",
         pool_name: str = "mysql_pool",
         pool_size: int = 5,
-        pool_reset_session: bool = True
+        max_pool_size: int = 20,
+        checkout_timeout: float = 5,
+        ping_interval: float = 30,
+        statement_cache_size: int = 32,
     ):
+        """
+        params:
+            pool_size: 初始连接数
+            max_pool_size: 按需增长的连接数上限
+            checkout_timeout: 连接池耗尽时等待空闲连接的最长时间（秒）
+            ping_interval: 连接空闲超过该秒数后，取出时先 ping 检查存活
+            statement_cache_size: 每个连接缓存的预编译语句数量
+        """
         self.host = host
         self.user = user
         self.port = port
@@ -24,38 +258,61 @@ class MySQLManager:
         self.db_name = db_name
         self.pool_name = pool_name
         self.pool_size = pool_size
-        self.pool_reset_session = pool_reset_session
-        self.pool: Optional[pooling.MySQLConnectionPool] = None
+        self.max_pool_size = max_pool_size
+        self.checkout_timeout = checkout_timeout
+        self.ping_interval = ping_interval
+        self.statement_cache_size = statement_cache_size
+        self.pool: Optional[ConnectionPool] = None
         self._init_pool()  # 初始化连接池
         self._init_tables()  # 确保表结构存在
 
     def _init_pool(self) -> None:
         """初始化数据库连接池"""
         try:
-            self.pool = pooling.MySQLConnectionPool(
-                pool_name=self.pool_name,
+            self.pool = ConnectionPool(
                 pool_size=self.pool_size,
-                pool_reset_session=self.pool_reset_session,
+                max_pool_size=self.max_pool_size,
+                checkout_timeout=self.checkout_timeout,
+                ping_interval=self.ping_interval,
                 host=self.host,
                 user=self.user,
                 port=self.port,
                 password=self.password,
                 database=self.db_name,
             )
-            print(f"成功创建MySQL连接池: {self.pool_name} (大小: {self.pool_size})")
+            logger.info("成功创建MySQL连接池: %s (大小: %s-%s)", self.pool_name, self.pool_size, self.max_pool_size)
         except Exception as e:
-            print(f"MySQL连接池创建失败: {str(e)}")
+            logger.error("MySQL连接池创建失败: %s", e)
             raise
 
-    def get_connection(self) -> MySQLConnection:
-        """从连接池获取连接"""
+    def _checkout(self) -> _PooledConnection:
         if not self.pool:
             self._init_pool()
-        return self.pool.get_connection()
+        return self.pool.checkout()
+
+    def _release(self, entry: _PooledConnection, discard: bool = False) -> None:
+        if self.pool:
+            self.pool.release(entry, discard=discard)
+        else:
+            ConnectionPool._close_quietly(entry)
+
+    @contextmanager
+    def connection(self) -> Iterator[MySQLConnection]:
+        """从连接池借出一个连接，退出上下文时归还"""
+        entry = self._checkout()
+        try:
+            yield entry.conn
+        finally:
+            self._release(entry)
+
+    def pool_stats(self) -> Dict:
+        """连接池统计：连接数、使用中数量、等待时间、取连接失败次数等"""
+        return self.pool.stats() if self.pool else {}
 
     def _init_tables(self) -> None:
         """初始化数据库表结构（使用连接池中的连接）"""
-        conn = self.get_connection()
+        entry = self._checkout()
+        conn = entry.conn
         try:
             cursor = conn.cursor()
             
@@ -88,11 +345,13 @@ class MySQLManager:
                 id INT AUTO_INCREMENT PRIMARY KEY,
                 email_id VARCHAR(100) UNIQUE NOT NULL,
                 thread_id VARCHAR(100),
+                message_id VARCHAR(255),
                 sender VARCHAR(255) NOT NULL,
                 subject VARCHAR(255) NOT NULL,
                 body TEXT NOT NULL,
                 category VARCHAR(50),
                 status VARCHAR(20) DEFAULT 'pending',
+                sending_at DATETIME,
                 created_at DATETIME NOT NULL,
                 processed_at DATETIME,
                 operator VARCHAR(100),
@@ -101,26 +360,33 @@ class MySQLManager:
                 remark TEXT
             )
             """)
+
+            # 旧版本创建的 manual_email_tasks 补齐新增列
+            cursor.execute("""
+            SELECT COLUMN_NAME FROM information_schema.COLUMNS
+            WHERE TABLE_SCHEMA = DATABASE() AND TABLE_NAME = 'manual_email_tasks'
+            """)
+            existing = {row[0] for row in cursor.fetchall()}
+            for column, definition in MANUAL_TASK_ADDED_COLUMNS.items():
+                if column not in existing:
+                    cursor.execute(f"ALTER TABLE manual_email_tasks ADD COLUMN {column} {definition}")
             
             conn.commit()
             cursor.close()
         except Exception as e:
             conn.rollback()
-            print(f"表结构初始化失败: {str(e)}")
+            logger.error("表结构初始化失败: %s", e)
             raise
         finally:
-            conn.close()  # 归还连接到池
-
-    def get_cursor(self, conn: MySQLConnection, dictionary: bool = False) -> MySQLCursor:
-        """基于指定连接获取游标"""
-        return conn.cursor(dictionary=dictionary)
+            self._release(entry)  # 归还连接到池
 
     def execute_query(
         self,
         query: str,
         params: Optional[Tuple] = None,
         commit: bool = False,
-        dictionary: bool = False
+        dictionary: bool = False,
+        prepared: bool = False
     ) -> List[Dict] | None:
         """
         执行SQL查询（使用连接池管理连接）
@@ -130,35 +396,145 @@ class MySQLManager:
             params: 查询参数
             commit: 是否需要提交事务
             dictionary: 是否返回字典格式的结果
+            prepared: 是否使用服务端预编译语句（适合高频执行的固定语句）
             
         Returns:
             查询结果（SELECT语句）或None（其他语句）
         """
-        conn = self.get_connection()  # 从池获取连接
-        cursor = self.get_cursor(conn, dictionary=dictionary)
+        entry = self._checkout()  # 从池获取连接
+        conn = entry.conn
         try:
-            cursor.execute(query, params or ())
+            with observe_dependency("mysql", _operation(query)):
+                rows = self._execute(entry, query, params, dictionary, prepared)
             if commit:
                 conn.commit()
                 return None
-            return cursor.fetchall()
+            return rows
         except Exception as e:
-            print(f"SQL执行失败: {str(e)} | Query: {query}")
+            logger.error("SQL执行失败: %s | Query: %s", e, query)
             if commit:
                 conn.rollback()
             raise
+        finally:
+            self._release(entry)  # 归还连接到池（关键！）
+
+    def _execute(self, entry: _PooledConnection, query: str, params: Optional[Tuple], dictionary: bool,
+                 prepared: bool) -> List | None:
+        if prepared:
+            return self._run_prepared(entry, query, params, dictionary)
+        cursor = entry.conn.cursor(dictionary=dictionary)
+        try:
+            cursor.execute(query, params or ())
+            return cursor.fetchall() if cursor.with_rows else None
         finally:
             cursor.close()
-            conn.close()  # 归还连接到池（关键！）
+
+    def _run_prepared(self, entry: _PooledConnection, query: str, params: Optional[Tuple], dictionary: bool) -> List | None:
+        """
+        使用该连接上缓存的预编译游标执行语句，首次执行时在服务端 prepare
+        """
+        cursor = entry.statements.get(query)
+        if cursor is None:
+            cursor = entry.conn.cursor(prepared=True)
+            entry.statements[query] = cursor
+            if len(entry.statements) > self.statement_cache_size:
+                _, evicted = entry.statements.popitem(last=False)
+                evicted.close()
+        else:
+            entry.statements.move_to_end(query)
+
+        cursor.execute(query, params or ())
+        if not cursor.with_rows:
+            return None
+        rows = cursor.fetchall()
+        if dictionary:
+            columns = cursor.column_names
+            return [dict(zip(columns, row)) for row in rows]
+        return rows
+
+    def execute_many(self, query: str, seq_params: Sequence[Tuple]) -> int:
+        """
+        批量执行同一条语句（一个连接、一次提交）
+        INSERT ... VALUES 语句会被驱动改写为多值插入，一次往返写入多行
+
+        Args:
+            query: SQL语句
+            seq_params: 参数序列，每个元素对应一行
+
+        Returns:
+            受影响的行数
+        """
+        if not seq_params:
+            return 0
+        with self.transaction() as tx:
+            return tx.execute_many(query, seq_params)
+
+    @contextmanager
+    def transaction(self, dictionary: bool = False) -> Iterator[MySQLTransaction]:
+        """
+        在同一个连接上执行多条语句，正常退出时统一提交，异常时回滚
+
+        用法:
+            with db.transaction() as tx:
+                tx.execute(...)
+                tx.execute_many(...)
+        """
+        entry = self._checkout()
+        tx = MySQLTransaction(self, entry, dictionary)
+        try:
+            yield tx
+            entry.conn.commit()
+        except Exception as e:
+            logger.error("事务执行失败，已回滚: %s", e)
+            entry.conn.rollback()
+            raise
+        finally:
+            tx.close()
+            self._release(entry)
+
+    def iter_query(
+        self,
+        query: str,
+        params: Optional[Tuple] = None,
+        dictionary: bool = False,
+        batch_size: int = 1000
+    ) -> Iterator[Dict | Tuple]:
+        """
+        流式读取大结果集：非缓冲游标按批 fetchmany，内存占用与结果集大小无关
+        迭代期间会一直占用一个连接，请尽快消费完
+
+        Args:
+            query: SQL语句
+            params: 查询参数
+            dictionary: 是否返回字典格式的结果
+            batch_size: 每批从服务端读取的行数
+        """
+        entry = self._checkout()
+        cursor = entry.conn.cursor(buffered=False, dictionary=dictionary)
+        exhausted = False
+        try:
+            cursor.execute(query, params or ())
+            while True:
+                rows = cursor.fetchmany(batch_size)
+                if not rows:
+                    exhausted = True
+                    break
+                yield from rows
+        finally:
+            try:
+                cursor.close()
+            except Exception:
+                exhausted = False
+            # 提前退出时连接上还有未读结果，直接丢弃连接，避免读完整个结果集
+            self._release(entry, discard=not exhausted)
 
     def close_pool(self) -> None:
         """关闭连接池"""
-        if self.pool:
-            # 注意：mysql-connector-python的连接池没有显式关闭方法
-            # 这里仅做标记，实际连接会在闲置超时后自动关闭
-            print(f"MySQL连接池 {self.pool_name} 已关闭")
+        if getattr(self, "pool", None):
+            self.pool.close()
+            logger.info("MySQL连接池 %s 已关闭", self.pool_name)
             self.pool = None
 
     def __del__(self):
         """对象销毁时关闭连接池"""
-        self.close_pool()
\ No newline at end of file
+        self.close_pool()
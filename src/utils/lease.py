@@ -0,0 +1,91 @@
+import threading
+from typing import Dict
+
+from src.utils.log import get_logger
+
+logger = get_logger(__name__)
+
+# 仅当租约仍属于自己时才续期/释放，避免误删其他 worker 抢到的租约
+_RENEW_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('pexpire', KEYS[1], ARGV[2])
+end
+return 0
+"""
+_RELEASE_SCRIPT = """
+if redis.call('get', KEYS[1]) == ARGV[1] then
+    return redis.call('del', KEYS[1])
+end
+return 0
+"""
+
+
+class LeaseManager:
+    """
+    基于 Redis 的分布式租约：SET NX PX 原子抢占 + 后台心跳续期
+    worker 崩溃后租约在 ttl 内自动过期，其他 worker 可以接手
+    """
+    def __init__(self, redis_conn, owner: str, ttl_ms: int = 60000, key_prefix: str = "qqmail:lease:"):
+        """
+        params:
+            owner: 租约持有者标识（如 hostname:pid），续期/释放时校验
+            ttl_ms: 租约有效期（毫秒），心跳每 ttl/3 续期一次
+        """
+        self.redis_conn = redis_conn
+        self.owner = owner
+        self.ttl_ms = ttl_ms
+        self.key_prefix = key_prefix
+        self._renew = redis_conn.register_script(_RENEW_SCRIPT)
+        self._release = redis_conn.register_script(_RELEASE_SCRIPT)
+        self._held: Dict[str, bool] = {}
+        self._lock = threading.Lock()
+        self._stop = threading.Event()
+        self._heartbeat = threading.Thread(target=self._heartbeat_loop, name="lease-heartbeat", daemon=True)
+        self._heartbeat.start()
+
+    def acquire(self, name: str) -> bool:
+        """尝试抢占租约，成功返回 True"""
+        if not self.redis_conn.set(self._key(name), self.owner, nx=True, px=self.ttl_ms):
+            return False
+        with self._lock:
+            self._held[name] = True
+        return True
+
+    def release(self, name: str) -> None:
+        """释放自己持有的租约"""
+        with self._lock:
+            self._held.pop(name, None)
+        try:
+            self._release(keys=[self._key(name)], args=[self.owner])
+        except Exception as e:
+            logger.warning("释放租约 %s 失败（将自动过期）: %s", name, e)
+
+    def is_held(self, name: str) -> bool:
+        """租约是否被任意 worker 持有"""
+        return bool(self.redis_conn.exists(self._key(name)))
+
+    def close(self) -> None:
+        """停止心跳并释放所有租约"""
+        self._stop.set()
+        with self._lock:
+            names = list(self._held)
+        for name in names:
+            self.release(name)
+
+    def _heartbeat_loop(self) -> None:
+        interval = self.ttl_ms / 3000
+        while not self._stop.wait(interval):
+            with self._lock:
+                names = list(self._held)
+            for name in names:
+                try:
+                    if not self._renew(keys=[self._key(name)], args=[self.owner, self.ttl_ms]):
+                        # 续期失败说明租约已过期并可能被其他 worker 接手
+                        logger.warning("租约 %s 已丢失，可能被其他 worker 接手", name)
+                        with self._lock:
+                            self._held.pop(name, None)
+                except Exception as e:
+                    logger.warning("租约 %s 续期失败: %s", name, e)
+
+    def _key(self, name: str) -> str:
+        return f"{self.key_prefix}{name}"
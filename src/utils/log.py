@@ -0,0 +1,142 @@
+import atexit
+import contextvars
+import copy
+import json
+import logging
+import logging.handlers
+import os
+import queue
+import sys
+from contextlib import contextmanager
+from datetime import datetime, timezone
+from typing import Iterator, Optional
+
+try:
+    from colorama import Fore, Style
+except ImportError:  # colorama 可选：只用于 text 格式的终端着色
+    Fore = Style = None
+
+# 当前处理的邮件/会话标识，同一封邮件的所有日志带相同的 correlation_id，便于按邮件检索
+_correlation_id: contextvars.ContextVar[str] = contextvars.ContextVar("correlation_id", default="-")
+
+_LEVEL_COLORS = {} if Fore is None else {
+    logging.DEBUG: Fore.CYAN,
+    logging.INFO: Fore.GREEN,
+    logging.WARNING: Fore.YELLOW,
+    logging.ERROR: Fore.RED,
+    logging.CRITICAL: Fore.RED,
+}
+# LogRecord 自带的属性，其余属性视为通过 extra 传入的结构化字段
+_RECORD_ATTRS = set(vars(logging.LogRecord("", 0, "", 0, "", None, None))) | {"message", "asctime", "correlation_id"}
+
+_listener: Optional[logging.handlers.QueueListener] = None
+
+
+class _ContextFilter(logging.Filter):
+    """在产生日志的线程中取出 correlation_id（写日志的后台线程拿不到调用方的上下文）"""
+    def filter(self, record: logging.LogRecord) -> bool:
+        record.correlation_id = _correlation_id.get()
+        return True
+
+
+class _QueueHandler(logging.handlers.QueueHandler):
+    """入队前只格式化消息与异常堆栈（可跨线程传递），JSON 中堆栈单独放在 exc 字段"""
+    def prepare(self, record: logging.LogRecord) -> logging.LogRecord:
+        record = copy.copy(record)
+        record.msg = record.getMessage()
+        record.args = None
+        if record.exc_info:
+            record.exc_text = logging.Formatter().formatException(record.exc_info)
+            record.exc_info = None
+        return record
+
+
+class JsonFormatter(logging.Formatter):
+    """每条日志一行 JSON：时间、级别、模块、消息、correlation_id 及 extra 中的结构化字段"""
+    def format(self, record: logging.LogRecord) -> str:
+        data = {
+            "ts": datetime.fromtimestamp(record.created, timezone.utc).isoformat(timespec="milliseconds"),
+            "level": record.levelname,
+            "logger": record.name,
+            "correlation_id": getattr(record, "correlation_id", "-"),
+            "msg": record.getMessage(),
+        }
+        for key, value in vars(record).items():
+            if key not in _RECORD_ATTRS and not key.startswith("_"):
+                data[key] = value
+        if record.exc_info:
+            record.exc_text = self.formatException(record.exc_info)
+        if record.exc_text:
+            data["exc"] = record.exc_text
+        return json.dumps(data, ensure_ascii=False, default=str)
+
+
+class TextFormatter(logging.Formatter):
+    """本地开发用的可读格式，终端中按级别着色"""
+    def __init__(self, color: bool):
+        super().__init__("%(asctime)s %(levelname)s [%(correlation_id)s] %(name)s: %(message)s")
+        self.color = color
+
+    def format(self, record: logging.LogRecord) -> str:
+        text = super().format(record)
+        if self.color:
+            return f"{_LEVEL_COLORS.get(record.levelno, '')}{text}{Style.RESET_ALL}"
+        return text
+
+
+def setup_logging(level: Optional[str] = None, fmt: Optional[str] = None) -> None:
+    """
+    配置根日志（进程启动时调用一次，重复调用无效）：
+    - 级别 LOG_LEVEL（默认 INFO）；邮件正文、完整状态等载荷只在 DEBUG 级别输出
+    - 格式 LOG_FORMAT：json（默认）或 text
+    - 调用方只把日志放入内存队列，由后台线程格式化并写出，不阻塞邮件处理
+    """
+    global _listener
+    if _listener is not None:
+        return
+    level = (level or os.getenv("LOG_LEVEL", "INFO")).upper()
+    fmt = (fmt or os.getenv("LOG_FORMAT", "json")).lower()
+
+    stream_handler = logging.StreamHandler(sys.stdout)
+    if fmt == "text":
+        stream_handler.setFormatter(TextFormatter(color=Style is not None and sys.stdout.isatty()))
+    else:
+        stream_handler.setFormatter(JsonFormatter())
+
+    log_queue: queue.Queue = queue.Queue(-1)
+    queue_handler = _QueueHandler(log_queue)
+    queue_handler.addFilter(_ContextFilter())
+
+    root = logging.getLogger()
+    root.handlers = [queue_handler]
+    root.setLevel(level)
+    # 第三方库的请求日志较多，只保留警告以上
+    for noisy in ("httpx", "httpcore", "openai", "pika", "urllib3", "chromadb"):
+        logging.getLogger(noisy).setLevel(max(logging.WARNING, root.level))
+
+    _listener = logging.handlers.QueueListener(log_queue, stream_handler, respect_handler_level=True)
+    _listener.start()
+    # 退出时写完队列中剩余的日志
+    atexit.register(shutdown_logging)
+
+
+def shutdown_logging() -> None:
+    """写完队列中剩余的日志并停止后台线程（os._exit 等跳过 atexit 的退出方式需手动调用）"""
+    global _listener
+    listener, _listener = _listener, None
+    if listener is not None:
+        listener.stop()
+
+
+@contextmanager
+def log_context(correlation_id: str) -> Iterator[None]:
+    """在代码块内的日志带上 correlation_id（如 email:<id>）"""
+    token = _correlation_id.set(correlation_id)
+    try:
+        yield
+    finally:
+        _correlation_id.reset(token)
+
+
+def get_logger(name: str) -> logging.Logger:
+    return logging.getLogger(name)
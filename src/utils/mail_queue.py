@@ -0,0 +1,84 @@
+import json
+from typing import Dict, List, Optional
+
+
+class MailQueue:
+    """
+    多个 mail-robot 进程共享的待处理邮件队列（Redis）
+    - payload：邮件内容，worker 据此构造 Email
+    - in_flight 集合：已入队但未处理完的邮件，是崩溃恢复与背压的依据
+    - queue 列表：待 worker 领取的邮件ID；同一ID可能被重复入队，由租约去重
+    - attempts 哈希：每封邮件开始处理的次数，超过上限的邮件不再重试
+    - dead_letter 集合：无法处理也无法转人工的邮件，保留内容供排查
+    """
+    QUEUE_KEY = "qqmail:email:queue"
+    IN_FLIGHT_KEY = "qqmail:email:in_flight"
+    PAYLOAD_PREFIX = "qqmail:email:payload:"
+    ATTEMPTS_KEY = "qqmail:email:attempts"
+    DEAD_LETTER_KEY = "qqmail:email:dead_letter"
+
+    def __init__(self, redis_conn, payload_ttl: int = 60 * 60 * 24 * 7):
+        """
+        params:
+            payload_ttl: 邮件内容保留时间（秒），防止异常情况下残留
+        """
+        self.redis_conn = redis_conn
+        self.payload_ttl = payload_ttl
+
+    def enqueue(self, email_info: Dict, pipeline=None) -> None:
+        """
+        入队一封新邮件；传入 pipeline 时只排队命令，由调用方与认领标记一起提交
+        """
+        pipe = pipeline if pipeline is not None else self.redis_conn.pipeline()
+        email_id = email_info["id"]
+        pipe.set(self._payload_key(email_id), json.dumps(email_info, ensure_ascii=False), ex=self.payload_ttl)
+        pipe.sadd(self.IN_FLIGHT_KEY, email_id)
+        pipe.lpush(self.QUEUE_KEY, email_id)
+        if pipeline is None:
+            pipe.execute()
+
+    def pop(self, timeout: int = 1) -> Optional[str]:
+        """阻塞领取一个邮件ID，超时返回 None"""
+        result = self.redis_conn.brpop(self.QUEUE_KEY, timeout=timeout)
+        return result[1] if result else None
+
+    def requeue(self, email_id: str) -> None:
+        """重新入队（持有者崩溃、租约过期的邮件）"""
+        self.redis_conn.lpush(self.QUEUE_KEY, email_id)
+
+    def get_payload(self, email_id: str) -> Optional[Dict]:
+        data = self.redis_conn.get(self._payload_key(email_id))
+        return json.loads(data) if data else None
+
+    def record_attempt(self, email_id: str) -> int:
+        """记录一次处理尝试，返回累计次数（含本次）"""
+        return int(self.redis_conn.hincrby(self.ATTEMPTS_KEY, email_id, 1))
+
+    def complete(self, email_id: str) -> None:
+        """处理完成（或邮件内容已过期）：移出处理中集合并删除邮件内容与尝试次数"""
+        pipe = self.redis_conn.pipeline()
+        pipe.srem(self.IN_FLIGHT_KEY, email_id)
+        pipe.delete(self._payload_key(email_id))
+        pipe.hdel(self.ATTEMPTS_KEY, email_id)
+        pipe.execute()
+
+    def dead_letter(self, email_id: str) -> None:
+        """移入死信集合：不再重试，释放处理中名额，邮件内容取消过期以便排查"""
+        pipe = self.redis_conn.pipeline()
+        pipe.srem(self.IN_FLIGHT_KEY, email_id)
+        pipe.sadd(self.DEAD_LETTER_KEY, email_id)
+        pipe.persist(self._payload_key(email_id))
+        pipe.hdel(self.ATTEMPTS_KEY, email_id)
+        pipe.execute()
+
+    def is_in_flight(self, email_id: str) -> bool:
+        return bool(self.redis_conn.sismember(self.IN_FLIGHT_KEY, email_id))
+
+    def in_flight_ids(self) -> List[str]:
+        return sorted(self.redis_conn.smembers(self.IN_FLIGHT_KEY))
+
+    def in_flight_count(self) -> int:
+        return self.redis_conn.scard(self.IN_FLIGHT_KEY)
+
+    def _payload_key(self, email_id: str) -> str:
+        return f"{self.PAYLOAD_PREFIX}{email_id}"
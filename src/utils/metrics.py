@@ -0,0 +1,87 @@
+import os
+import time
+from contextlib import contextmanager
+from typing import Iterator, Tuple
+
+from src.utils.log import get_logger
+
+logger = get_logger(__name__)
+
+# prometheus_client 为可选依赖：未安装时所有指标为空操作，业务代码无需判断
+try:
+    from prometheus_client import Counter, Histogram, CONTENT_TYPE_LATEST, generate_latest, start_http_server
+    PROMETHEUS_AVAILABLE = True
+except ImportError:
+    PROMETHEUS_AVAILABLE = False
+    CONTENT_TYPE_LATEST = "text/plain; version=0.0.4; charset=utf-8"
+
+    class _NoopMetric:
+        def __init__(self, *args, **kwargs):
+            pass
+
+        def labels(self, *args, **kwargs) -> "_NoopMetric":
+            return self
+
+        def observe(self, amount: float) -> None:
+            pass
+
+        def inc(self, amount: float = 1) -> None:
+            pass
+
+    Counter = Histogram = _NoopMetric
+
+    def generate_latest() -> bytes:
+        return b"# prometheus_client not installed\n"
+
+    def start_http_server(port: int) -> None:
+        logger.warning("未安装 prometheus_client，不启动指标端口 %s", port)
+
+
+# 延迟分桶（秒）：覆盖 Redis/Chroma 的毫秒级到 LLM 生成的数十秒
+LATENCY_BUCKETS = (0.005, 0.01, 0.025, 0.05, 0.1, 0.25, 0.5, 1, 2.5, 5, 10, 20, 40, 80)
+
+EMAIL_SECONDS = Histogram(
+    "mailrobot_email_seconds", "单封邮件流程总耗时", buckets=LATENCY_BUCKETS,
+)
+NODE_SECONDS = Histogram(
+    "mailrobot_node_seconds", "流程图各节点耗时", ["node"], buckets=LATENCY_BUCKETS,
+)
+LLM_SECONDS = Histogram(
+    "mailrobot_llm_seconds", "各 chain 单次模型调用耗时", ["chain"], buckets=LATENCY_BUCKETS,
+)
+LLM_TOKENS = Counter(
+    "mailrobot_llm_tokens_total", "各 chain 的 token 用量（prompt / cached / completion）", ["chain", "kind"],
+)
+EMBEDDING_BATCH_SIZE = Histogram(
+    "mailrobot_embedding_batch_size", "单次 embedding 调用的文本数", buckets=(1, 2, 4, 8, 16, 32, 64, 128),
+)
+DEPENDENCY_SECONDS = Histogram(
+    "mailrobot_dependency_seconds", "外部依赖单次调用耗时（embedding、Chroma、MySQL、IMAP、SMTP、RabbitMQ）",
+    ["dependency", "operation", "outcome"], buckets=LATENCY_BUCKETS,
+)
+
+
+@contextmanager
+def observe_dependency(dependency: str, operation: str) -> Iterator[None]:
+    """记录一次外部调用的耗时，outcome 区分成功与失败"""
+    start = time.perf_counter()
+    outcome = "error"
+    try:
+        yield
+        outcome = "ok"
+    finally:
+        DEPENDENCY_SECONDS.labels(dependency, operation, outcome).observe(time.perf_counter() - start)
+
+
+def render_latest() -> Tuple[bytes, str]:
+    """当前进程的全部指标（Prometheus 文本格式）及其 Content-Type"""
+    return generate_latest(), CONTENT_TYPE_LATEST
+
+
+def start_exporter() -> None:
+    """邮件服务进程没有 HTTP 服务，配置 METRICS_PORT 后单独开一个指标端口供 Prometheus 拉取"""
+    port = int(os.getenv("METRICS_PORT", 0))
+    if port > 0:
+        start_http_server(port)
+        if PROMETHEUS_AVAILABLE:
+            logger.info("指标端口已启动: http://0.0.0.0:%s/metrics", port)
@@ -1,27 +1,61 @@
 import pika
 import json
+import threading
 from typing import Dict, Any, Callable
 
+from pika.exceptions import AMQPConnectionError, AMQPChannelError
+
+from src.utils.resilience import get_dependency
+from src.utils.log import get_logger
+
+logger = get_logger(__name__)
+
 class MQClient:
     def __init__(self, host: str, queue_name: str):
         self.host = host
         self.queue_name = queue_name
+        # BlockingConnection 非线程安全，多个 worker 线程发布时需串行
+        self._publish_lock = threading.Lock()
+        # 连接/读写超时、发布失败时重连重试、连续失败后熔断
+        self.dependency = get_dependency("rabbitmq")
+        self.connection = None
+        self.channel = None
         try:
-            # 建立阻塞连接
-            self.connection = pika.BlockingConnection(pika.ConnectionParameters(host=host))
-            self.channel = self.connection.channel()
-            # 声明队列（持久化，保证 RabbitMQ 重启消息不丢）
-            self.channel.queue_declare(queue=queue_name, durable=True)
+            self._connect()
         except Exception as e:
             raise RuntimeError(f"无法连接到 RabbitMQ: {e}")
-        
+
+    def _connect(self):
+        """建立阻塞连接并声明队列"""
+        timeout = self.dependency.timeout
+        self.connection = pika.BlockingConnection(pika.ConnectionParameters(
+            host=self.host,
+            socket_timeout=timeout,
+            blocked_connection_timeout=timeout,
+            stack_timeout=timeout,
+            heartbeat=60,
+        ))
+        self.channel = self.connection.channel()
+        # 声明队列（持久化，保证 RabbitMQ 重启消息不丢）
+        self.channel.queue_declare(queue=self.queue_name, durable=True)
+
     def publish_task(self, task: Dict[str, Any]):
         """
         发布任务到队列, task 必须是可序列化字典
+        连接断开时重连后重试（重试可能造成重复投递，人工处理任务按 email_id 去重即可）；
+        RabbitMQ 熔断或重试耗尽时抛出异常，由调用方决定后续处理
         """
+        # 转换为 JSON 字符串
+        message = json.dumps(task)
+        with self._publish_lock:
+            self.dependency.call(self._publish, message, errors=(AMQPConnectionError, AMQPChannelError, OSError))
+        logger.debug("已发布任务到队列: %s", self.queue_name)
+
+    def _publish(self, message: str):
+        """发布一条消息，连接已断开时先重连；调用方需持有 _publish_lock"""
         try:
-            # 转换为 JSON 字符串
-            message = json.dumps(task)
+            if self.connection is None or self.connection.is_closed or self.channel is None or self.channel.is_closed:
+                self._connect()
             # 发布消息（持久化，确保消息不丢失）
             self.channel.basic_publish(
                 exchange='',                # 使用默认交换机
@@ -31,9 +65,10 @@ class MQClient:
                     delivery_mode=2,  # 消息持久化
                 )
             )
-            print(f"已发布任务到队列: {self.queue_name}")
-        except Exception as e:
-            print(f"发布任务到队列失败: {e}")
+        except Exception:
+            # 丢弃失效的连接，重试时重新建立
+            self.channel = None
+            raise
 
     def consume_tasks(self, callback: Callable[[Dict[str, Any]], None]):
         """
@@ -51,7 +86,7 @@ class MQClient:
                 # 手动确认消息已处理（ACK）
                 ch.basic_ack(delivery_tag=method.delivery_tag)
             except Exception as e:
-                print(f"处理消息失败: {e}")
+                logger.exception("处理消息失败: %s", e)
                 # 处理失败时可以选择拒绝消息（NACK）或重新入队
                 ch.basic_nack(delivery_tag=method.delivery_tag, requeue=True)
 
@@ -61,7 +96,7 @@ class MQClient:
             queue=self.queue_name,
             on_message_callback=_on_message
         )
-        print(f"开始消费队列: {self.queue_name}")
+        logger.info("开始消费队列: %s", self.queue_name)
         self.channel.start_consuming()
 
     def close(self):
@@ -70,4 +105,4 @@ class MQClient:
         """
         if self.connection and self.connection.is_open:
             self.connection.close()
-            print("已关闭 RabbitMQ 连接")
\ No newline at end of file
+            logger.info("已关闭 RabbitMQ 连接")
\ No newline at end of file
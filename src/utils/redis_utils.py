@@ -1,20 +1,30 @@
 import redis
 import os
+from redis.backoff import EqualJitterBackoff
+from redis.retry import Retry
 from dotenv import load_dotenv
-from colorama import Fore, Style
+
+from src.utils.resilience import get_dependency
 
 load_dotenv()
 
 def get_redis_conn():
     """获取Redis连接（单例模式）"""
     if not hasattr(get_redis_conn, "conn"):
+        # 读写与建连都有超时；连接错误、超时按抖动退避重试（Redis 命令多为幂等的读写/计数）
+        dependency = get_dependency("redis")
         try:
             get_redis_conn.conn = redis.Redis(
                 host=os.getenv("REDIS_HOST", "localhost"),
                 port=int(os.getenv("REDIS_PORT", 6379)),
                 password=os.getenv("REDIS_PASSWORD", ""),
                 decode_responses=True,  # 自动将Redis返回的bytes转成字符串（简化操作）
-                db=int(os.getenv("REDIS_DB", 0))
+                db=int(os.getenv("REDIS_DB", 0)),
+                socket_timeout=dependency.timeout,
+                socket_connect_timeout=dependency.timeout,
+                retry=Retry(EqualJitterBackoff(), dependency.retries),
+                retry_on_error=[redis.exceptions.ConnectionError, redis.exceptions.TimeoutError],
+                health_check_interval=30,
             )
             get_redis_conn.conn.ping()
         except Exception as e:
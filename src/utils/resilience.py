@@ -0,0 +1,154 @@
+import os
+import random
+import threading
+import time
+from typing import Callable, Dict, Optional, Tuple, Type
+
+from src.utils.metrics import observe_dependency
+from src.utils.log import get_logger
+
+logger = get_logger(__name__)
+
+# 各外部依赖的默认策略：超时（秒，None 表示无法设置）、幂等调用的重试次数、熔断阈值（连续失败次数）、熔断时长（秒）
+# 均可通过 RESILIENCE_<NAME>_TIMEOUT / _RETRIES / _FAILURE_THRESHOLD / _RESET_SECONDS 覆盖
+DEFAULT_POLICIES = {
+    "llm": {"timeout": 60, "retries": 2, "failure_threshold": 5, "reset_seconds": 30},
+    "embedding": {"timeout": 15, "retries": 2, "failure_threshold": 5, "reset_seconds": 30},
+    "chroma": {"timeout": None, "retries": 1, "failure_threshold": 5, "reset_seconds": 30},
+    "imap": {"timeout": 30, "retries": 2, "failure_threshold": 3, "reset_seconds": 60},
+    "smtp": {"timeout": 30, "retries": 2, "failure_threshold": 3, "reset_seconds": 60},
+    "redis": {"timeout": 5, "retries": 2, "failure_threshold": 5, "reset_seconds": 10},
+    "rabbitmq": {"timeout": 10, "retries": 2, "failure_threshold": 3, "reset_seconds": 30},
+}
+
+
+class DependencyUnavailable(RuntimeError):
+    """依赖处于熔断状态（近期连续失败），快速失败而不再发起调用"""
+    def __init__(self, name: str, retry_in: float):
+        super().__init__(f"{name} 熔断中，{retry_in:.0f} 秒后重试")
+        self.name = name
+        self.retry_in = retry_in
+
+
+class CircuitBreaker:
+    """
+    熔断器：连续失败 failure_threshold 次后熔断，reset_seconds 内的调用直接失败；
+    到期后放行一次探测调用（半开），成功则恢复，失败则继续熔断
+    """
+    CLOSED, OPEN, HALF_OPEN = "closed", "open", "half_open"
+
+    def __init__(self, name: str, failure_threshold: int = 5, reset_seconds: float = 30):
+        self.name = name
+        self.failure_threshold = failure_threshold
+        self.reset_seconds = reset_seconds
+        self.state = self.CLOSED
+        self.failures = 0
+        self._opened_at = 0.0
+        self._lock = threading.Lock()
+
+    def before_call(self) -> None:
+        """调用前检查，熔断中时抛出 DependencyUnavailable"""
+        with self._lock:
+            if self.state == self.CLOSED:
+                return
+            retry_in = self._opened_at + self.reset_seconds - time.monotonic()
+            if self.state == self.OPEN and retry_in <= 0:
+                # 只放行一个探测调用，其余调用在探测结束前继续快速失败
+                self.state = self.HALF_OPEN
+                return
+            raise DependencyUnavailable(self.name, max(retry_in, 0))
+
+    def record_success(self) -> None:
+        with self._lock:
+            if self.state != self.CLOSED:
+                logger.info("依赖 %s 已恢复", self.name)
+            self.state = self.CLOSED
+            self.failures = 0
+
+    def record_failure(self) -> None:
+        with self._lock:
+            self.failures += 1
+            if self.state == self.HALF_OPEN or self.failures >= self.failure_threshold:
+                if self.state != self.OPEN:
+                    logger.error("依赖 %s 连续失败 %d 次，熔断 %s 秒", self.name, self.failures, self.reset_seconds)
+                self.state = self.OPEN
+                self._opened_at = time.monotonic()
+
+    def release(self) -> None:
+        """探测调用因与依赖无关的原因失败（如参数错误）时交还探测机会，下一次调用重新探测"""
+        with self._lock:
+            if self.state == self.HALF_OPEN:
+                self.state = self.OPEN
+
+    def snapshot(self) -> dict:
+        with self._lock:
+            return {"state": self.state, "failures": self.failures}
+
+
+class Dependency:
+    """
+    一个外部依赖的调用策略：超时（由客户端配置使用）、幂等调用的抖动重试、熔断
+    """
+    def __init__(self, name: str, timeout: Optional[float], retries: int, failure_threshold: int, reset_seconds: float,
+                 backoff_base: float = 0.5, backoff_max: float = 8.0):
+        self.name = name
+        self.timeout = timeout
+        self.retries = retries
+        self.backoff_base = backoff_base
+        self.backoff_max = backoff_max
+        self.breaker = CircuitBreaker(name, failure_threshold, reset_seconds)
+
+    def call(self, fn: Callable, *args, idempotent: bool = True,
+             errors: Tuple[Type[BaseException], ...] = (Exception,), **kwargs):
+        """
+        通过熔断器调用 fn；errors 中的异常计为依赖失败，幂等调用失败后按抖动退避重试
+        非幂等调用（如发送邮件）不重试，避免重复执行
+        """
+        attempts = 1 + (self.retries if idempotent else 0)
+        operation = getattr(fn, "__name__", "call")
+        for attempt in range(attempts):
+            self.breaker.before_call()
+            try:
+                with observe_dependency(self.name, operation):
+                    result = fn(*args, **kwargs)
+            except errors as e:
+                self.breaker.record_failure()
+                if attempt == attempts - 1:
+                    raise
+                delay = self.backoff(attempt)
+                logger.warning("%s 调用失败（%s），%.1f 秒后第 %d 次重试", self.name, e, delay, attempt + 1)
+                time.sleep(delay)
+                continue
+            except BaseException:
+                self.breaker.release()
+                raise
+            self.breaker.record_success()
+            return result
+
+    def backoff(self, attempt: int) -> float:
+        """指数退避 + 全抖动，避免多个 worker 同时重试"""
+        return random.uniform(0, min(self.backoff_max, self.backoff_base * (2 ** attempt)))
+
+
+_dependencies: Dict[str, Dependency] = {}
+_dependencies_lock = threading.Lock()
+
+
+def get_dependency(name: str) -> Dependency:
+    """按名称获取依赖策略（进程内单例，同一依赖共享熔断状态）"""
+    with _dependencies_lock:
+        if name not in _dependencies:
+            policy = dict(DEFAULT_POLICIES.get(name.split(":")[0], DEFAULT_POLICIES["llm"]))
+            prefix = f"RESILIENCE_{name.split(':')[0].upper()}_"
+            for key, value in policy.items():
+                env_value = os.getenv(prefix + key.upper())
+                if env_value:
+                    policy[key] = float(env_value) if key in ("timeout", "reset_seconds") else int(env_value)
+            _dependencies[name] = Dependency(name, **policy)
+        return _dependencies[name]
+
+
+def dependency_states() -> Dict[str, dict]:
+    """当前进程内各依赖的熔断状态"""
+    with _dependencies_lock:
+        return {name: dependency.breaker.snapshot() for name, dependency in _dependencies.items()}
@@ -0,0 +1,49 @@
+from typing import Dict
+
+from src.utils.log import get_logger
+
+logger = get_logger(__name__)
+
+
+class StatsRecorder:
+    """
+    流水线运行指标（Redis 哈希 qqmail:stats:<name>），多个进程累加到同一组计数器
+    """
+    KEY_PREFIX = "qqmail:stats:"
+
+    def __init__(self, redis_conn, name: str):
+        self.redis_conn = redis_conn
+        self.key = f"{self.KEY_PREFIX}{name}"
+
+    def incr(self, **fields: float) -> None:
+        """一次 pipeline 累加多个计数，如 incr(requests=1, llm_ms=820.5)"""
+        if not self.redis_conn or not fields:
+            return
+        try:
+            pipe = self.redis_conn.pipeline()
+            for field, amount in fields.items():
+                if isinstance(amount, int):
+                    pipe.hincrby(self.key, field, amount)
+                else:
+                    pipe.hincrbyfloat(self.key, field, amount)
+            pipe.execute()
+        except Exception as e:
+            # 指标记录失败不影响邮件处理
+            logger.warning("记录指标 %s 失败: %s", self.key, e)
+
+    def get(self) -> Dict[str, float]:
+        if not self.redis_conn:
+            return {}
+        return {field: float(value) for field, value in self.redis_conn.hgetall(self.key).items()}
+
+    @classmethod
+    def get_all(cls, redis_conn) -> Dict[str, Dict[str, float]]:
+        """读取全部指标，按名称分组"""
+        if not redis_conn:
+            return {}
+        result = {}
+        for key in redis_conn.scan_iter(match=f"{cls.KEY_PREFIX}*"):
+            result[key[len(cls.KEY_PREFIX):]] = {
+                field: float(value) for field, value in redis_conn.hgetall(key).items()
+            }
+        return result
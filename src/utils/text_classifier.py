@@ -0,0 +1,106 @@
+import json
+import math
+import random
+import zlib
+from typing import Dict, List, Optional, Sequence, Tuple
+
+
+class HashedNgramClassifier:
+    """
+    轻量本地文本分类器：字符 n-gram 特征哈希 + 多分类逻辑回归（SGD 训练）
+    纯 Python 实现，无需额外依赖；模型是稀疏权重表，保存为 JSON
+    """
+    def __init__(self, n_features: int = 1 << 18, ngram_range: Tuple[int, int] = (1, 3), max_chars: int = 2000):
+        """
+        params:
+            n_features: 哈希桶数量
+            ngram_range: 字符 n-gram 长度范围（中文按字切分即可，无需分词）
+            max_chars: 只取文本前 max_chars 个字符提取特征
+        """
+        self.n_features = n_features
+        self.ngram_range = ngram_range
+        self.max_chars = max_chars
+        self.labels: List[str] = []
+        self.weights: Dict[str, Dict[int, float]] = {}
+        self.bias: Dict[str, float] = {}
+
+    def features(self, text: str) -> Dict[int, float]:
+        """哈希后的 n-gram 词频，L2 归一化"""
+        text = " ".join(text.lower().split())[:self.max_chars]
+        counts: Dict[int, float] = {}
+        low, high = self.ngram_range
+        for n in range(low, high + 1):
+            for i in range(len(text) - n + 1):
+                bucket = zlib.crc32(text[i:i + n].encode("utf-8")) % self.n_features
+                counts[bucket] = counts.get(bucket, 0.0) + 1.0
+        norm = math.sqrt(sum(v * v for v in counts.values())) or 1.0
+        return {k: v / norm for k, v in counts.items()}
+
+    def fit(self, texts: Sequence[str], labels: Sequence[str], epochs: int = 5, lr: float = 0.5, l2: float = 1e-6,
+            seed: int = 42) -> "HashedNgramClassifier":
+        self.labels = sorted(set(labels))
+        self.weights = {label: {} for label in self.labels}
+        self.bias = {label: 0.0 for label in self.labels}
+        samples = [(self.features(text), label) for text, label in zip(texts, labels)]
+        rng = random.Random(seed)
+        for epoch in range(epochs):
+            rng.shuffle(samples)
+            step = lr / (1 + epoch)
+            for feats, label in samples:
+                probs = self._proba(feats)
+                for cls in self.labels:
+                    grad = probs[cls] - (1.0 if cls == label else 0.0)
+                    if abs(grad) < 1e-6:
+                        continue
+                    weights = self.weights[cls]
+                    for k, v in feats.items():
+                        w = weights.get(k, 0.0)
+                        weights[k] = w - step * (grad * v + l2 * w)
+                    self.bias[cls] -= step * grad
+        return self
+
+    def predict_proba(self, text: str) -> Dict[str, float]:
+        if not self.labels:
+            return {}
+        return self._proba(self.features(text))
+
+    def predict(self, text: str) -> Tuple[Optional[str], float]:
+        """返回 (最可能的类别, 置信度)；未训练时返回 (None, 0.0)"""
+        probs = self.predict_proba(text)
+        if not probs:
+            return None, 0.0
+        label = max(probs, key=probs.get)
+        return label, probs[label]
+
+    def save(self, path: str) -> None:
+        with open(path, "w", encoding="utf-8") as f:
+            json.dump({
+                "n_features": self.n_features,
+                "ngram_range": list(self.ngram_range),
+                "max_chars": self.max_chars,
+                "labels": self.labels,
+                "bias": self.bias,
+                # 只保存非零权重，JSON 键只能是字符串
+                "weights": {cls: {str(k): round(v, 6) for k, v in w.items() if abs(v) > 1e-6}
+                            for cls, w in self.weights.items()},
+            }, f, ensure_ascii=False)
+
+    @classmethod
+    def load(cls, path: str) -> "HashedNgramClassifier":
+        with open(path, "r", encoding="utf-8") as f:
+            data = json.load(f)
+        model = cls(data["n_features"], tuple(data["ngram_range"]), data["max_chars"])
+        model.labels = data["labels"]
+        model.bias = data["bias"]
+        model.weights = {label: {int(k): v for k, v in w.items()} for label, w in data["weights"].items()}
+        return model
+
+    def _proba(self, feats: Dict[int, float]) -> Dict[str, float]:
+        scores = {}
+        for cls in self.labels:
+            weights = self.weights[cls]
+            scores[cls] = self.bias[cls] + sum(weights.get(k, 0.0) * v for k, v in feats.items())
+        top = max(scores.values())
+        exp = {cls: math.exp(score - top) for cls, score in scores.items()}
+        total = sum(exp.values())
+        return {cls: value / total for cls, value in exp.items()}
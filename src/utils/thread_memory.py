@@ -0,0 +1,90 @@
+import json
+from datetime import datetime
+from typing import Dict, List, Optional
+
+from src.tools.schema_mail import Email
+from src.utils.tokens import count_tokens, truncate_to_tokens
+
+
+class ThreadMemory:
+    """
+    会话级记忆（Redis）：以会话根邮件的 Message-ID 为键，记录上一轮的分类、RAG 查询、检索到的文档块ID
+    以及最近几轮的往来摘要。同一会话的追问据此跳过查询构造与检索，并把摘要而非完整引用历史交给写作节点
+    """
+    KEY_PREFIX = "qqmail:thread:"
+
+    def __init__(self, redis_conn, ttl: int = 60 * 60 * 24 * 30, max_turns: int = 3, summary_tokens: int = 400):
+        """
+        params:
+            ttl: 会话记忆保留时间（秒），默认30天
+            max_turns: 摘要中保留的最近往来轮数
+            summary_tokens: 会话摘要的 token 上限
+        """
+        self.redis_conn = redis_conn
+        self.ttl = ttl
+        self.max_turns = max_turns
+        self.summary_tokens = summary_tokens
+
+    @staticmethod
+    def thread_key(email: Email) -> str:
+        """会话键：References 的第一项是会话根邮件；没有时退化为 In-Reply-To / 本邮件的 Message-ID"""
+        references = email.references.split()
+        return references[0] if references else (email.threadId or email.messageId)
+
+    def load(self, thread_key: str) -> Optional[Dict]:
+        if not self.redis_conn or not thread_key:
+            return None
+        data = self.redis_conn.get(self._key(thread_key))
+        return json.loads(data) if data else None
+
+    def record_turn(
+        self,
+        thread_key: str,
+        category: str,
+        rag_queries: List[str],
+        chunk_ids: List[str],
+        customer_message: str,
+        reply: str,
+    ) -> None:
+        """记录一轮已发送的往来（客户邮件与回复各自截断，只保留最近 max_turns 轮）"""
+        if not self.redis_conn or not thread_key:
+            return
+        memory = self.load(thread_key) or {"turns": [], "turn_count": 0}
+        per_message_tokens = max(self.summary_tokens // (self.max_turns * 2), 32)
+        turns = memory["turns"] + [{
+            "customer": truncate_to_tokens(customer_message, per_message_tokens),
+            "reply": truncate_to_tokens(reply, per_message_tokens),
+        }]
+        memory.update({
+            "category": category,
+            "rag_queries": rag_queries,
+            "chunk_ids": chunk_ids,
+            # 话题判断依据：最近一封客户邮件 + 当时的检索查询
+            "topic": f"{customer_message}\n{' '.join(rag_queries)}".strip(),
+            "turns": turns[-self.max_turns:],
+            "turn_count": memory.get("turn_count", 0) + 1,
+            "updated_at": datetime.now().isoformat(),
+        })
+        self.redis_conn.set(self._key(thread_key), json.dumps(memory, ensure_ascii=False), ex=self.ttl)
+
+    def render_summary(self, memory: Dict) -> str:
+        """渲染给写作节点的会话摘要，从最近一轮往前取，直到达到 token 上限"""
+        lines: List[str] = []
+        used = 0
+        turns = memory.get("turns", [])
+        # 只保留了最近几轮，轮次从总轮数倒推
+        first_turn = memory.get("turn_count", len(turns)) - len(turns) + 1
+        for idx in range(len(turns) - 1, -1, -1):
+            turn, number = turns[idx], first_turn + idx
+            line = f"第{number}轮 客户：{turn['customer']}\n第{number}轮 我方回复：{turn['reply']}"
+            tokens = count_tokens(line)
+            if lines and used + tokens > self.summary_tokens:
+                break
+            lines.insert(0, line)
+            used += tokens
+        if not lines:
+            return ""
+        return f"此前分类：{memory.get('category', '未知')}\n" + "\n".join(lines)
+
+    def _key(self, thread_key: str) -> str:
+        return f"{self.KEY_PREFIX}{thread_key}"
@@ -0,0 +1,72 @@
+import re
+from functools import lru_cache
+from typing import Dict, List, Tuple
+
+# 估算规则：中日韩字符约 1 token/字，其余按空白/标点切分的片段约 4 字符/token
+_CJK_RE = re.compile("[\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uff00-\uffef]")
+_PIECE_RE = re.compile("[^\\s\u3040-\u30ff\u3400-\u4dbf\u4e00-\u9fff\uac00-\ud7af\uff00-\uffef]+")
+
+
+@lru_cache(maxsize=1)
+def _get_encoding():
+    """tiktoken 可选：安装时使用 cl100k_base 计数，否则返回 None 走估算"""
+    try:
+        import tiktoken
+        return tiktoken.get_encoding("cl100k_base")
+    except Exception:
+        return None
+
+
+def count_tokens(text: str) -> int:
+    """
+    统计文本的 token 数（用于预算控制与日志，非计费精度）
+    """
+    if not text:
+        return 0
+    encoding = _get_encoding()
+    if encoding is not None:
+        return len(encoding.encode(text, disallowed_special=()))
+    return len(_CJK_RE.findall(text)) + sum((len(piece) + 3) // 4 for piece in _PIECE_RE.findall(text))
+
+
+def truncate_to_tokens(text: str, max_tokens: int, marker: str = "……") -> str:
+    """
+    将文本截断到 max_tokens 以内，尽量在段落/句子边界处截断，并追加截断标记
+    """
+    if max_tokens <= 0 or count_tokens(text) <= max_tokens:
+        return text
+    budget = max_tokens - count_tokens(marker)
+    # 二分查找不超过预算的最长前缀
+    low, high = 0, len(text)
+    while low < high:
+        mid = (low + high + 1) // 2
+        if count_tokens(text[:mid]) <= budget:
+            low = mid
+        else:
+            high = mid - 1
+    head = text[:low]
+    # 回退到最近的段落或句子边界，但不丢弃超过 1/3 的内容
+    for boundary in ("\n\n", "\n", "。", "！", "？", ". ", "! ", "? "):
+        cut = head.rfind(boundary)
+        if cut >= len(head) * 2 // 3:
+            head = head[:cut + len(boundary)]
+            break
+    return head.rstrip() + marker
+
+
+def fit_sections(sections: List[Tuple[str, str]], budget: int, min_tokens: int = 16) -> Dict[str, str]:
+    """
+    把多段文本压缩到总 token 预算内
+    sections 按重要性从高到低排列 (名称, 文本)，超出预算时从最不重要的一段开始截断，
+    截断后剩余不足 min_tokens 的段落直接丢弃
+    """
+    texts = dict(sections)
+    tokens = {name: count_tokens(text) for name, text in sections}
+    overflow = sum(tokens.values()) - budget
+    for name, text in reversed(sections):
+        if overflow <= 0:
+            break
+        keep = tokens[name] - overflow
+        texts[name] = truncate_to_tokens(text, keep) if keep >= min_tokens else ""
+        overflow -= tokens[name] - count_tokens(texts[name])
+    return texts
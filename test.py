@@ -13,34 +13,6 @@ from src.utils.redis_utils import redis_conn
 from src.utils.database import MySQLManager
 from src.rag import RAGEngine
 
-print(Fore.BLUE +f"============================================================================")
-print(f"===============================加载环境变量=================================")
-print(f"OPENAI_API_KEY: {os.getenv('OPENAI_API_KEY')}")
-print(f"BASE_URL: {os.getenv('BASE_URL')}")
-print(f"MODEL_NAME: {os.getenv('MODEL_NAME')}")
-print(f"EMBEDDING_MODEL_NAME: {os.getenv('EMBEDDING_MODEL_NAME')}")
-print(f"EMBEDDING_API_KEY: {os.getenv('EMBEDDING_API_KEY')}")
-print(f"EMAIL_FROM: {os.getenv('EMAIL_FROM')}")
-print(f"SMTP_HOST: {os.getenv('SMTP_HOST')}")
-print(f"SMTP_PORT: {os.getenv('SMTP_PORT')}")
-print(f"EMAIL_ACCOUNT: {os.getenv('EMAIL_ACCOUNT')}")
-print(f"EMAIL_PASSWORD: {os.getenv('EMAIL_PASSWORD')}")
-print(f"EMAIL_DELAY_HOURS: {os.getenv('EMAIL_DELAY_HOURS')}")
-print(f"IMAP_HOST: {os.getenv('IMAP_HOST')}")
-print(f"IMAP_PORT: {os.getenv('IMAP_PORT')}")
-print(f"REDIS_HOST: {os.getenv('REDIS_HOST')}")
-print(f"REDIS_PORT: {os.getenv('REDIS_PORT')}")
-print(f"REDIS_DB: {os.getenv('REDIS_DB')}")
-print(f"REDIS_PASSWORD: {os.getenv('REDIS_PASSWORD')}")
-print(f"MYSQL_HOST: {os.getenv('MYSQL_HOST')}")
-print(f"MYSQL_PORT: {os.getenv('MYSQL_PORT')}")
-print(f"MYSQL_USER: {os.getenv('MYSQL_USER')}")
-print(f"MYSQL_PASSWORD: {os.getenv('MYSQL_PASSWORD')}")
-print(f"MYSQL_DB_NAME: {os.getenv('MYSQL_DB_NAME')}")
-
-print(f"=============================================================================")
-print(f"=============================================================================")
-
 print(Fore.GREEN + "Starting workflow..." + Style.RESET_ALL)
 
 
@@ -0,0 +1,100 @@
+import pytest
+
+from src.draft_checks import DraftChecker
+
+DOCUMENTS = "基础会员 29 元/月，高级会员 ¥99/月。退款申请审核通过后 7 个工作日内原路退回。帮助中心：https://help.example.com/refund"
+CHINESE_BODY = "你好，我上周开通了会员，想申请退款，请问多久能到账？"
+ENGLISH_BODY = "Hi, I subscribed last week and would like a refund. How long does it take?"
+
+
+def _checker(body: str = CHINESE_BODY, documents: str = DOCUMENTS) -> DraftChecker:
+    # 与 Nodes._draft_checker 相同：参考信息为检索结果 + 客户邮件
+    return DraftChecker("\n".join([documents, body]), customer_text=body, min_chars=20)
+
+
+def test_grounded_draft_passes():
+    draft = "您好，感谢您的来信。基础会员价格为 29 元/月，退款审核通过后 7 个工作日内原路退回，详情见 https://help.example.com/refund 。"
+    assert _checker().check_final(draft) is None
+
+
+def test_made_up_price_is_rejected():
+    draft = "您好，感谢您的来信。基础会员现价 39 元/月，退款审核通过后会尽快原路退回。"
+    assert _checker().check_final(draft) == "价格 39 在参考信息中没有出处"
+    # 流式输出时价格后面已有内容，check_partial 就能提前中止
+    assert _checker().check_partial("您好，基础会员现价 ¥39，") == "价格 39 在参考信息中没有出处"
+
+
+def test_price_with_different_precision_is_grounded():
+    draft = "您好，感谢您的来信。高级会员价格为 99.00 元/月，基础会员为 ¥29.0/月，可按需选择。"
+    assert _checker().check_final(draft) is None
+
+
+def test_price_grounded_only_in_customer_mail():
+    body = "你好，我买的是 199 元的年度套餐，现在想申请退款，请问怎么操作？"
+    draft = "您好，您购买的 199 元年度套餐可以申请退款，审核通过后 7 个工作日内原路退回。"
+    assert _checker(body).check_final(draft) is None
+    # 参考信息不含客户邮件时同一价格就没有出处
+    assert DraftChecker(DOCUMENTS, customer_text=body, min_chars=20).check_final(draft) == "价格 199 在参考信息中没有出处"
+
+
+def test_trailing_number_still_streaming_is_not_judged():
+    checker = _checker()
+    # "¥2" 之后可能是 "¥29"，末尾的数字还没写完时不检查
+    assert checker.check_partial("您好，基础会员价格为 ¥2") is None
+    assert checker.check_partial("您好，基础会员价格为 ¥29") is None
+    assert checker.check_partial("您好，基础会员价格为 ¥299") is None
+    assert checker.check_partial("您好，基础会员价格为 ¥299，") == "价格 299 在参考信息中没有出处"
+    # 完整草稿中末尾的数字同样要检查
+    assert checker.check_final("您好，感谢您的来信，基础会员的价格为 ¥299") == "价格 299 在参考信息中没有出处"
+
+
+def test_trailing_url_still_streaming_is_not_judged():
+    checker = _checker()
+    assert checker.check_partial("详情见 https://help.example.com/re") is None
+    assert checker.check_partial("详情见 https://evil.example.com/refund") is None
+    assert checker.check_partial("详情见 https://evil.example.com/refund 。") == (
+        "链接 https://evil.example.com/refund 在参考信息中没有出处"
+    )
+
+
+@pytest.mark.parametrize("placeholder", ["{name}", "{{customer_name}}", "【客户姓名】", "[姓名]", "<客户姓名>", "XXX"])
+def test_placeholder_is_rejected(placeholder):
+    draft = f"尊敬的{placeholder}，您好，感谢您的来信。退款审核通过后 7 个工作日内原路退回。"
+    assert _checker().check_final(draft) == f"残留占位符“{placeholder}”"
+
+
+def test_chinese_mail_answered_in_english_is_rejected():
+    draft = "Hello, thanks for reaching out. Refunds are returned to the original payment method within 7 business days."
+    assert _checker(CHINESE_BODY).check_final(draft) == "客户邮件为中文，回复却不是中文"
+    assert _checker(ENGLISH_BODY).check_final(draft) is None
+
+
+def test_english_mail_answered_in_chinese_is_rejected():
+    draft = "您好，感谢您的来信。退款审核通过后 7 个工作日内原路退回，请耐心等待。"
+    assert _checker(ENGLISH_BODY).check_final(draft) == "客户邮件为英文，回复却是中文"
+    assert _checker(CHINESE_BODY).check_final(draft) is None
+
+
+def test_mixed_language_draft_is_not_rejected():
+    # 中文回复里夹带产品名、链接等英文不算语言不一致
+    draft = "您好，请在 App 的 Settings > Account 页面提交退款申请，审核通过后 7 个工作日内原路退回。"
+    assert _checker(CHINESE_BODY).check_final(draft) is None
+
+
+def test_length_and_forbidden_phrases():
+    checker = DraftChecker(DOCUMENTS, customer_text=CHINESE_BODY, max_chars=40, min_chars=20)
+    assert checker.check_final("您好，已收到。") == "回复过短（不足 20 字）"
+    assert checker.check_partial("您好，" * 30) == "回复过长（超过 40 字）"
+    assert checker.check_partial("作为AI，我无法") == "包含禁用语“作为AI”"
+
+
+def test_risk_counts_ungrounded_quantities():
+    checker = _checker()
+    grounded, _ = checker.risk("退款审核通过后 7 个工作日内原路退回。", "customer_feedback")
+    ungrounded, reasons = checker.risk("退款审核通过后 3 个工作日内原路退回，可享 8折。", "customer_feedback")
+    assert grounded == pytest.approx(0.1)
+    assert ungrounded == pytest.approx(0.7)
+    assert "无出处的数量承诺 ['3', '8']" in reasons
+    score, reasons = checker.risk("感谢您的建议。", "product_enquiry", trials=2, has_references=False)
+    assert score == pytest.approx(0.8)
+    assert len(reasons) == 3
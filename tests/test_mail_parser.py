@@ -0,0 +1,92 @@
+from src.tools.mail_parser import normalize_body, strip_quoted_text
+
+
+def test_qq_mail_reply():
+    text = (
+        "您好，退款还没有到账。\n"
+        "\n"
+        "------------------ 原始邮件 ------------------\n"
+        "发件人: \"客服\"<support@example.com>;\n"
+        "发送时间: 2024年5月1日(星期三) 上午10:00\n"
+        "主题: 回复：退款申请\n"
+        "\n"
+        "您的退款申请已受理。"
+    )
+    assert strip_quoted_text(text) == "您好，退款还没有到账。"
+
+
+def test_gmail_reply():
+    text = (
+        "Still not working after the update.\n"
+        "\n"
+        "On Wed, May 1, 2024 at 10:00 AM Support <support@example.com> wrote:\n"
+        "> Please try restarting the device.\n"
+        ">\n"
+        "> Best regards"
+    )
+    assert strip_quoted_text(text) == "Still not working after the update."
+
+
+def test_gmail_reply_with_wrapped_header():
+    text = (
+        "Still not working.\n"
+        "\n"
+        "On Wed, May 1, 2024 at 10:00 AM Customer Support Team <support@example.com>\n"
+        "wrote:\n"
+        "> Please try restarting the device."
+    )
+    assert strip_quoted_text(text) == "Still not working."
+
+
+def test_outlook_plain_text_reply():
+    text = (
+        "Need help with sync\n"
+        "\n"
+        "From: Support <support@example.com>\n"
+        "Sent: Monday, May 1, 2024 10:00 AM\n"
+        "To: customer@example.com\n"
+        "Subject: Re: sync\n"
+        "\n"
+        "Please try again."
+    )
+    assert strip_quoted_text(text) == "Need help with sync"
+
+
+def test_outlook_chinese_reply():
+    text = "同步还是失败。\n\n发件人: 客服 <support@example.com>\n发送时间: 2024年5月1日 10:00\n主题: 回复: 同步\n\n请重试。"
+    assert strip_quoted_text(text) == "同步还是失败。"
+
+
+def test_outlook_html_reply():
+    html = (
+        "<p>Need help with sync</p>"
+        "<div id=\"divRplyFwdMsg\"><hr><b>From:</b> Support<br><b>Sent:</b> Monday, May 1, 2024<br>"
+        "<b>Subject:</b> Re: sync</div><div>Please try again.</div>"
+    )
+    body, _, _ = normalize_body(html, is_html=True)
+    assert body == "Need help with sync"
+
+
+def test_from_line_without_sent_is_kept():
+    text = "From: 上海分公司\n我们想采购 20 台设备，请报价。"
+    assert strip_quoted_text(text) == text
+
+
+def test_greater_than_content_is_kept():
+    text = "价格对比：\n>100元 的套餐有哪些？"
+    assert strip_quoted_text(text) == text
+
+
+def test_inline_quote_before_customer_text_is_kept():
+    text = "> 请提供订单号\n订单号是 123456。"
+    assert strip_quoted_text(text) == text
+
+
+def test_signature_is_removed():
+    assert strip_quoted_text("设备无法开机。\n\n发自我的iPhone") == "设备无法开机。"
+    assert strip_quoted_text("设备无法开机。\n-- \n张三\n13800000000") == "设备无法开机。"
+
+
+def test_fully_quoted_mail_is_kept():
+    text = "> 只有引用内容"
+    assert strip_quoted_text(text) == text
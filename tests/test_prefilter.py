@@ -0,0 +1,63 @@
+import pytest
+
+from src.prefilter import PreFilter
+from src.tools.schema_mail import Email
+
+
+def _email(subject: str, sender: str = "customer@example.com", headers: dict = None) -> Email:
+    return Email(
+        id="1", threadId="", messageId="<1@example.com>", references="", sender=sender,
+        subject=subject, body="正文", headers=headers or {},
+    )
+
+
+@pytest.fixture
+def prefilter():
+    return PreFilter()
+
+
+@pytest.mark.parametrize("subject", [
+    "为什么我给朋友发邀请总是收到退信？",
+    "Sync delivery failure after update",
+    "Returned mail on my refund request",
+    "休假模式怎么关闭？",
+    "不在办公室时能否设置自动回复？",
+    "自动回复功能怎么用",
+    "系统退信是什么意思？",
+    "Undeliverable invoices in my account",
+])
+def test_customer_subjects_are_not_filtered(prefilter, subject):
+    assert prefilter.check_headers(_email(subject)) is None
+
+
+@pytest.mark.parametrize("subject, reason", [
+    ("Undelivered Mail Returned to Sender", "bounce"),
+    ("Delivery Status Notification (Failure)", "bounce"),
+    ("Mail delivery failed: returning message to sender", "bounce"),
+    ("Undeliverable: 退款申请", "bounce"),
+    ("系统退信", "bounce"),
+    ("自动回复: 关于订单的问题", "auto_reply"),
+    ("自动回复：关于订单的问题", "auto_reply"),
+    ("Automatic reply: Order question", "auto_reply"),
+    ("Out of Office: Order question", "auto_reply"),
+])
+def test_system_subjects_are_filtered(prefilter, subject, reason):
+    assert prefilter.check_headers(_email(subject)) == reason
+
+
+@pytest.mark.parametrize("headers, sender, reason", [
+    ({"Auto-Submitted": "auto-replied"}, "customer@example.com", "auto_reply"),
+    ({"X-Autoreply": "yes"}, "customer@example.com", "auto_reply"),
+    ({"Return-Path": "<>"}, "customer@example.com", "bounce"),
+    ({}, "MAILER-DAEMON@qq.com", "bounce"),
+    ({"Content-Type": "multipart/report; report-type=delivery-status"}, "customer@example.com", "bounce"),
+    ({"Precedence": "bulk"}, "news@example.com", "bulk"),
+    ({"List-Unsubscribe": "<mailto:unsubscribe@example.com>"}, "news@example.com", "newsletter"),
+])
+def test_header_evidence(prefilter, headers, sender, reason):
+    # 有邮件头/发件人证据时，主题是普通客户主题也能识别
+    assert prefilter.check_headers(_email("关于订单的问题", sender=sender, headers=headers)) == reason
+
+
+def test_auto_submitted_no_is_not_filtered(prefilter):
+    assert prefilter.check_headers(_email("关于订单的问题", headers={"Auto-Submitted": "no"})) is None
@@ -0,0 +1,177 @@
+import pytest
+
+from src.utils import resilience
+from src.utils.resilience import CircuitBreaker, Dependency, DependencyUnavailable
+
+
+class _Clock:
+    """代替 time.monotonic 的可控时钟"""
+
+    def __init__(self):
+        self.now = 1000.0
+
+    def __call__(self):
+        return self.now
+
+    def advance(self, seconds: float) -> None:
+        self.now += seconds
+
+
+@pytest.fixture
+def clock(monkeypatch):
+    clock = _Clock()
+    monkeypatch.setattr(resilience.time, "monotonic", clock)
+    monkeypatch.setattr(resilience.time, "sleep", lambda seconds: None)
+    return clock
+
+
+class _Flaky:
+    """前 failures 次调用抛出 error，之后返回 "ok"，记录调用次数"""
+
+    def __init__(self, failures: int, error: BaseException = ConnectionError("connection reset")):
+        self.failures = failures
+        self.error = error
+        self.calls = 0
+
+    def __call__(self):
+        self.calls += 1
+        if self.calls <= self.failures:
+            raise self.error
+        return "ok"
+
+
+def _open_breaker(breaker: CircuitBreaker) -> None:
+    for _ in range(breaker.failure_threshold):
+        breaker.before_call()
+        breaker.record_failure()
+
+
+def test_breaker_opens_at_threshold(clock):
+    breaker = CircuitBreaker("imap", failure_threshold=3, reset_seconds=60)
+    for _ in range(2):
+        breaker.before_call()
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    clock.advance(20)
+    with pytest.raises(DependencyUnavailable) as excinfo:
+        breaker.before_call()
+    assert excinfo.value.name == "imap"
+    assert excinfo.value.retry_in == pytest.approx(40)
+
+
+def test_success_resets_failure_count(clock):
+    breaker = CircuitBreaker("imap", failure_threshold=3, reset_seconds=60)
+    for _ in range(2):
+        breaker.record_failure()
+    breaker.record_success()
+    for _ in range(2):
+        breaker.record_failure()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_half_open_lets_only_one_probe_through(clock):
+    breaker = CircuitBreaker("smtp", failure_threshold=2, reset_seconds=30)
+    _open_breaker(breaker)
+    clock.advance(30)
+
+    breaker.before_call()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+    # 探测调用结束前其余调用继续快速失败
+    for _ in range(3):
+        with pytest.raises(DependencyUnavailable):
+            breaker.before_call()
+
+    breaker.record_success()
+    assert breaker.state == CircuitBreaker.CLOSED
+    breaker.before_call()
+
+
+def test_failed_probe_reopens_for_full_period(clock):
+    breaker = CircuitBreaker("smtp", failure_threshold=2, reset_seconds=30)
+    _open_breaker(breaker)
+    clock.advance(30)
+    breaker.before_call()
+    breaker.record_failure()
+    assert breaker.state == CircuitBreaker.OPEN
+
+    clock.advance(29)
+    with pytest.raises(DependencyUnavailable):
+        breaker.before_call()
+    clock.advance(1)
+    breaker.before_call()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+
+def test_release_returns_probe_after_unrelated_error(clock):
+    breaker = CircuitBreaker("llm", failure_threshold=2, reset_seconds=30)
+    _open_breaker(breaker)
+    clock.advance(30)
+    breaker.before_call()
+    # 探测调用因参数错误等与依赖无关的原因失败：不计为失败，下一次调用重新探测
+    breaker.release()
+    assert breaker.state == CircuitBreaker.OPEN
+    breaker.before_call()
+    assert breaker.state == CircuitBreaker.HALF_OPEN
+
+
+def test_release_when_closed_is_noop(clock):
+    breaker = CircuitBreaker("llm", failure_threshold=2, reset_seconds=30)
+    breaker.release()
+    assert breaker.state == CircuitBreaker.CLOSED
+
+
+def test_idempotent_call_is_retried(clock):
+    dependency = Dependency("imap", timeout=30, retries=2, failure_threshold=5, reset_seconds=60)
+    fn = _Flaky(failures=2)
+    assert dependency.call(fn, errors=(ConnectionError,)) == "ok"
+    assert fn.calls == 3
+    assert dependency.breaker.snapshot() == {"state": CircuitBreaker.CLOSED, "failures": 0}
+
+
+def test_idempotent_call_raises_after_retries(clock):
+    dependency = Dependency("imap", timeout=30, retries=2, failure_threshold=5, reset_seconds=60)
+    fn = _Flaky(failures=10)
+    with pytest.raises(ConnectionError):
+        dependency.call(fn, errors=(ConnectionError,))
+    assert fn.calls == 3
+    assert dependency.breaker.failures == 3
+
+
+def test_non_idempotent_call_is_never_retried(clock):
+    dependency = Dependency("smtp", timeout=30, retries=2, failure_threshold=3, reset_seconds=60)
+    fn = _Flaky(failures=1)
+    with pytest.raises(ConnectionError):
+        dependency.call(fn, idempotent=False, errors=(ConnectionError,))
+    assert fn.calls == 1
+    assert dependency.breaker.failures == 1
+
+
+def test_retries_stop_when_breaker_opens(clock):
+    dependency = Dependency("imap", timeout=30, retries=5, failure_threshold=2, reset_seconds=60)
+    fn = _Flaky(failures=10)
+    with pytest.raises(DependencyUnavailable):
+        dependency.call(fn, errors=(ConnectionError,))
+    assert fn.calls == 2
+    # 熔断中的调用不再执行 fn
+    with pytest.raises(DependencyUnavailable):
+        dependency.call(fn, errors=(ConnectionError,))
+    assert fn.calls == 2
+
+
+def test_unrelated_error_releases_probe_without_counting_failure(clock):
+    dependency = Dependency("llm", timeout=60, retries=2, failure_threshold=2, reset_seconds=30)
+    _open_breaker(dependency.breaker)
+    clock.advance(30)
+
+    bad_request = _Flaky(failures=1, error=ValueError("bad argument"))
+    with pytest.raises(ValueError):
+        dependency.call(bad_request, errors=(ConnectionError,))
+    assert bad_request.calls == 1
+    assert dependency.breaker.state == CircuitBreaker.OPEN
+    # 交还的探测机会由下一次调用使用，成功后恢复
+    assert dependency.call(_Flaky(failures=0), errors=(ConnectionError,)) == "ok"
+    assert dependency.breaker.state == CircuitBreaker.CLOSED
@@ -0,0 +1,50 @@
+from src.utils.tokens import count_tokens, fit_sections, truncate_to_tokens
+
+
+def test_truncate_to_tokens_respects_budget():
+    text = "退款申请提交后我们会在三个工作日内处理。" * 50
+    truncated = truncate_to_tokens(text, 40)
+    assert count_tokens(truncated) <= 40
+    assert truncated.endswith("……")
+    assert truncate_to_tokens("短文本", 40) == "短文本"
+
+
+def test_fit_sections_within_budget_is_unchanged():
+    sections = [("critique", "请补充退款时效"), ("body", "我想申请退款"), ("references", "退款七天内到账")]
+    assert fit_sections(sections, 1000) == dict(sections)
+
+
+def test_fit_sections_stays_within_budget():
+    sections = [
+        ("critique", "语气需要更正式。" * 40),
+        ("body", "我的设备无法连接网络，重启也没有用。" * 40),
+        ("references", "设备支持 2.4GHz 与 5GHz 双频 Wi-Fi。" * 80),
+        ("draft", "您好，感谢您的来信。" * 60),
+    ]
+    for budget in (100, 300, 600):
+        fitted = fit_sections(sections, budget)
+        assert sum(count_tokens(text) for text in fitted.values()) <= budget
+
+
+def test_fit_sections_truncates_least_important_first():
+    critique = "语气需要更正式，并说明退款时效。"
+    body = "我上周购买的会员想申请退款，请问多久能到账？"
+    references = "退款申请审核通过后，款项将在七个工作日内原路退回。" * 30
+    draft = "您好，您的退款申请已收到。" * 30
+    sections = [("critique", critique), ("body", body), ("references", references), ("draft", draft)]
+    budget = count_tokens(critique) + count_tokens(body) + count_tokens(references) // 2
+
+    fitted = fit_sections(sections, budget)
+    # 高优先级的段落原样保留，最低优先级的草稿先被丢弃，参考信息被截断
+    assert fitted["critique"] == critique
+    assert fitted["body"] == body
+    assert fitted["draft"] == ""
+    assert fitted["references"] and fitted["references"] != references
+    assert sum(count_tokens(text) for text in fitted.values()) <= budget
+
+
+def test_fit_sections_drops_sections_below_min_tokens():
+    sections = [("body", "客户邮件" * 50), ("thread_context", "此前往来摘要" * 10)]
+    fitted = fit_sections(sections, count_tokens(sections[0][1]) + 5, min_tokens=16)
+    assert fitted["body"] == sections[0][1]
+    assert fitted["thread_context"] == ""
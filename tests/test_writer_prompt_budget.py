@@ -0,0 +1,80 @@
+from types import SimpleNamespace
+
+import pytest
+
+# 需要完整的项目依赖（langchain 等），未安装时跳过
+nodes_module = pytest.importorskip("src.nodes")
+
+from langchain.schema import AIMessage, HumanMessage
+
+from src.draft_checks import DEFAULT_FORBIDDEN_PHRASES
+from src.prompts_zh import EMAIL_WRITER_SYSTEM, EMAIL_WRITER_USER
+from src.tools.schema_mail import Email
+from src.utils.stats import StatsRecorder
+from src.utils.tokens import count_tokens
+
+WRITER_PROMPT_TOKEN_BUDGET = 1500
+
+
+class _RecordingWriterChain:
+    """代替写作 chain：记录每次的输入，返回一份很长的草稿"""
+
+    def __init__(self):
+        self.inputs = []
+
+    def invoke(self, writer_input):
+        self.inputs.append(writer_input)
+        return SimpleNamespace(content="您好，感谢您的来信，关于您反馈的设备联网问题，我们的处理建议如下。" * 40)
+
+
+def _make_nodes(writer_chain):
+    nodes = nodes_module.Nodes.__new__(nodes_module.Nodes)
+    nodes.chains = SimpleNamespace(email_writer_chain=lambda: writer_chain)
+    nodes.qq_mail_tools = SimpleNamespace(mark_email_drafted=lambda email_id, trials: True)
+    nodes.writer_stats = StatsRecorder(None, "writer")
+    nodes.writer_prompt_budget = WRITER_PROMPT_TOKEN_BUDGET
+    nodes._writer_template_tokens = count_tokens(EMAIL_WRITER_SYSTEM) + count_tokens(EMAIL_WRITER_USER)
+    nodes.writer_streaming = False
+    nodes.writer_max_chars = 600
+    nodes.writer_min_chars = 60
+    nodes.writer_forbidden_phrases = list(DEFAULT_FORBIDDEN_PHRASES)
+    return nodes
+
+
+def _prompt_tokens(writer_input):
+    return (
+        count_tokens(EMAIL_WRITER_SYSTEM) + count_tokens(EMAIL_WRITER_USER)
+        + count_tokens(writer_input["email_information"]) + count_tokens(writer_input["history"])
+    )
+
+
+def test_writer_prompt_stays_within_budget_across_trials():
+    writer_chain = _RecordingWriterChain()
+    nodes = _make_nodes(writer_chain)
+    state = {
+        "current_email": Email(
+            id="1", threadId="t1", messageId="<m1@example.com>", references="", sender="customer@example.com",
+            subject="设备无法联网", body="我的设备无法连接家里的无线网络，重启路由器和设备都没有用，请问该怎么办？" * 20,
+        ),
+        "email_category": "product_enquiry",
+        "retrieved_documents": "设备支持 2.4GHz 与 5GHz 双频 Wi-Fi，首次配网需要在 App 中完成。" * 120,
+        "thread_context": "客户此前咨询过设备的保修政策。" * 30,
+        "writer_messages": [],
+        "trials": 0,
+    }
+
+    for _ in range(3):
+        update = nodes.write_email(state)
+        state.update(update)
+        # 模拟校对：每轮整体替换为本次草稿 + 一份很长的校对意见
+        state["writer_messages"] = [
+            AIMessage(content=update["generated_email"]),
+            HumanMessage(content="请更正式地说明配网步骤，并补充 5GHz 频段的注意事项。" * 60),
+        ]
+
+    prompt_tokens = [_prompt_tokens(writer_input) for writer_input in writer_chain.inputs]
+    assert len(prompt_tokens) == 3
+    assert all(tokens <= WRITER_PROMPT_TOKEN_BUDGET for tokens in prompt_tokens), prompt_tokens
+    # 重写只带上一版草稿与校对意见，不随轮次累积
+    assert prompt_tokens[2] <= prompt_tokens[1], prompt_tokens
+    assert state["trials"] == 3
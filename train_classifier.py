@@ -0,0 +1,77 @@
+# train_classifier.py
+"""
+用历史 LLM 分类结果训练本地预分类器（哈希 n-gram 逻辑回归）
+
+样本由 categorize_email 节点写入 Redis（qqmail:classifier:samples），训练后保存到 PREFILTER_MODEL_PATH，
+mail-robot 重启后生效。会打印留出集上的准确率，以及在 PREFILTER_MIN_CONFIDENCE 阈值下的覆盖率与准确率
+（即有多少邮件可以跳过 LLM 分类、跳过的判断有多准）
+
+用法：
+    python train_classifier.py --epochs 5
+"""
+import argparse
+import os
+import random
+
+from dotenv import load_dotenv
+load_dotenv()
+from colorama import Fore, Style
+
+from src.prefilter import PreFilter
+from src.utils.redis_utils import redis_conn
+from src.utils.text_classifier import HashedNgramClassifier
+
+
+def load_samples():
+    samples = []
+    for item in redis_conn.lrange(PreFilter.SAMPLES_KEY, 0, -1):
+        label, _, text = item.partition("\t")
+        if label and text:
+            samples.append((text, label))
+    return samples
+
+
+def main():
+    parser = argparse.ArgumentParser(description="训练本地预分类器")
+    parser.add_argument("--epochs", type=int, default=5)
+    parser.add_argument("--holdout", type=float, default=0.2, help="留出评估的样本比例")
+    parser.add_argument("--min-samples", type=int, default=200)
+    args = parser.parse_args()
+
+    if not redis_conn:
+        print(f"{Fore.RED}❌ Redis 未连接{Style.RESET_ALL}")
+        return
+    samples = load_samples()
+    if len(samples) < args.min_samples:
+        print(f"{Fore.YELLOW}样本数 {len(samples)} 少于 {args.min_samples}，暂不训练{Style.RESET_ALL}")
+        return
+
+    random.Random(42).shuffle(samples)
+    split = int(len(samples) * (1 - args.holdout))
+    train, test = samples[:split], samples[split:]
+
+    # 1. 留出集评估
+    model = HashedNgramClassifier().fit([t for t, _ in train], [l for _, l in train], epochs=args.epochs)
+    min_confidence = float(os.getenv("PREFILTER_MIN_CONFIDENCE", 0.95))
+    correct = covered = covered_correct = 0
+    for text, label in test:
+        predicted, confidence = model.predict(text)
+        correct += predicted == label
+        if confidence >= min_confidence:
+            covered += 1
+            covered_correct += predicted == label
+    print(f"样本: 训练 {len(train)} / 评估 {len(test)} | 类别: {model.labels}")
+    print(f"准确率: {correct / len(test):.3f}")
+    print(f"置信度 ≥ {min_confidence}: 覆盖率 {covered / len(test):.3f} | "
+          f"准确率 {covered_correct / covered if covered else 0:.3f}")
+
+    # 2. 全量样本训练并保存
+    model = HashedNgramClassifier().fit([t for t, _ in samples], [l for _, l in samples], epochs=args.epochs)
+    path = os.getenv("PREFILTER_MODEL_PATH", "./models/prefilter.json")
+    os.makedirs(os.path.dirname(path) or ".", exist_ok=True)
+    model.save(path)
+    print(f"{Fore.GREEN}✅ 模型已保存到 {path}{Style.RESET_ALL}")
+
+
+if __name__ == "__main__":
+    main()